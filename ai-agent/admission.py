@@ -0,0 +1,152 @@
+"""
+Admission control for AI Agent plan endpoints
+Adaptive concurrency limit with a bounded wait queue; sheds load with 503 before requests pile up
+"""
+
+import asyncio
+import math
+import os
+from collections import deque
+from typing import Dict, Any, Optional
+
+import metrics
+import work_scheduler
+from deadline import Deadline
+
+# Upper bound for plans admitted at once (queued on or running in the plan workers)
+MAX_CONCURRENCY = int(os.getenv("ADMISSION_MAX_CONCURRENCY", work_scheduler.PLAN_WORKERS * 2))
+MIN_CONCURRENCY = int(os.getenv("ADMISSION_MIN_CONCURRENCY", 2))
+
+# Requests allowed to wait for admission; beyond this they are rejected immediately
+MAX_QUEUE = int(os.getenv("ADMISSION_MAX_QUEUE", 32))
+
+# Admitted plans waiting longer than this for a plan worker count as congestion
+TARGET_WORKER_WAIT_MS = float(os.getenv("ADMISSION_TARGET_WORKER_WAIT_MS", 250))
+
+# Service time assumed until plans have been observed
+DEFAULT_SERVICE_SECONDS = 10.0
+
+
+class Overloaded(Exception):
+    """Raised when a plan request is shed; carries the suggested Retry-After in seconds"""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = max(1, math.ceil(retry_after))
+
+
+class AdmissionController:
+    """
+    AIMD concurrency limit in front of the plan scheduler
+
+    The limit grows by roughly one slot per completed plan while admitted plans
+    start promptly, and is cut by 0.9x when they wait longer than the target
+    for a plan worker or degrade within the server's default deadline. Requests
+    beyond the limit wait in FIFO order, unless the queue is full or its
+    expected wait would outlast the request's deadline, in which case they
+    are rejected at once.
+
+    All state is touched only from the event loop, so no lock is needed.
+    """
+
+    def __init__(self, max_limit: int = MAX_CONCURRENCY, min_limit: int = MIN_CONCURRENCY,
+                 max_queue: int = MAX_QUEUE):
+        self.max_limit = max_limit
+        self.min_limit = min(min_limit, max_limit)
+        self.limit = float(max_limit)
+        self.max_queue = max_queue
+        self.in_flight = 0
+        self.waiters: deque = deque()
+
+    def expected_wait(self, position: int) -> float:
+        """Seconds until the request at this queue position would be admitted"""
+        service = metrics.percentile("plan_run_ms", 50) / 1000 if metrics.sample_count("plan_run_ms") \
+            else DEFAULT_SERVICE_SECONDS
+        return position * service / max(1, int(self.limit))
+
+    def _reject(self, reason: str, retry_after: float) -> None:
+        metrics.increment("admission_rejected")
+        raise Overloaded(reason, retry_after)
+
+    async def acquire(self, deadline: Deadline) -> None:
+        """
+        Take an admission slot, waiting in the queue if the deadline allows
+
+        Raises:
+            Overloaded: if the queue is full, its expected wait exceeds the
+                deadline, or the deadline passes while waiting
+        """
+        if self.in_flight < int(self.limit) and not self.waiters:
+            self.in_flight += 1
+            metrics.observe("admission_wait_ms", 0.0)
+            return
+
+        expected = self.expected_wait(len(self.waiters) + 1)
+        if len(self.waiters) >= self.max_queue:
+            self._reject("Plan queue is full", expected)
+        if expected > deadline.remaining():
+            self._reject(f"Expected queue wait {expected:.1f}s exceeds the request deadline", expected)
+
+        loop = asyncio.get_running_loop()
+        waiter = loop.create_future()
+        self.waiters.append(waiter)
+        started = loop.time()
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), timeout=deadline.remaining())
+        except asyncio.TimeoutError:
+            if not waiter.done():
+                self._abandon(waiter)
+                self._reject("Request deadline passed while queued", self.expected_wait(len(self.waiters) + 1))
+        except BaseException:
+            # Client went away: hand back a slot granted meanwhile, or leave the queue
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            else:
+                self._abandon(waiter)
+            raise
+        metrics.observe("admission_wait_ms", (loop.time() - started) * 1000)
+
+    def _abandon(self, waiter: asyncio.Future) -> None:
+        """Remove a waiter that gave up"""
+        waiter.cancel()
+        try:
+            self.waiters.remove(waiter)
+        except ValueError:
+            pass
+
+    def release(self, worker_wait_ms: Optional[float] = None, degraded: bool = False) -> None:
+        """
+        Free a slot, adjust the limit from the plan's outcome and admit waiters
+
+        Args:
+            worker_wait_ms: How long the plan waited for a plan worker (None if it never ran)
+            degraded: Whether any section fell back because the server's default
+                deadline ran out (not a deadline the client shortened)
+        """
+        self.in_flight -= 1
+        if degraded or worker_wait_ms is not None:
+            if degraded or worker_wait_ms > TARGET_WORKER_WAIT_MS:
+                self.limit = max(self.min_limit, self.limit * 0.9)
+            else:
+                self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+
+        while self.waiters and self.in_flight < int(self.limit):
+            waiter = self.waiters.popleft()
+            if waiter.done():
+                continue
+            self.in_flight += 1
+            waiter.set_result(True)
+
+    def status(self) -> Dict[str, Any]:
+        """Current limit and queue for the metrics endpoint"""
+        return {
+            "concurrencyLimit": round(self.limit, 2),
+            "inFlight": self.in_flight,
+            "queued": len(self.waiters),
+            "maxQueue": self.max_queue,
+            "expectedWaitSeconds": round(self.expected_wait(len(self.waiters) + 1), 2),
+            "waitMsP99": round(metrics.percentile("admission_wait_ms", 99), 1)
+        }
+
+
+controller = AdmissionController()
@@ -5,6 +5,8 @@ Modified to use travelerId directly for fetching booking history
 
 import os
 import json
+import time
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, Any, List, Optional
 from datetime import datetime, timedelta
 from dotenv import load_dotenv
@@ -15,11 +17,30 @@ from langchain.schema import HumanMessage, SystemMessage
 
 import database
 import tavily_search
+import preference_classifier
+import traveler_profile
+import packing_rules
+import itinerary_scheduler
+import search_planner
+import outbound
+import circuit_breaker
+import plan_cache
+import cache_warmer
+import events_index
+import http_pool
+import metrics
+import profiling
+import semantic_cache
+from deadline import Deadline, executor
+from plan_session import StageCache, fingerprint
 from prompts import (
-    TRAVEL_PLANNER_SYSTEM_PROMPT,
+    PromptLayout,
+    QUERY_PREFERENCE_PROMPT,
+    HISTORY_PREFERENCE_PROMPT,
     ACTIVITY_EXTRACTION_PROMPT,
     RESTAURANT_EXTRACTION_PROMPT,
-    DAY_BY_DAY_PROMPT,
+    EVENT_EXTRACTION_PROMPT,
+    DAY_PLAN_POLISH_PROMPT,
     PACKING_CHECKLIST_PROMPT,
     format_search_results,
     format_activities_summary
@@ -30,9 +51,84 @@ load_dotenv()
 llm = ChatOpenAI(
     model="gpt-4",
     temperature=0.7,
-    openai_api_key=os.getenv("OPENAI_API_KEY")
+    openai_api_key=os.getenv("OPENAI_API_KEY"),
+    http_client=http_pool.client,
+    # Retries happen in the outbound governor, which honours Retry-After and the shared limits
+    max_retries=0
 )
 
+# Ask the LLM for extra packing items on top of the rule-based checklist
+PACKING_LLM_ENRICHMENT = os.getenv("PACKING_LLM_ENRICHMENT", "false").lower() == "true"
+
+# Ask the LLM to reword the locally scheduled itinerary (windows are polished concurrently)
+ITINERARY_LLM_POLISH = os.getenv("ITINERARY_LLM_POLISH", "false").lower() == "true"
+DAY_WINDOW_DAYS = max(1, int(os.getenv("DAY_WINDOW_DAYS", 4)))
+DAY_WINDOW_WORKERS = int(os.getenv("DAY_WINDOW_WORKERS", 16))
+
+# Separate pool so window polishing never waits on the stage pool it runs in
+_window_executor = ThreadPoolExecutor(max_workers=DAY_WINDOW_WORKERS, thread_name_prefix="day-window")
+
+DAY_SLOTS = ("morning", "afternoon", "evening")
+
+
+openai_breaker = circuit_breaker.get_breaker("openai")
+
+
+def invoke_llm(messages: list, stage: Optional[str] = None):
+    """
+    Invoke the LLM through the OpenAI circuit breaker and outbound governor
+    
+    Uses generate() rather than invoke(): the pinned langchain-openai only
+    reports token usage in the result's llm_output, not on the message.
+    
+    Args:
+        messages: Chat messages
+        stage: Prompt name to record token usage under (None to skip)
+        
+    Returns:
+        The response message
+    """
+    openai_breaker.check()
+    result = outbound.call(
+        "openai", llm.model_name, openai_breaker.call, llm.generate, [messages], latency_key=stage
+    )
+    if stage:
+        record_token_usage(stage, result.llm_output)
+    return result.generations[0][0].message
+
+
+def record_token_usage(stage: str, llm_output: Optional[Dict[str, Any]]) -> None:
+    """Record prompt and provider-cached prefix tokens for a stage (when the provider reports them)"""
+    usage = (llm_output or {}).get("token_usage") or {}
+    prompt_tokens = usage.get("prompt_tokens")
+    if prompt_tokens is None:
+        return
+    cached_tokens = (usage.get("prompt_tokens_details") or {}).get("cached_tokens") or 0
+    metrics.observe(f"llm_{stage}_prompt_tokens", prompt_tokens)
+    metrics.observe(f"llm_{stage}_cached_tokens", cached_tokens)
+    metrics.increment("llm_prompt_tokens", prompt_tokens)
+    metrics.increment("llm_cached_prompt_tokens", cached_tokens)
+
+
+def invoke_prompt(layout: PromptLayout, **values):
+    """
+    Invoke the LLM with a prompt layout: static prefix as the system message, data last
+    
+    Args:
+        layout: Prompt layout from prompts.py
+        **values: Per-request data fields
+        
+    Returns:
+        The LLM response
+    """
+    with profiling.span(f"prompt.{layout.name}"):
+        prefix, data = layout.render(**values)
+    started = time.monotonic()
+    with profiling.span(f"llm.{layout.name}"):
+        response = invoke_llm([SystemMessage(content=prefix), HumanMessage(content=data)], layout.name)
+    metrics.observe(f"llm_{layout.name}_latency_ms", (time.monotonic() - started) * 1000)
+    return response
+
 
 def get_user_booking_history(traveler_id: int) -> list:
     """
@@ -47,7 +143,8 @@ def get_user_booking_history(traveler_id: int) -> list:
     try:
         import mysql.connector
         
-        conn = mysql.connector.connect(
+        conn = database.mysql_breaker.call(
+            mysql.connector.connect,
             host=os.getenv('DB_HOST', 'localhost'),
             port=int(os.getenv('DB_PORT', 3306)),
             user=os.getenv('DB_USER', 'root'),
@@ -95,6 +192,11 @@ def get_user_booking_history(traveler_id: int) -> list:
         return []
 
 
+def weather_for_prompt(weather: Dict) -> str:
+    """Serialize weather context for prompts without the raw search payloads"""
+    return json.dumps({k: v for k, v in (weather or {}).items() if k != "raw_results"}, indent=2)
+
+
 def format_booking_history(history: list) -> str:
     """Format booking history for AI prompt"""
     if not history:
@@ -116,40 +218,11 @@ def infer_from_query_only(query: str, existing_preferences: Dict) -> Dict:
     try:
         print("AI inference based on query only...")
         
-        inference_prompt = f"""
-You are a travel preferences analyzer. Analyze the user's query and infer their travel preferences.
-
-**User Query**: "{query}"
-
-**Current Preferences** (may be empty or partial):
-{json.dumps(existing_preferences, indent=2)}
-
-**Task**: Infer missing preferences from the query. Return JSON only.
-
-**Inference Rules**:
-- Budget: "budget"/"low" for cheap/hostel/backpacker, "high"/"luxury" for expensive/5-star/premium, "medium" otherwise
-- Interests: Extract activities mentioned (museums, food, beaches, nightlife, shopping, nature, culture, adventure, romantic, family-friendly, wellness)
-- Dietary: Extract any diet mentions (vegetarian, vegan, gluten-free, halal, kosher)
-- Mobility: Extract any accessibility needs (wheelchair, elderly, child-friendly)
-
-**Response Format** (JSON only):
-{{
-  "budget": "medium",
-  "interests": ["museums", "food"],
-  "dietaryFilters": ["vegetarian"],
-  "mobilityNeeds": [],
-  "reasoning": "Brief explanation of inference logic"
-}}
-
-Return ONLY the JSON, nothing else.
-"""
-        
-        messages = [
-            SystemMessage(content="You are a JSON-only response bot. Return valid JSON only."),
-            HumanMessage(content=inference_prompt)
-        ]
-        
-        response = llm.invoke(messages)
+        response = invoke_prompt(
+            QUERY_PREFERENCE_PROMPT,
+            query=query,
+            existing_preferences=json.dumps(existing_preferences, indent=2)
+        )
         
         try:
             inferred = json.loads(response.content)
@@ -187,62 +260,36 @@ def infer_preferences_from_history_and_query(
     Returns:
         Complete inferred preferences dictionary
     """
+    # Try the local rule-based classifier first; only escalate to the LLM when unsure
+    local_inferred = preference_classifier.classify_preferences(
+        query, booking_history, existing_preferences
+    )
+    
     try:
+        if preference_classifier.is_confident(local_inferred) or openai_breaker.is_open():
+            print(f"Local classifier inferred preferences (confidence {local_inferred['confidence']}):")
+            print(f"   Budget: {local_inferred.get('budget')}")
+            print(f"   Interests: {local_inferred.get('interests')}")
+            print(f"   Dietary: {local_inferred.get('dietaryFilters')}")
+            print(f"   Reasoning: {local_inferred.get('reasoning')}")
+            return local_inferred
+        
+        print(f"Local classifier confidence {local_inferred['confidence']} too low, escalating to AI")
+        
         if not booking_history:
-            return infer_from_query_only(query, existing_preferences)
+            return infer_from_query_only(query, existing_preferences) or local_inferred
         
         print(f"Starting AI preference inference...")
         print(f"   Analyzing {len(booking_history)} previous bookings")
         
         history_text = format_booking_history(booking_history)
         
-        inference_prompt = f"""
-You are a travel preferences analyzer. Based on the user's booking history and current query, infer their travel preferences.
-
-**Booking History**:
-{history_text}
-
-**Current Query**: "{query}"
-
-**Current Preferences** (may be empty or partial):
-{json.dumps(existing_preferences, indent=2)}
-
-**Task**: Analyze patterns in booking history and the query to infer missing preferences. Return JSON only.
-
-**Inference Rules**:
-1. **Budget**: 
-   - "low" if mostly short stays (1-2 nights) or budget destinations
-   - "high" if long stays (7+ nights) or luxury destinations  
-   - "medium" for 3-6 night stays
-   
-2. **Interests**: Based on destination types:
-   - Cultural cities (Paris, Rome, etc.) -> "museums", "culture", "art"
-   - Beach destinations -> "beaches", "relaxation"
-   - Family patterns (3-4+ guests) -> "family-friendly"
-   - Extract explicit interests from query
-   
-3. **Dietary**: Extract from query if mentioned (vegetarian, vegan, etc.)
-
-4. **Mobility**: Extract from query if mentioned (wheelchair, elderly, etc.)
-
-**Response Format** (JSON only):
-{{
-  "budget": "medium",
-  "interests": ["museums", "culture", "family-friendly"],
-  "dietaryFilters": ["vegetarian"],
-  "mobilityNeeds": [],
-  "reasoning": "Brief explanation of your inference logic based on the history and query"
-}}
-
-Return ONLY the JSON, nothing else.
-"""
-        
-        messages = [
-            SystemMessage(content="You are a JSON-only response bot. Return valid JSON only."),
-            HumanMessage(content=inference_prompt)
-        ]
-        
-        response = llm.invoke(messages)
+        response = invoke_prompt(
+            HISTORY_PREFERENCE_PROMPT,
+            history=history_text,
+            query=query,
+            existing_preferences=json.dumps(existing_preferences, indent=2)
+        )
         
         try:
             inferred = json.loads(response.content)
@@ -258,11 +305,11 @@ Return ONLY the JSON, nothing else.
             
         except json.JSONDecodeError:
             print("Warning: Failed to parse AI inference response")
-            return {}
+            return local_inferred
             
     except Exception as e:
         print(f"Warning: AI inference failed: {e}")
-        return {}
+        return local_inferred
 
 
 def extract_activities(
@@ -272,23 +319,20 @@ def extract_activities(
     mobility_needs: List[str]
 ) -> List[Dict[str, Any]]:
     """Extract and structure activities from Tavily search results"""
+    if not search_results:
+        return []
+    
     try:
         formatted_results = format_search_results(search_results)
         
-        prompt = ACTIVITY_EXTRACTION_PROMPT.format(
+        response = invoke_prompt(
+            ACTIVITY_EXTRACTION_PROMPT,
             search_results=formatted_results,
             party_type=party_type,
             interests=", ".join(interests) if interests else "general",
             mobility_needs=", ".join(mobility_needs) if mobility_needs else "none"
         )
         
-        messages = [
-            SystemMessage(content="You are a travel data extraction expert. Return only valid JSON."),
-            HumanMessage(content=prompt)
-        ]
-        
-        response = llm.invoke(messages)
-        
         try:
             activities = json.loads(response.content)
             if isinstance(activities, list):
@@ -309,22 +353,19 @@ def extract_restaurants(
     budget: str
 ) -> List[Dict[str, Any]]:
     """Extract and structure restaurant recommendations"""
+    if not search_results:
+        return []
+    
     try:
         formatted_results = format_search_results(search_results)
         
-        prompt = RESTAURANT_EXTRACTION_PROMPT.format(
+        response = invoke_prompt(
+            RESTAURANT_EXTRACTION_PROMPT,
             search_results=formatted_results,
             dietary_filters=", ".join(dietary_filters) if dietary_filters else "none",
             budget=budget
         )
         
-        messages = [
-            SystemMessage(content="You are a culinary expert. Return only valid JSON."),
-            HumanMessage(content=prompt)
-        ]
-        
-        response = llm.invoke(messages)
-        
         try:
             restaurants = json.loads(response.content)
             if isinstance(restaurants, list):
@@ -339,69 +380,241 @@ def extract_restaurants(
         return []
 
 
-def generate_day_by_day_plan(
+def extract_events(location: str, search_results: List[Dict]) -> List[Dict[str, Any]]:
+    """Extract dated events from the events search results"""
+    if not search_results:
+        return []
+    
+    try:
+        windows = sorted({(r["window"]["startDate"], r["window"]["endDate"]) for r in search_results if r.get("window")})
+        
+        response = invoke_prompt(
+            EVENT_EXTRACTION_PROMPT,
+            search_results=format_search_results(search_results),
+            location=location,
+            windows=", ".join(f"{start} to {end}" for start, end in windows) or "unknown"
+        )
+        
+        try:
+            events = json.loads(response.content)
+            if isinstance(events, list):
+                return [event for event in events if isinstance(event, dict)][:30]
+            return []
+        except json.JSONDecodeError:
+            print("Warning: Failed to parse events JSON")
+            return []
+            
+    except Exception as e:
+        print(f"Error extracting events: {e}")
+        return []
+
+
+def index_events(
+    location: str,
+    dates: Dict[str, str],
+    search_results: List[Dict],
+    stages: StageCache,
+    deadline: Deadline
+) -> List[Dict[str, str]]:
+    """
+    Extract events from the live results, add them to the events index and return the stay's events
+    
+    Searched windows are only marked covered when the extraction completed, so
+    a window whose extraction degraded is searched again by the next plan.
+    Stays without valid dates cannot be indexed; their undated search results
+    are listed as they are.
+    """
+    if events_index.stay_window(dates) is None:
+        return [
+            {
+                "name": event.get("title", "Local Event"),
+                "url": event.get("url", ""),
+                "description": event.get("content", "")[:200]
+            }
+            for event in search_results[:5]
+        ]
+    
+    extracted = stages.run(
+        "events",
+        (location, search_results),
+        lambda: deadline.run_stage(
+            "events",
+            extract_events,
+            location,
+            search_results,
+            share=0.3,
+            fallback=list
+        ),
+        deadline
+    )
+    windows = {(r["window"]["startDate"], r["window"]["endDate"]) for r in search_results if r.get("window")}
+    if windows and "events" in stages.computed and "events" not in deadline.degraded:
+        events_index.add_events(
+            location, [{"startDate": start, "endDate": end} for start, end in windows], extracted
+        )
+    return events_index.events_for_stay(location, dates)
+
+
+def schedule_day_by_day_plan(
     location: str,
     dates: Dict[str, str],
-    guests: int,
     party_type: str,
     activities: List[Dict],
     restaurants: List[Dict],
     weather: Dict,
-    events: List[Dict],
+    preferences: Dict[str, Any],
+    events: Optional[List[Dict]] = None
+) -> List[Dict[str, Any]]:
+    """Schedule the itinerary locally (fallback plan if the dates are invalid)"""
+    try:
+        return itinerary_scheduler.schedule_itinerary(
+            location, dates, party_type, activities, restaurants, weather, preferences, events
+        )
+    except (TypeError, ValueError, AttributeError) as e:
+        print(f"Warning: could not schedule itinerary ({e}), using fallback")
+        return fallback_plan_for_dates(dates)
+
+
+def polish_day_window(
+    location: str,
+    days: List[Dict[str, Any]],
+    guests: int,
+    party_type: str,
     preferences: Dict[str, Any],
     user_query: str
 ) -> List[Dict[str, Any]]:
-    """Generate detailed day-by-day itinerary"""
+    """
+    Reword one window of scheduled days with the LLM
+    
+    Only the morning/afternoon/evening text is taken from the response; day,
+    date and the structured schedule stay as scheduled. Days the response does
+    not cover keep their scheduled wording.
+    """
     try:
-        start_date = datetime.fromisoformat(dates.get("startDate", "2025-11-01"))
-        end_date = datetime.fromisoformat(dates.get("endDate", "2025-11-05"))
-        num_days = (end_date - start_date).days + 1
-        
-        activities_summary = format_activities_summary(activities)
-        
-        prompt = DAY_BY_DAY_PROMPT.format(
+        response = invoke_prompt(
+            DAY_PLAN_POLISH_PROMPT,
             location=location,
-            start_date=start_date.strftime("%Y-%m-%d"),
-            end_date=end_date.strftime("%Y-%m-%d"),
-            nights=num_days - 1,
-            guests=guests,
             party_type=party_type,
-            activities=activities_summary,
-            restaurants=json.dumps([r.get('name', 'Restaurant') for r in restaurants[:10]]),
-            weather=json.dumps(weather, indent=2),
-            events=json.dumps([e.get('title', 'Event') for e in events[:5]]),
-            user_query=user_query,
-            budget=preferences.get("budget", "medium"),
+            guests=guests,
             interests=", ".join(preferences.get("interests", [])),
             dietary_filters=", ".join(preferences.get("dietaryFilters", [])),
-            mobility_needs=", ".join(preferences.get("mobilityNeeds", []))
+            mobility_needs=", ".join(preferences.get("mobilityNeeds", [])),
+            user_query=user_query,
+            days=json.dumps([{k: day.get(k) for k in ("day", "date") + DAY_SLOTS} for day in days])
         )
-        
-        messages = [
-            SystemMessage(content="You are a travel itinerary planner. Return only valid JSON."),
-            HumanMessage(content=prompt)
-        ]
-        
-        response = llm.invoke(messages)
-        
-        try:
-            plans = json.loads(response.content)
-            if isinstance(plans, list):
-                return plans
-            return create_fallback_plan(num_days, start_date)
-        except json.JSONDecodeError:
-            print("Warning: Failed to parse day plan JSON, using fallback")
-            return create_fallback_plan(num_days, start_date)
-            
+        polished = json.loads(response.content)
+    except json.JSONDecodeError:
+        print(f"Warning: Failed to parse polished days {days[0].get('day')}-{days[-1].get('day')}")
+        return days
     except Exception as e:
-        print(f"Error generating day plan: {e}")
+        print(f"Error polishing days {days[0].get('day')}-{days[-1].get('day')}: {e}")
+        return days
+    
+    if not isinstance(polished, list):
+        return days
+    result = []
+    for day, rewritten in zip(days, polished + [None] * len(days)):
+        day = dict(day)
+        if isinstance(rewritten, dict):
+            for slot in DAY_SLOTS:
+                if isinstance(rewritten.get(slot), str) and rewritten[slot].strip():
+                    day[slot] = rewritten[slot]
+        result.append(day)
+    return result
+
+
+def polish_day_by_day_plan(
+    location: str,
+    plans: List[Dict[str, Any]],
+    guests: int,
+    party_type: str,
+    activities: List[Dict],
+    preferences: Dict[str, Any],
+    user_query: str
+) -> List[Dict[str, Any]]:
+    """
+    Reword a scheduled itinerary with the LLM, DAY_WINDOW_DAYS days per call
+    
+    Windows are polished concurrently, so latency follows the window size rather
+    than the trip length. Activities the rewording repeats across windows are
+    replaced afterwards.
+    """
+    if not plans:
+        return plans
+    
+    futures = [
+        _window_executor.submit(
+            profiling.bind(polish_day_window), location, plans[i:i + DAY_WINDOW_DAYS], guests, party_type, preferences, user_query
+        )
+        for i in range(0, len(plans), DAY_WINDOW_DAYS)
+    ]
+    return remove_repeated_activities([future.result() for future in futures], activities)
+
+
+def remove_repeated_activities(
+    windows: List[List[Dict[str, Any]]],
+    activities: List[Dict]
+) -> List[Dict[str, Any]]:
+    """
+    Merge window plans and replace activities already scheduled in an earlier window
+    
+    A slot that names an activity planned in a previous window is swapped for an
+    activity not mentioned anywhere in the trip, or for free time if none is left.
+    
+    Args:
+        windows: Day plans per window, in trip order
+        activities: All extracted activities
+        
+    Returns:
+        Merged day-by-day plan
+    """
+    names = [a.get("name", "") for a in activities if len(a.get("name", "")) > 3]
+    
+    def mentioned(text: Any) -> set:
+        text = str(text).lower()
+        return {n for n in names if n.lower() in text}
+    
+    all_text = " ".join(str(day.get(slot, "")) for window in windows for day in window for slot in DAY_SLOTS)
+    unused = [n for n in names if n not in mentioned(all_text)]
+    
+    seen = set()
+    merged = []
+    repeats = 0
+    for window in windows:
+        window_seen = set()
+        for day in window:
+            for slot in DAY_SLOTS:
+                repeated = mentioned(day.get(slot, "")) & seen
+                if repeated:
+                    repeats += 1
+                    replacement = unused.pop(0) if unused else None
+                    day[slot] = (
+                        f"{slot.capitalize()}: Visit {replacement}." if replacement
+                        else f"{slot.capitalize()}: Free time to explore at your own pace."
+                    )
+                window_seen |= mentioned(day.get(slot, ""))
+            merged.append(day)
+        seen |= window_seen
+    
+    if repeats:
+        print(f"Replaced {repeats} repeated activities across day windows")
+    return merged
+
+
+def fallback_plan_for_dates(dates: Dict[str, str]) -> List[Dict]:
+    """Fallback itinerary covering the requested dates"""
+    try:
+        start_date = datetime.fromisoformat(dates.get("startDate", "2025-11-01"))
+        end_date = datetime.fromisoformat(dates.get("endDate", "2025-11-05"))
+        return create_fallback_plan((end_date - start_date).days + 1, start_date)
+    except (TypeError, ValueError, AttributeError):
         return create_fallback_plan(3, datetime.now())
 
 
 def create_fallback_plan(num_days: int, start_date: datetime) -> List[Dict]:
     """Create a simple fallback itinerary"""
     plans = []
-    for i in range(min(num_days, 7)):
+    for i in range(max(num_days, 0)):
         current_date = start_date + timedelta(days=i)
         plans.append({
             "day": i + 1,
@@ -421,36 +634,37 @@ def generate_packing_checklist(
     party_type: str,
     mobility_needs: List[str]
 ) -> List[str]:
-    """Generate personalized packing checklist"""
+    """Generate personalized packing checklist (rule-based, optionally enriched by the LLM)"""
+    checklist = packing_rules.build_checklist(dates, weather, activities, party_type, mobility_needs)
+    
+    if not PACKING_LLM_ENRICHMENT:
+        return checklist
+    
     try:
         activities_summary = format_activities_summary(activities)
         
-        prompt = PACKING_CHECKLIST_PROMPT.format(
+        response = invoke_prompt(
+            PACKING_CHECKLIST_PROMPT,
             location=location,
             start_date=dates.get("startDate", ""),
             end_date=dates.get("endDate", ""),
-            weather=json.dumps(weather, indent=2),
+            weather=weather_for_prompt(weather),
             activities=activities_summary,
             party_type=party_type,
             mobility_needs=", ".join(mobility_needs) if mobility_needs else "none"
         )
         
-        messages = [
-            SystemMessage(content="You are a travel packing expert. Return a JSON array of packing items."),
-            HumanMessage(content=prompt)
-        ]
-        
-        response = llm.invoke(messages)
-        
         try:
-            checklist = json.loads(response.content)
-            return checklist if isinstance(checklist, list) else create_fallback_checklist(party_type)
+            extra_items = json.loads(response.content)
+            if isinstance(extra_items, list):
+                return list(dict.fromkeys(checklist + [str(item) for item in extra_items]))
+            return checklist
         except json.JSONDecodeError:
-            return create_fallback_checklist(party_type)
+            return checklist
             
     except Exception as e:
-        print(f"Error generating packing checklist: {e}")
-        return create_fallback_checklist(party_type)
+        print(f"Error enriching packing checklist: {e}")
+        return checklist
 
 
 def create_fallback_checklist(party_type: str) -> List[str]:
@@ -478,40 +692,95 @@ def create_fallback_checklist(party_type: str) -> List[str]:
     return checklist
 
 
-def create_travel_plan(
-    query: str,
-    booking_context: Dict[str, Any],
-    preferences: Dict[str, Any]
-) -> Dict[str, Any]:
+def hydrate_booking_context(booking_context: Dict[str, Any]) -> Dict[str, Any]:
     """
-    Main function to create complete travel plan with AI preference inference
+    Fill location, dates, guests and traveler from bookingId or propertyId
+    
+    A booking is read with one joined query (booking, property and traveler);
+    a property only supplies the location. Fields the client sent win over
+    hydrated values.
     
     Args:
-        query: Free-text user query
-        booking_context: Booking details (travelerId, location, dates, partyType, guests)
-        preferences: User preferences (budget, interests, mobilityNeeds, dietaryFilters)
+        booking_context: Booking context as sent by the client (unset fields omitted)
         
     Returns:
-        Complete travel plan with all components
+        Booking context with missing fields filled in
     """
-    print("=" * 70)
-    print("Starting travel plan generation...")
-    print(f"Location: {booking_context.get('location')}")
-    print(f"Dates: {booking_context.get('dates')}")
+    hydrated = {}
+    booking_id = booking_context.get("bookingId")
+    property_id = booking_context.get("propertyId")
     
-    # Extract context
-    location = booking_context.get("location", "Unknown")
-    dates = booking_context.get("dates", {})
-    party_type = booking_context.get("partyType", "solo")
-    guests = booking_context.get("guests", 1)
+    try:
+        if booking_id:
+            booking = database.get_booking_by_id(booking_id)
+            if booking:
+                hydrated = {
+                    "location": booking.get("city") or booking.get("location"),
+                    "dates": {"startDate": booking.get("start_date"), "endDate": booking.get("end_date")}
+                    if booking.get("start_date") and booking.get("end_date") else None,
+                    "guests": booking.get("guests"),
+                    "travelerId": booking.get("traveler_id"),
+                    "propertyId": booking.get("property_id")
+                }
+            else:
+                print(f"Warning: booking {booking_id} not found, using client context only")
+        if not hydrated.get("location") and property_id:
+            prop = database.get_property_by_id(property_id)
+            if prop:
+                hydrated["location"] = prop.get("city") or prop.get("location")
+            else:
+                print(f"Warning: property {property_id} not found, using client context only")
+    except Exception as e:
+        print(f"Warning: booking context hydration failed: {e}")
     
-    # Get traveler's booking history if travelerId provided
-    traveler_id = booking_context.get("travelerId")
-    booking_history = []
+    merged = {key: value for key, value in hydrated.items() if value is not None}
+    merged.update({key: value for key, value in booking_context.items() if value is not None})
+    return merged
+
+
+def load_traveler_history(traveler_id: Optional[int]):
+    """
+    Recent booking history for a traveler (from the materialized profile when available)
+    
+    Returns:
+        Tuple of (profile or None, booking history list)
+    """
+    if not traveler_id:
+        return None, []
+    
+    print(f"Using traveler ID: {traveler_id} to fetch booking history")
+    profile = traveler_profile.sync_profile(traveler_id)
+    if profile is not None:
+        return profile, traveler_profile.recent_history(profile)
+    return None, get_user_booking_history(traveler_id)
+
+
+def resolve_preferences(
+    query: str,
+    preferences: Dict[str, Any],
+    booking_history: list,
+    profile: Optional[Dict[str, Any]],
+    deadline: Deadline,
+    booking_context: Optional[Dict[str, Any]] = None
+) -> Dict[str, Any]:
+    """
+    Fill in missing preferences from the profile, the local classifier or the LLM
     
-    if traveler_id:
-        print(f"Using traveler ID: {traveler_id} to fetch booking history")
-        booking_history = get_user_booking_history(traveler_id)
+    Inference results are also reused for near-duplicate queries about the
+    same destination and month (see semantic_cache).
+    
+    Args:
+        query: Free-text user query
+        preferences: Preferences provided by the client (may be partial)
+        booking_history: Recent bookings for the traveler
+        profile: Materialized traveler profile (None without travelerId)
+        deadline: Request deadline
+        booking_context: Hydrated booking context (scopes the near-duplicate lookup)
+        
+    Returns:
+        Complete preferences dictionary (provided values take priority)
+    """
+    preferences = dict(preferences or {})
     
     # Check if we need to infer preferences
     needs_inference = (
@@ -521,82 +790,405 @@ def create_travel_plan(
         len(preferences.get("interests", [])) == 0
     )
     
-    if needs_inference:
-        print("Starting AI preference inference...")
-        print("Reason: preferences are empty or incomplete")
+    if not needs_inference:
+        print("Using provided preferences:")
+        print(f"   Budget: {preferences.get('budget')}")
+        print(f"   Interests: {preferences.get('interests')}")
+        return preferences
+    
+    print("Starting AI preference inference...")
+    print("Reason: preferences are empty or incomplete")
+    
+    # Reuse the profile's inferred preferences while the booking history is unchanged
+    cached_prefs = traveler_profile.get_cached_preferences(profile)
+    if cached_prefs:
+        print("Booking history unchanged, reusing stored profile preferences")
+        inferred_prefs = traveler_profile.combine_with_query(cached_prefs, query)
+    else:
+        location = (booking_context or {}).get("location") or ""
+        dates = (booking_context or {}).get("dates") or {}
+        guard = fingerprint([booking_history or [], preferences])
+        inferred_prefs = semantic_cache.lookup("preferences", query, location, dates, guard)
+        if inferred_prefs:
+            print("Near-duplicate query seen before, reusing its inferred preferences")
+        else:
+            # Use AI to infer preferences from history and query
+            inferred_prefs = deadline.run_stage(
+                "preferences",
+                infer_preferences_from_history_and_query,
+                booking_history,
+                query,
+                preferences,
+                share=0.2,
+                fallback=lambda: preference_classifier.classify_preferences(
+                    query, booking_history, preferences
+                )
+            )
+            if inferred_prefs and "preferences" not in deadline.degraded:
+                semantic_cache.store("preferences", query, location, dates, guard, inferred_prefs)
+        if profile is not None and inferred_prefs:
+            traveler_profile.store_inferred_preferences(profile, inferred_prefs, query)
+    
+    # Merge inferred preferences with existing ones (existing takes priority)
+    if inferred_prefs:
+        if not preferences.get("budget"):
+            preferences["budget"] = inferred_prefs.get("budget", "medium")
         
-        # Use AI to infer preferences from history and query
-        inferred_prefs = infer_preferences_from_history_and_query(
-            booking_history,
-            query,
-            preferences
-        )
+        existing_interests = set(preferences.get("interests", []))
+        inferred_interests = set(inferred_prefs.get("interests", []))
+        preferences["interests"] = sorted(existing_interests | inferred_interests)
         
-        # Merge inferred preferences with existing ones (existing takes priority)
-        if inferred_prefs:
-            if not preferences.get("budget"):
-                preferences["budget"] = inferred_prefs.get("budget", "medium")
-            
-            existing_interests = set(preferences.get("interests", []))
-            inferred_interests = set(inferred_prefs.get("interests", []))
-            preferences["interests"] = list(existing_interests | inferred_interests)
-            
-            if not preferences.get("dietaryFilters"):
-                preferences["dietaryFilters"] = inferred_prefs.get("dietaryFilters", [])
-            
-            if not preferences.get("mobilityNeeds"):
-                preferences["mobilityNeeds"] = inferred_prefs.get("mobilityNeeds", [])
-            
-            print("Final preferences after AI inference:")
-            print(f"   Budget: {preferences.get('budget')}")
-            print(f"   Interests: {preferences.get('interests')}")
-            print(f"   Dietary: {preferences.get('dietaryFilters')}")
-    else:
-        print("Using provided preferences:")
+        if not preferences.get("dietaryFilters"):
+            preferences["dietaryFilters"] = inferred_prefs.get("dietaryFilters", [])
+        
+        if not preferences.get("mobilityNeeds"):
+            preferences["mobilityNeeds"] = inferred_prefs.get("mobilityNeeds", [])
+        
+        print("Final preferences after AI inference:")
         print(f"   Budget: {preferences.get('budget')}")
         print(f"   Interests: {preferences.get('interests')}")
+        print(f"   Dietary: {preferences.get('dietaryFilters')}")
+    
+    return preferences
+
+
+def extraction_inputs(
+    name: str,
+    search_results: List[Dict],
+    party_type: str,
+    preferences: Dict[str, Any]
+) -> tuple:
+    """Arguments (and stage inputs) of the activities or restaurants extraction"""
+    if name == "activities":
+        return (search_results, party_type, preferences.get("interests", []), preferences.get("mobilityNeeds", []))
+    return (search_results, preferences.get("dietaryFilters", []), preferences.get("budget", "medium"))
+
+
+EXTRACTIONS = (("pois", "activities", extract_activities), ("restaurants", "restaurants", extract_restaurants))
+
+
+def warm_destination(location: str, profile: Dict[str, Any], max_calls: int) -> int:
+    """
+    Precompute the POI and restaurant searches and extractions for a city and preference profile
+    
+    Stage inputs are built exactly as in build_travel_plan, so a later plan for
+    the city with the same resolved preferences and party type reuses them
+    through the shared stage cache. Results that are still fresh are skipped.
+    
+    Args:
+        location: City to warm
+        profile: Resolved preferences plus partyType (from cache_warmer.top_profiles)
+        max_calls: Outbound calls (searches plus LLM extractions) this city may use
+        
+    Returns:
+        Outbound calls made
+    """
+    party_type = profile.get("partyType") or "solo"
+    stages = StageCache(shared=plan_cache.peek_stage)
+    inputs = tavily_search.search_inputs(location, {}, profile)
+    calls = 0
+    
+    for category, name, extract in EXTRACTIONS:
+        hit, results = stages.lookup(f"search.{category}", inputs[category])
+        if not hit:
+            if calls >= max_calls:
+                break
+            results = tavily_search.category_search(category, location, {}, profile)
+            calls += 1
+            if results:
+                stages.store(f"search.{category}", inputs[category], results)
+        
+        stage_inputs = extraction_inputs(name, results, party_type, profile)
+        hit, _ = stages.lookup(name, stage_inputs)
+        if not hit and results:
+            if calls >= max_calls:
+                break
+            items = extract(*stage_inputs)
+            calls += 1
+            if items:
+                stages.store(name, stage_inputs, items)
+    
+    plan_cache.share_stages({name: stages.entries[name] for name in stages.computed}, warmed=True)
+    return calls
+
+
+def load_plan_context(booking_context: Dict[str, Any]):
+    """
+    Hydrate the booking context and load the traveler's history
+    
+    Hydration from bookingId/propertyId runs while the history loads.
+    
+    Returns:
+        Tuple of (hydrated booking context, profile or None, booking history list)
+    """
+    traveler_id = booking_context.get("travelerId")
+    hydration = None
+    if booking_context.get("bookingId") or booking_context.get("propertyId"):
+        hydration = executor.submit(profiling.bind(hydrate_booking_context), booking_context)
+    
+    profile, booking_history = load_traveler_history(traveler_id)
+    
+    if hydration is not None:
+        booking_context = hydration.result()
+        # The traveler may only be known from the booking
+        if not traveler_id and booking_context.get("travelerId"):
+            profile, booking_history = load_traveler_history(booking_context["travelerId"])
+    return booking_context, profile, booking_history
+
+
+def create_travel_plan(
+    query: str,
+    booking_context: Dict[str, Any],
+    preferences: Dict[str, Any],
+    deadline: Optional[Deadline] = None,
+    stages: Optional[StageCache] = None
+) -> Dict[str, Any]:
+    """
+    Main function to create complete travel plan with AI preference inference
+    
+    Identical requests (same normalized context, preferences, query and
+    booking history) are served from the plan cache; a stale cached plan is
+    served immediately while a background refresh recomputes only its expired
+    stages. Otherwise a fresh cached plan for a near-duplicate query with the
+    same context is served, and on a miss stage results that are still fresh
+    are reused.
+    
+    Args:
+        query: Free-text user query
+        booking_context: Booking details (travelerId, bookingId, propertyId, location, dates,
+            partyType, guests); fields left out are hydrated from bookingId/propertyId
+        preferences: User preferences (budget, interests, mobilityNeeds, dietaryFilters)
+        deadline: End-to-end request deadline (defaults to PLAN_DEADLINE_SECONDS)
+        stages: Stage results from a previous run of the same plan session
+        
+    Returns:
+        Complete travel plan with all components
+    """
+    deadline = deadline or Deadline()
+    stages = stages if stages is not None else StageCache()
+    stages.shared = plan_cache.shared_stage
+    
+    with profiling.span("context"):
+        booking_context, profile, booking_history = load_plan_context(booking_context)
+    cache_key = plan_cache.plan_key(query, booking_context, preferences, booking_history)
+    
+    with profiling.span("plan_cache"):
+        cached = plan_cache.get(cache_key)
+    if cached is not None:
+        print(f"Serving {'stale' if cached['stale'] else 'fresh'} plan from cache")
+        if cached["stale"]:
+            plan_cache.refresh(
+                cache_key,
+                lambda: build_cached_plan(
+                    cache_key, query, booking_context, preferences, profile, booking_history,
+                    Deadline(), StageCache(plan_cache.fresh_stages(cache_key), shared=plan_cache.shared_stage)
+                ),
+                booking_context.get("travelerId")
+            )
+        stages.entries.update(cached["stages"])
+        stages.reused.extend(cached["stages"])
+        return {
+            **cached["plan"],
+            "degradedSections": [],
+            "reusedStages": stages.reused,
+            "cacheStatus": "stale" if cached["stale"] else "hit"
+        }
+    
+    similar_key = semantic_cache.lookup(
+        "plan", query, booking_context.get("location") or "", booking_context.get("dates") or {},
+        plan_cache.context_key(booking_context, preferences, booking_history)
+    )
+    similar = plan_cache.get(similar_key) if similar_key else None
+    if similar is not None and not similar["stale"]:
+        print("Serving plan of a near-duplicate query from cache")
+        stages.entries.update(similar["stages"])
+        stages.reused.extend(similar["stages"])
+        return {**similar["plan"], "degradedSections": [], "reusedStages": stages.reused, "cacheStatus": "similar"}
+    
+    plan = build_cached_plan(
+        cache_key, query, booking_context, preferences, profile, booking_history, deadline, stages
+    )
+    plan["cacheStatus"] = "miss"
+    return plan
+
+
+def build_cached_plan(
+    cache_key: str,
+    query: str,
+    booking_context: Dict[str, Any],
+    preferences: Dict[str, Any],
+    profile: Optional[Dict[str, Any]],
+    booking_history: list,
+    deadline: Deadline,
+    stages: StageCache
+) -> Dict[str, Any]:
+    """Build a plan and cache it unless a section had to degrade"""
+    plan = build_travel_plan(query, booking_context, preferences, profile, booking_history, deadline, stages)
+    if not plan["degradedSections"]:
+        plan_cache.put(cache_key, plan, stages.entries)
+        semantic_cache.store(
+            "plan", query, booking_context.get("location") or "", booking_context.get("dates") or {},
+            plan_cache.context_key(booking_context, preferences, booking_history), cache_key
+        )
+    return plan
+
+
+def build_travel_plan(
+    query: str,
+    booking_context: Dict[str, Any],
+    preferences: Dict[str, Any],
+    profile: Optional[Dict[str, Any]],
+    booking_history: list,
+    deadline: Deadline,
+    stages: StageCache
+) -> Dict[str, Any]:
+    """
+    Run the plan pipeline for a hydrated booking context
+    
+    Each stage gets a share of the time left before the deadline; a stage that
+    runs out of time is replaced by its fallback and listed in degradedSections.
+    Stages whose inputs match a result in the StageCache are reused instead of
+    recomputed.
+    
+    Args:
+        query: Free-text user query
+        booking_context: Hydrated booking context
+        preferences: User preferences as sent by the client
+        profile: Materialized traveler profile (None without travelerId)
+        booking_history: Recent bookings for the traveler
+        deadline: End-to-end request deadline
+        stages: Stage results to reuse (from the plan session or cache)
+        
+    Returns:
+        Complete travel plan with all components
+    """
+    print("=" * 70)
+    print("Starting travel plan generation...")
+    print(f"Location: {booking_context.get('location')}")
+    print(f"Dates: {booking_context.get('dates')}")
+    
+    # Extract context
+    location = booking_context.get("location") or "Unknown"
+    dates = booking_context.get("dates") or {}
+    party_type = booking_context.get("partyType") or "solo"
+    guests = booking_context.get("guests") or 1
+    
+    preferences = stages.run(
+        "preferences",
+        (query, booking_history, preferences),
+        lambda: resolve_preferences(query, preferences, booking_history, profile, deadline, booking_context),
+        deadline
+    )
+    mobility_needs = preferences.get("mobilityNeeds", [])
+    cache_warmer.record_profile(party_type, preferences)
     
     print("Performing Tavily search...")
-    search_results = tavily_search.comprehensive_search(location, dates, preferences)
+    search_inputs = tavily_search.search_inputs(location, dates, preferences)
+    cached_results = {}
+    for category, inputs in search_inputs.items():
+        hit, output = stages.lookup(f"search.{category}", inputs)
+        if hit:
+            cached_results[category] = output
+    
+    with profiling.span("search"):
+        search_results = tavily_search.comprehensive_search(
+            location, dates, preferences, deadline=deadline, share=0.35, cached=cached_results
+        )
+    for category, inputs in search_inputs.items():
+        if category not in cached_results and \
+                tavily_search.SEARCH_SECTIONS[category] not in deadline.degraded:
+            stages.store(f"search.{category}", inputs, search_results[category])
+    weather = search_results["weather"]
     
     print("Extracting activities...")
-    activities = extract_activities(
-        search_results["pois"],
-        party_type,
-        preferences.get("interests", []),
-        preferences.get("mobilityNeeds", [])
+    activity_inputs = extraction_inputs("activities", search_results["pois"], party_type, preferences)
+    activities = stages.run(
+        "activities",
+        activity_inputs,
+        lambda: deadline.run_stage(
+            "activities",
+            extract_activities,
+            *activity_inputs,
+            share=0.3,
+            fallback=list
+        ),
+        deadline
     )
     
     print("Extracting restaurants...")
-    restaurants = extract_restaurants(
-        search_results["restaurants"],
-        preferences.get("dietaryFilters", []),
-        preferences.get("budget", "medium")
+    restaurant_inputs = extraction_inputs("restaurants", search_results["restaurants"], party_type, preferences)
+    restaurants = stages.run(
+        "restaurants",
+        restaurant_inputs,
+        lambda: deadline.run_stage(
+            "restaurants",
+            extract_restaurants,
+            *restaurant_inputs,
+            share=0.35,
+            fallback=list
+        ),
+        deadline
     )
     
+    # Feed extraction yield back to the search planner (fresh, non-degraded results only)
+    for category, section, items in (("pois", "activities", activities), ("restaurants", "restaurants", restaurants)):
+        if section in stages.computed and section not in deadline.degraded:
+            search_planner.record_yield(location, category, search_results[category], items)
+    
+    print("Indexing local events...")
+    events = index_events(location, dates, search_results["events"], stages, deadline)
+    
     print("Generating day-by-day plan...")
-    day_by_day_plan = generate_day_by_day_plan(
-        location=location,
-        dates=dates,
-        guests=guests,
-        party_type=party_type,
-        activities=activities,
-        restaurants=restaurants,
-        weather=search_results["weather"],
-        events=search_results["events"],
-        preferences=preferences,
-        user_query=query
-    )
+    with profiling.span("schedule"):
+        day_by_day_plan = schedule_day_by_day_plan(
+            location, dates, party_type, activities, restaurants, weather, preferences, events
+        )
+    if ITINERARY_LLM_POLISH:
+        scheduled_plan = day_by_day_plan
+        day_by_day_plan = stages.run(
+            "dayByDayPlan",
+            (location, scheduled_plan, guests, party_type, preferences, query),
+            lambda: deadline.run_stage(
+                "dayByDayPlan",
+                polish_day_by_day_plan,
+                location=location,
+                plans=scheduled_plan,
+                guests=guests,
+                party_type=party_type,
+                activities=activities,
+                preferences=preferences,
+                user_query=query,
+                share=0.85,
+                fallback=lambda: scheduled_plan
+            ),
+            deadline
+        )
     
     print("Generating packing checklist...")
-    packing_checklist = generate_packing_checklist(
-        location=location,
-        dates=dates,
-        weather=search_results["weather"],
-        activities=activities,
-        party_type=party_type,
-        mobility_needs=preferences.get("mobilityNeeds", [])
-    )
+    if PACKING_LLM_ENRICHMENT:
+        packing_checklist = stages.run(
+            "packingChecklist",
+            (location, dates, weather_for_prompt(weather), activities, party_type, mobility_needs),
+            lambda: deadline.run_stage(
+                "packingChecklist",
+                generate_packing_checklist,
+                location=location,
+                dates=dates,
+                weather=weather,
+                activities=activities,
+                party_type=party_type,
+                mobility_needs=mobility_needs,
+                fallback=lambda: packing_rules.build_checklist(
+                    dates, weather, activities, party_type, mobility_needs
+                )
+            ),
+            deadline
+        )
+    else:
+        with profiling.span("packing"):
+            packing_checklist = packing_rules.build_checklist(
+                dates, weather, activities, party_type, mobility_needs
+            )
     
     response = {
         "success": True,
@@ -605,19 +1197,14 @@ def create_travel_plan(
         "restaurants": restaurants[:15],
         "packingChecklist": packing_checklist,
         "localContext": {
-            "weather": search_results["weather"],
-            "events": [
-                {
-                    "name": event.get("title", "Local Event"),
-                    "url": event.get("url", ""),
-                    "description": event.get("content", "")[:200]
-                }
-                for event in search_results["events"][:5]
-            ],
+            "weather": weather,
+            "events": events,
             "transportation": {
                 "recommendation": f"Research public transportation options in {location}."
             }
-        }
+        },
+        "degradedSections": deadline.degraded,
+        "reusedStages": stages.reused
     }
     
     print("Travel plan generated successfully!")
@@ -0,0 +1,193 @@
+"""
+Popularity-driven cache warming for AI Agent
+Precomputes searches and extractions for the most booked cities and the most requested preference profiles
+"""
+
+import json
+import os
+import threading
+import time
+from typing import Dict, Any, Callable, List, Optional
+
+import database
+import metrics
+import work_scheduler
+
+# Warming spends paid Tavily/OpenAI calls (up to CACHE_WARM_MAX_CALLS per cycle, per process), so it is opt-in
+WARM_ENABLED = os.getenv("CACHE_WARM_ENABLED", "false").lower() == "true"
+
+# Seconds between warming cycles (0 disables warming)
+WARM_INTERVAL_SECONDS = float(os.getenv("CACHE_WARM_INTERVAL_SECONDS", 1800))
+
+WARM_TOP_CITIES = int(os.getenv("CACHE_WARM_TOP_CITIES", 10))
+WARM_TOP_PROFILES = int(os.getenv("CACHE_WARM_TOP_PROFILES", 3))
+
+# Outbound calls (searches plus LLM extractions) a cycle may spend
+WARM_MAX_CALLS = int(os.getenv("CACHE_WARM_MAX_CALLS", 40))
+
+# City ranking: bookings created recently, plus stays starting soon weighted higher
+WARM_RECENT_DAYS = int(os.getenv("CACHE_WARM_RECENT_DAYS", 30))
+WARM_UPCOMING_DAYS = int(os.getenv("CACHE_WARM_UPCOMING_DAYS", 60))
+WARM_UPCOMING_WEIGHT = float(os.getenv("CACHE_WARM_UPCOMING_WEIGHT", 2.0))
+
+PROFILES_PATH = os.getenv(
+    "CACHE_WARM_PROFILES_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "warm_profiles.json")
+)
+
+# Profile counts shrink by this factor each cycle so old favourites fade out
+PROFILE_DECAY = 0.9
+MAX_PROFILES = 500
+
+_lock = threading.Lock()
+_started = False
+_last_cycle: Dict[str, Any] = {}
+
+
+def _load_profiles() -> Dict[str, float]:
+    """Read persisted profile counts (empty on first run or a corrupt file)"""
+    try:
+        with open(PROFILES_PATH, "r", encoding="utf-8") as f:
+            counts = json.load(f)
+        return {str(k): float(v) for k, v in counts.items()}
+    except (OSError, ValueError, AttributeError):
+        return {}
+
+
+_profiles = _load_profiles()
+
+
+def _save_profiles() -> None:
+    """Persist profile counts (caller holds the lock)"""
+    try:
+        tmp_path = f"{PROFILES_PATH}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(_profiles, f)
+        os.replace(tmp_path, PROFILES_PATH)
+    except OSError as e:
+        print(f"Warning: could not save warming profiles: {e}")
+
+
+def record_profile(party_type: str, preferences: Dict[str, Any]) -> None:
+    """
+    Count the resolved preferences of a plan request
+
+    Lists are kept in the order the plan used them, since that order is part
+    of the search and extraction stage inputs the warmer has to reproduce.
+    """
+    profile = json.dumps({
+        "partyType": party_type,
+        "budget": preferences.get("budget", "medium"),
+        "interests": list(preferences.get("interests", []) or []),
+        "dietaryFilters": list(preferences.get("dietaryFilters", []) or []),
+        "mobilityNeeds": list(preferences.get("mobilityNeeds", []) or [])
+    }, sort_keys=True)
+    with _lock:
+        _profiles[profile] = _profiles.get(profile, 0.0) + 1
+        if len(_profiles) > MAX_PROFILES:
+            del _profiles[min(_profiles, key=_profiles.get)]
+
+
+def top_profiles(limit: int) -> List[Dict[str, Any]]:
+    """Most requested preference profiles, most common first"""
+    with _lock:
+        ranked = sorted(_profiles.items(), key=lambda item: -item[1])[:limit]
+    return [json.loads(profile) for profile, _ in ranked]
+
+
+def _decay_profiles() -> None:
+    """Age profile counts and persist them"""
+    with _lock:
+        for profile in list(_profiles):
+            _profiles[profile] *= PROFILE_DECAY
+            if _profiles[profile] < 0.05:
+                del _profiles[profile]
+        _save_profiles()
+
+
+def run_cycle(warm: Callable[[str, Dict[str, Any], int], int]) -> Dict[str, Any]:
+    """
+    Warm the top cities for the top profiles within the outbound call budget
+
+    Args:
+        warm: Precomputes one (city, profile) and returns the outbound calls it made
+
+    Returns:
+        Summary of the cycle
+    """
+    started = time.monotonic()
+    cities = database.get_popular_cities(
+        WARM_TOP_CITIES, WARM_RECENT_DAYS, WARM_UPCOMING_DAYS, WARM_UPCOMING_WEIGHT
+    )
+    profiles = top_profiles(WARM_TOP_PROFILES)
+
+    calls_left = WARM_MAX_CALLS
+    warmed = 0
+    for city in cities:
+        for profile in profiles:
+            if calls_left <= 0:
+                break
+            try:
+                used = warm(city["city"], profile, calls_left)
+            except Exception as e:
+                print(f"Warning: warming {city['city']} failed: {e}")
+                continue
+            calls_left -= used
+            warmed += 1 if used else 0
+
+    _decay_profiles()
+    summary = {
+        "finishedAt": time.time(),
+        "durationMs": round((time.monotonic() - started) * 1000, 1),
+        "cities": [city["city"] for city in cities],
+        "profiles": len(profiles),
+        "calls": WARM_MAX_CALLS - calls_left,
+        "combinationsWarmed": warmed
+    }
+    metrics.increment("cache_warm_calls", summary["calls"])
+    with _lock:
+        _last_cycle.clear()
+        _last_cycle.update(summary)
+    print(f"Cache warming: {warmed} city/profile combinations warmed with {summary['calls']} calls")
+    return summary
+
+
+def _loop(warm: Callable[[str, Dict[str, Any], int], int]) -> None:
+    """Run a warming cycle on the scheduler's batch class every WARM_INTERVAL_SECONDS"""
+    while True:
+        future = work_scheduler.submit(run_cycle, warm, priority=work_scheduler.BATCH)
+        try:
+            future.result()
+        except work_scheduler.Preempted:
+            print("Warning: cache warming cycle preempted by interactive load")
+        except Exception as e:
+            print(f"Warning: cache warming cycle failed: {e}")
+        time.sleep(WARM_INTERVAL_SECONDS)
+
+
+def start(warm: Callable[[str, Dict[str, Any], int], int]) -> None:
+    """Start periodic warming (no-op when disabled or already started)"""
+    global _started
+    with _lock:
+        if _started or not WARM_ENABLED or WARM_INTERVAL_SECONDS <= 0:
+            return
+        _started = True
+    threading.Thread(target=_loop, args=(warm,), name="cache-warmer", daemon=True).start()
+
+
+def status() -> Dict[str, Any]:
+    """Last cycle summary and how often plans reuse warmed stage results"""
+    counters = metrics.snapshot()["counters"]
+    warmed_hits = counters.get("shared_stage_warmed_hits", 0)
+    hits = counters.get("shared_stage_hits", 0)
+    lookups = warmed_hits + hits + counters.get("shared_stage_misses", 0)
+    with _lock:
+        last_cycle: Optional[Dict[str, Any]] = dict(_last_cycle) or None
+        profiles = len(_profiles)
+    return {
+        "enabled": WARM_ENABLED and WARM_INTERVAL_SECONDS > 0,
+        "trackedProfiles": profiles,
+        "lastCycle": last_cycle,
+        "sharedStageHitRate": round((hits + warmed_hits) / lookups, 3) if lookups else 0.0,
+        "warmedHitRate": round(warmed_hits / lookups, 3) if lookups else 0.0
+    }
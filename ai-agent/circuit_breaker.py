@@ -0,0 +1,186 @@
+"""
+Circuit breakers for AI Agent
+Per-dependency closed/open/half-open breakers driven by error rate and slow calls
+"""
+
+import os
+import threading
+import time
+from collections import deque
+from typing import Dict, Any, Callable
+
+import metrics
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a dependency whose circuit is open"""
+
+
+class CircuitBreaker:
+    """
+    Sliding-window circuit breaker
+
+    Calls that raise or take longer than slow_call_seconds count as bad. When the
+    bad-call rate over the last `window` calls reaches failure_rate (with at least
+    min_calls recorded) the circuit opens and calls fail fast for open_seconds.
+    It then lets half_open_calls probes through; if they succeed it closes again.
+    Exceptions of the ignored types (local conditions such as an exhausted
+    connection pool) are re-raised without counting as an outcome.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        failure_rate: float = 0.5,
+        slow_call_seconds: float = 30.0,
+        window: int = 20,
+        min_calls: int = 5,
+        open_seconds: float = 30.0,
+        half_open_calls: int = 1,
+        ignored: tuple = ()
+    ):
+        self.name = name
+        self.failure_rate = failure_rate
+        self.slow_call_seconds = slow_call_seconds
+        self.min_calls = min_calls
+        self.open_seconds = open_seconds
+        self.half_open_calls = half_open_calls
+        self.ignored = ignored
+        self.outcomes = deque(maxlen=window)
+        self.state = CLOSED
+        self.opened_at = 0.0
+        self.probes = 0
+        self.lock = threading.Lock()
+
+    def _transition(self, state: str) -> None:
+        """Change state (caller holds the lock)"""
+        if state != self.state:
+            print(f"Circuit {self.name}: {self.state} -> {state}")
+            metrics.increment(f"circuit_{self.name}_{state}")
+        self.state = state
+        if state == OPEN:
+            self.opened_at = time.monotonic()
+        if state in (OPEN, CLOSED):
+            self.probes = 0
+        if state == CLOSED:
+            self.outcomes.clear()
+
+    def allow(self) -> bool:
+        """Check (and reserve, when half-open) permission to call the dependency"""
+        with self.lock:
+            if self.state == OPEN and time.monotonic() - self.opened_at >= self.open_seconds:
+                self._transition(HALF_OPEN)
+            if self.state == CLOSED:
+                return True
+            if self.state == HALF_OPEN and self.probes < self.half_open_calls:
+                self.probes += 1
+                return True
+            return False
+
+    def is_open(self) -> bool:
+        """True while calls are being short-circuited"""
+        with self.lock:
+            return self.state == OPEN and time.monotonic() - self.opened_at < self.open_seconds
+
+    def check(self) -> None:
+        """Fail fast before queueing for a dependency whose circuit is open"""
+        if self.is_open():
+            metrics.increment(f"circuit_{self.name}_short_circuited")
+            raise CircuitOpenError(f"{self.name} circuit is open")
+
+    def record(self, bad: bool) -> None:
+        """Record a call outcome and open or close the circuit accordingly"""
+        with self.lock:
+            if self.state == HALF_OPEN:
+                self._transition(OPEN if bad else CLOSED)
+                return
+            self.outcomes.append(bad)
+            if len(self.outcomes) >= self.min_calls and \
+                    sum(self.outcomes) / len(self.outcomes) >= self.failure_rate:
+                self._transition(OPEN)
+
+    def call(self, fn: Callable, *args, **kwargs) -> Any:
+        """
+        Call a dependency through the breaker
+
+        Raises:
+            CircuitOpenError: if the circuit is open
+        """
+        if not self.allow():
+            metrics.increment(f"circuit_{self.name}_short_circuited")
+            raise CircuitOpenError(f"{self.name} circuit is open")
+
+        started = time.monotonic()
+        try:
+            result = fn(*args, **kwargs)
+        except self.ignored:
+            with self.lock:
+                # Hand back a half-open probe that never reached the dependency
+                if self.state == HALF_OPEN and self.probes:
+                    self.probes -= 1
+            raise
+        except Exception:
+            self.record(True)
+            raise
+        self.record(time.monotonic() - started > self.slow_call_seconds)
+        return result
+
+    def status(self) -> Dict[str, Any]:
+        """State summary for health and metrics endpoints"""
+        with self.lock:
+            outcomes = list(self.outcomes)
+            state = self.state
+            if state == OPEN and time.monotonic() - self.opened_at >= self.open_seconds:
+                state = HALF_OPEN
+            return {
+                "state": state,
+                "recentCalls": len(outcomes),
+                "badCallRate": round(sum(outcomes) / len(outcomes), 3) if outcomes else 0.0,
+                "openForSeconds": round(max(0.0, self.open_seconds - (time.monotonic() - self.opened_at)), 1)
+                if state == OPEN else 0.0
+            }
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_registry_lock = threading.Lock()
+
+BREAKER_SETTINGS = {
+    "openai": {
+        "slow_call_seconds": float(os.getenv("OPENAI_SLOW_CALL_SECONDS", 45)),
+        "open_seconds": float(os.getenv("OPENAI_CIRCUIT_OPEN_SECONDS", 30))
+    },
+    "tavily": {
+        "slow_call_seconds": float(os.getenv("TAVILY_SLOW_CALL_SECONDS", 15)),
+        "open_seconds": float(os.getenv("TAVILY_CIRCUIT_OPEN_SECONDS", 30))
+    },
+    "mysql": {
+        "slow_call_seconds": float(os.getenv("MYSQL_SLOW_CALL_SECONDS", 3)),
+        "open_seconds": float(os.getenv("MYSQL_CIRCUIT_OPEN_SECONDS", 15))
+    }
+}
+
+
+def get_breaker(name: str, **overrides) -> CircuitBreaker:
+    """Return the shared breaker for a dependency, creating it on first use"""
+    with _registry_lock:
+        if name not in _breakers:
+            settings = {
+                "failure_rate": float(os.getenv("CIRCUIT_FAILURE_RATE", 0.5)),
+                "window": int(os.getenv("CIRCUIT_WINDOW", 20)),
+                "min_calls": int(os.getenv("CIRCUIT_MIN_CALLS", 5)),
+                **BREAKER_SETTINGS.get(name, {}),
+                **overrides
+            }
+            _breakers[name] = CircuitBreaker(name, **settings)
+        return _breakers[name]
+
+
+def status() -> Dict[str, Dict[str, Any]]:
+    """Status of every breaker created so far"""
+    with _registry_lock:
+        breakers = list(_breakers.values())
+    return {b.name: b.status() for b in breakers}
@@ -0,0 +1,177 @@
+"""
+Offline climate normals for AI Agent
+Indexed city-by-month lookup used to build weather context without a network call
+"""
+
+import json
+import os
+from datetime import datetime, date, timedelta
+from typing import Dict, Any, Optional
+
+NORMALS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "climate_normals.json")
+
+# Trips starting within this many days use a live forecast search as well
+FORECAST_WINDOW_DAYS = int(os.getenv("WEATHER_FORECAST_WINDOW_DAYS", 10))
+
+CITY_ALIASES = {
+    "nyc": "new york",
+    "new york city": "new york",
+    "manhattan": "new york",
+    "brooklyn": "new york",
+    "la": "los angeles",
+    "sf": "san francisco",
+    "roma": "rome",
+    "lisboa": "lisbon"
+}
+
+
+def _load_normals() -> Dict[str, Dict[str, Any]]:
+    """Load the bundled dataset once into a dict keyed by normalized city name"""
+    try:
+        with open(NORMALS_PATH, encoding="utf-8") as f:
+            return json.load(f)["cities"]
+    except (OSError, ValueError, KeyError) as e:
+        print(f"Warning: Failed to load climate normals: {e}")
+        return {}
+
+
+_NORMALS = _load_normals()
+
+
+def normalize_city(location: str) -> str:
+    """Reduce "Paris, France" style locations to a dataset key"""
+    city = (location or "").split(",")[0].strip().lower()
+    return CITY_ALIASES.get(city, city)
+
+
+def lookup(location: str, month: int) -> Optional[Dict[str, float]]:
+    """
+    Look up climate normals for a city and month
+
+    Args:
+        location: City or destination name
+        month: Month number (1-12)
+
+    Returns:
+        Dictionary with highC, lowC, rainDays, daylightHours or None if the city is unknown
+    """
+    normals = _NORMALS.get(normalize_city(location))
+    if not normals or not 1 <= month <= 12:
+        return None
+    return {
+        "highC": normals["highC"][month - 1],
+        "lowC": normals["lowC"][month - 1],
+        "rainDays": normals["rainDays"][month - 1],
+        "daylightHours": normals["daylightHours"][month - 1]
+    }
+
+
+def _parse_dates(dates: Dict[str, str]) -> Optional[tuple]:
+    """Parse startDate/endDate into dates (end defaults to start)"""
+    try:
+        start = datetime.fromisoformat(dates.get("startDate", "")).date()
+        end_value = dates.get("endDate")
+        end = datetime.fromisoformat(end_value).date() if end_value else start
+        return start, max(end, start)
+    except (TypeError, ValueError, AttributeError):
+        return None
+
+
+def within_forecast_window(dates: Dict[str, str], today: Optional[date] = None) -> bool:
+    """Check whether the trip starts soon enough for a real forecast to matter"""
+    parsed = _parse_dates(dates or {})
+    if not parsed:
+        return False
+    today = today or date.today()
+    return parsed[0] - today <= timedelta(days=FORECAST_WINDOW_DAYS) and parsed[1] >= today
+
+
+def _describe(low: float, high: float, rain_days: float, daylight: float) -> str:
+    """Human-readable conditions summary"""
+    mean = (low + high) / 2
+    if mean < 2:
+        feel = "Cold"
+    elif mean < 10:
+        feel = "Cool"
+    elif mean < 18:
+        feel = "Mild"
+    elif mean < 26:
+        feel = "Warm"
+    else:
+        feel = "Hot"
+
+    if rain_days >= 12:
+        rain = "frequent rain"
+    elif rain_days >= 6:
+        rain = "occasional showers"
+    else:
+        rain = "mostly dry"
+
+    return f"{feel}, {rain} (~{rain_days:.0f} rain days/month), about {daylight:.0f}h of daylight"
+
+
+def _recommend(low: float, high: float, rain_days: float) -> str:
+    """Clothing recommendation for the expected conditions"""
+    parts = []
+    if low <= 0:
+        parts.append("Pack a warm winter coat, hat and gloves")
+    elif low <= 10:
+        parts.append("Pack warm layers and a jacket for cool mornings and evenings")
+    elif high >= 28:
+        parts.append("Pack light, breathable clothing and sun protection")
+    else:
+        parts.append("Pack light layers and a sweater for the evenings")
+    if rain_days >= 8:
+        parts.append("bring an umbrella or rain jacket")
+    return "; ".join(parts)
+
+
+def weather_for_trip(location: str, dates: Dict[str, str]) -> Optional[Dict[str, Any]]:
+    """
+    Build structured weather context from climate normals for the stay
+
+    Months are weighted by the number of trip days falling in each one.
+
+    Args:
+        location: City or destination name
+        dates: Dictionary with startDate and endDate
+
+    Returns:
+        Weather dictionary (temperature, conditions, recommendation plus numeric
+        highC, lowC, rainDays, daylightHours) or None if no normals are available
+    """
+    if normalize_city(location) not in _NORMALS:
+        return None
+
+    parsed = _parse_dates(dates or {})
+    if parsed:
+        start, end = parsed
+    else:
+        start = end = date.today()
+
+    # Weight each month by the number of trip days spent in it
+    weights = {}
+    for offset in range((end - start).days + 1):
+        current = start + timedelta(days=offset)
+        weights[current.month] = weights.get(current.month, 0) + 1
+
+    total = sum(weights.values())
+    totals = {"highC": 0.0, "lowC": 0.0, "rainDays": 0.0, "daylightHours": 0.0}
+    for month, count in weights.items():
+        normals = lookup(location, month)
+        for key in totals:
+            totals[key] += normals[key] * count / total
+
+    high, low = round(totals["highC"], 1), round(totals["lowC"], 1)
+    rain_days, daylight = round(totals["rainDays"], 1), round(totals["daylightHours"], 1)
+
+    return {
+        "temperature": f"{low:.0f} to {high:.0f}°C ({low * 9 / 5 + 32:.0f} to {high * 9 / 5 + 32:.0f}°F)",
+        "conditions": _describe(low, high, rain_days, daylight),
+        "recommendation": _recommend(low, high, rain_days),
+        "highC": high,
+        "lowC": low,
+        "rainDays": rain_days,
+        "daylightHours": daylight,
+        "source": "climate normals"
+    }
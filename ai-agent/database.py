@@ -4,11 +4,20 @@ Connects to MySQL database to retrieve booking context
 """
 
 import os
+import json
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
 import mysql.connector
 from mysql.connector import pooling, Error
-from typing import Optional, Dict, Any
+from mysql.connector.errors import PoolError
+from typing import Optional, Dict, Any, List, Callable
 from dotenv import load_dotenv
 
+import circuit_breaker
+import metrics
+
 load_dotenv()
 
 # Create connection pool
@@ -28,6 +37,383 @@ except Error as e:
     print(f"Error creating MySQL connection pool: {e}")
     db_pool = None
 
+# An exhausted pool is local back-pressure, not a MySQL failure
+mysql_breaker = circuit_breaker.get_breaker("mysql", ignored=(PoolError,))
+
+
+class DatabaseUnavailable(Error):
+    """Raised instead of connecting while the MySQL circuit is open"""
+
+
+def _run(work: Callable[[Any], Any]) -> Any:
+    """
+    Run work(connection) on a pooled connection through the MySQL circuit breaker
+    
+    Checkout, queries and fetches are one breaker call, so query errors and
+    slow queries count against MySQL while pool exhaustion does not.
+    
+    Raises:
+        DatabaseUnavailable: if the MySQL circuit is open
+        Error: if checkout or the work fails
+    """
+    def checked_out():
+        connection = db_pool.get_connection()
+        try:
+            return work(connection)
+        finally:
+            connection.close()
+    
+    try:
+        return mysql_breaker.call(checked_out)
+    except circuit_breaker.CircuitOpenError as e:
+        raise DatabaseUnavailable(str(e))
+
+
+def _execute(query: str, params: tuple = (), fetch: Optional[str] = "all", dictionary: bool = False) -> Any:
+    """
+    Run one statement through the MySQL circuit breaker
+    
+    Args:
+        query: SQL statement
+        params: Statement parameters
+        fetch: "all" or "one" to return rows, None to commit and return nothing
+        dictionary: Return rows as dictionaries
+    """
+    def execute(connection):
+        cursor = connection.cursor(dictionary=dictionary)
+        try:
+            cursor.execute(query, params)
+            if fetch == "all":
+                return cursor.fetchall()
+            if fetch == "one":
+                return cursor.fetchone()
+            connection.commit()
+            return None
+        finally:
+            cursor.close()
+    
+    return _run(execute)
+
+
+# Read-through cache: rows stay in memory until an updated_at sweep shows they changed
+CACHE_SWEEP_SECONDS = float(os.getenv("DB_CACHE_SWEEP_SECONDS", 5))
+CACHE_MAX_ENTRIES = int(os.getenv("DB_CACHE_MAX_ENTRIES", 10000))
+SWEEP_BATCH_SIZE = 500
+
+
+class RowCache:
+    """
+    Rows by id with the updated_at version they were read at
+    
+    Entries are only dropped by invalidate() (driven by sweep_caches) or when
+    the cache is full, so repeat lookups never touch the database. Every
+    invalidation bumps a generation; rows fetched while it moved are returned
+    but not cached, since the sweep may already have passed their change.
+    """
+    
+    def __init__(self, name: str, fetch_many):
+        self.name = name
+        self.fetch_many = fetch_many
+        self.rows: "OrderedDict[int, tuple]" = OrderedDict()
+        self.generation = 0
+        self.lock = threading.Lock()
+    
+    def get_many(self, ids: List[int]) -> Dict[int, Dict[str, Any]]:
+        """
+        Return rows for the given ids, fetching the missing ones in one query
+        
+        Raises:
+            Error: if the missing rows cannot be fetched
+        """
+        sweep_caches()
+        ids = list(dict.fromkeys(int(i) for i in ids if i is not None))
+        found = {}
+        with self.lock:
+            generation = self.generation
+            for row_id in ids:
+                if row_id in self.rows:
+                    self.rows.move_to_end(row_id)
+                    found[row_id] = self.rows[row_id][0]
+        metrics.increment(f"db_cache_{self.name}_hits", len(found))
+        
+        missing = [row_id for row_id in ids if row_id not in found]
+        if missing:
+            metrics.increment(f"db_cache_{self.name}_misses", len(missing))
+            fetched = self.fetch_many(missing)
+            with self.lock:
+                # Rows read before the first sweep set watermarks could miss invalidations,
+                # and rows read during an invalidation may predate the change it dropped
+                cacheable = _sweep_state["ready"] and self.generation == generation
+                for row_id, (row, version) in fetched.items():
+                    found[row_id] = row
+                    if cacheable:
+                        self.rows[row_id] = (row, version)
+                while len(self.rows) > CACHE_MAX_ENTRIES:
+                    self.rows.popitem(last=False)
+        
+        return {row_id: dict(found[row_id]) for row_id in ids if row_id in found}
+    
+    def invalidate(self, changes: Dict[int, Any], column: str = None) -> int:
+        """
+        Drop entries older than their change time
+        
+        Args:
+            changes: id -> updated_at of changed rows
+            column: Match changes against this row column instead of the entry id
+            
+        Returns:
+            Number of entries dropped
+        """
+        with self.lock:
+            if changes:
+                self.generation += 1
+            stale = []
+            for row_id, (row, version) in self.rows.items():
+                key = row_id if column is None else row.get(column)
+                # updated_at has one-second resolution, so a same-second change also invalidates
+                if key in changes and (version is None or version <= changes[key]):
+                    stale.append(row_id)
+            for row_id in stale:
+                del self.rows[row_id]
+        if stale:
+            metrics.increment(f"db_cache_{self.name}_invalidated", len(stale))
+        return len(stale)
+
+
+def _placeholders(values: List[Any]) -> str:
+    """%s list for an IN clause"""
+    return ", ".join(["%s"] * len(values))
+
+
+def _fetch_rows(query: str, ids: List[int]) -> Dict[int, tuple]:
+    """Run a bulk lookup whose rows carry a _version column; returns id -> (row, version)"""
+    rows = _execute(query.format(ids=_placeholders(ids)), tuple(ids), dictionary=True)
+    return {row["id"]: (row, row.pop("_version", None)) for row in rows}
+
+
+def _fetch_bookings(ids: List[int]) -> Dict[int, tuple]:
+    """Bulk booking lookup joined with property and traveler"""
+    rows = _fetch_rows("""
+        SELECT 
+            b.id,
+            b.property_id,
+            b.traveler_id,
+            b.start_date,
+            b.end_date,
+            b.guests,
+            b.total_price,
+            b.status,
+            p.name as property_name,
+            p.type as property_type,
+            p.city,
+            p.state,
+            p.country,
+            p.location,
+            p.price as price_per_night,
+            t.name as traveler_name,
+            t.email as traveler_email,
+            DATEDIFF(b.end_date, b.start_date) as nights,
+            GREATEST(b.updated_at, p.updated_at, t.updated_at) as _version
+        FROM bookings b
+        JOIN properties p ON b.property_id = p.id
+        JOIN travelers t ON b.traveler_id = t.id
+        WHERE b.id IN ({ids})
+    """, ids)
+    for row, _ in rows.values():
+        # Convert date objects to strings
+        if row.get('start_date'):
+            row['start_date'] = row['start_date'].strftime('%Y-%m-%d')
+        if row.get('end_date'):
+            row['end_date'] = row['end_date'].strftime('%Y-%m-%d')
+    return rows
+
+
+def _fetch_properties(ids: List[int]) -> Dict[int, tuple]:
+    """Bulk property lookup"""
+    return _fetch_rows("""
+        SELECT 
+            id,
+            owner_id,
+            name,
+            type,
+            location,
+            city,
+            state,
+            country,
+            price,
+            bedrooms,
+            bathrooms,
+            max_guests,
+            image_url,
+            description,
+            amenities,
+            updated_at as _version
+        FROM properties
+        WHERE id IN ({ids})
+    """, ids)
+
+
+def _fetch_travelers(ids: List[int]) -> Dict[int, tuple]:
+    """Bulk traveler lookup"""
+    return _fetch_rows("""
+        SELECT 
+            id,
+            name,
+            email,
+            city,
+            state,
+            country,
+            about,
+            languages,
+            updated_at as _version
+        FROM travelers
+        WHERE id IN ({ids})
+    """, ids)
+
+
+booking_cache = RowCache("bookings", _fetch_bookings)
+property_cache = RowCache("properties", _fetch_properties)
+traveler_cache = RowCache("travelers", _fetch_travelers)
+
+_sweep_lock = threading.Lock()
+_sweep_state = {"last": 0.0, "watermarks": {}, "ready": False}
+
+
+def _changed_since(cursor, table: str, since) -> Dict[int, Any]:
+    """
+    Ids and updated_at of rows changed at or after `since`, read in keyset batches
+    
+    The watermark second is re-read because updated_at has one-second resolution.
+    """
+    changes = {}
+    cursor.execute(
+        f"SELECT id, updated_at FROM {table} WHERE updated_at >= %s ORDER BY updated_at, id LIMIT %s",
+        (since, SWEEP_BATCH_SIZE)
+    )
+    while True:
+        rows = cursor.fetchall()
+        for row_id, updated_at in rows:
+            changes[row_id] = updated_at
+        if len(rows) < SWEEP_BATCH_SIZE:
+            return changes
+        last_updated, last_id = rows[-1]
+        cursor.execute(
+            f"SELECT id, updated_at FROM {table} "
+            f"WHERE updated_at > %s OR (updated_at = %s AND id > %s) ORDER BY updated_at, id LIMIT %s",
+            (last_updated, last_updated, last_id, SWEEP_BATCH_SIZE)
+        )
+
+
+def sweep_caches(force: bool = False) -> None:
+    """
+    Invalidate cached rows whose updated_at moved since the last sweep
+    
+    Runs at most every DB_CACHE_SWEEP_SECONDS, piggybacked on lookups; only one
+    thread sweeps while the others keep reading. Property and traveler changes
+    also drop the cached bookings that join them. If a sweep fails, cached rows
+    keep being served and the next lookup retries.
+    """
+    if not db_pool:
+        return
+    if not force and time.monotonic() - _sweep_state["last"] < CACHE_SWEEP_SECONDS:
+        return
+    if not _sweep_lock.acquire(blocking=False):
+        return
+    
+    def sweep(connection):
+        cursor = connection.cursor()
+        watermarks = _sweep_state["watermarks"]
+        for table, cache, joins in (
+            ("bookings", booking_cache, ()),
+            ("properties", property_cache, ("property_id",)),
+            ("travelers", traveler_cache, ("traveler_id",))
+        ):
+            if table not in watermarks:
+                # First sweep: start watching from the newest change (nothing is cached yet)
+                cursor.execute(f"SELECT MAX(updated_at) FROM {table}")
+                watermarks[table] = cursor.fetchone()[0] or datetime.min
+                continue
+            changes = _changed_since(cursor, table, watermarks[table])
+            if not changes:
+                continue
+            watermarks[table] = max(changes.values())
+            cache.invalidate(changes)
+            for column in joins:
+                booking_cache.invalidate(changes, column=column)
+        cursor.close()
+    
+    try:
+        _run(sweep)
+        _sweep_state["last"] = time.monotonic()
+        _sweep_state["ready"] = True
+    except Error as e:
+        print(f"Warning: cache invalidation sweep failed: {e}")
+    finally:
+        _sweep_lock.release()
+
+
+def get_bookings_by_ids(booking_ids: List[int]) -> Dict[int, Dict[str, Any]]:
+    """
+    Retrieve several bookings (with property and traveler details) at once
+    
+    Args:
+        booking_ids: Booking IDs
+        
+    Returns:
+        Dictionary of booking ID -> booking details (missing IDs are omitted)
+    """
+    if not db_pool:
+        print("Database pool not initialized")
+        return {}
+    
+    try:
+        return booking_cache.get_many(booking_ids)
+    except Error as e:
+        print(f"Error fetching bookings: {e}")
+        return {}
+
+
+def get_properties_by_ids(property_ids: List[int]) -> Dict[int, Dict[str, Any]]:
+    """
+    Retrieve several properties at once
+    
+    Args:
+        property_ids: Property IDs
+        
+    Returns:
+        Dictionary of property ID -> property details (missing IDs are omitted)
+    """
+    if not db_pool:
+        print("Database pool not initialized")
+        return {}
+    
+    try:
+        return property_cache.get_many(property_ids)
+    except Error as e:
+        print(f"Error fetching properties: {e}")
+        return {}
+
+
+def get_travelers_by_ids(traveler_ids: List[int]) -> Dict[int, Dict[str, Any]]:
+    """
+    Retrieve several traveler profiles at once
+    
+    Args:
+        traveler_ids: Traveler IDs
+        
+    Returns:
+        Dictionary of traveler ID -> traveler details (missing IDs are omitted)
+    """
+    if not db_pool:
+        print("Database pool not initialized")
+        return {}
+    
+    try:
+        return traveler_cache.get_many(traveler_ids)
+    except Error as e:
+        print(f"Error fetching travelers: {e}")
+        return {}
+
 
 def get_booking_by_id(booking_id: int) -> Optional[Dict[str, Any]]:
     """
@@ -39,155 +425,239 @@ def get_booking_by_id(booking_id: int) -> Optional[Dict[str, Any]]:
     Returns:
         Dictionary with booking details or None if not found
     """
+    return get_bookings_by_ids([booking_id]).get(int(booking_id))
+
+
+def get_property_by_id(property_id: int) -> Optional[Dict[str, Any]]:
+    """
+    Retrieve property details by ID
+    
+    Args:
+        property_id: The property ID
+        
+    Returns:
+        Dictionary with property details or None if not found
+    """
+    return get_properties_by_ids([property_id]).get(int(property_id))
+
+
+def get_traveler_preferences(traveler_id: int) -> Optional[Dict[str, Any]]:
+    """
+    Retrieve traveler profile for preferences
+    
+    Args:
+        traveler_id: The traveler ID
+        
+    Returns:
+        Dictionary with traveler details or None if not found
+    """
+    return get_travelers_by_ids([traveler_id]).get(int(traveler_id))
+
+
+PROFILE_JSON_COLUMNS = ("property_types", "cities", "booking_snapshots", "inferred_preferences")
+
+
+def get_traveler_profile(traveler_id: int) -> Optional[Dict[str, Any]]:
+    """
+    Retrieve the materialized preference profile for a traveler
+    
+    Args:
+        traveler_id: The traveler ID
+        
+    Returns:
+        Dictionary with profile aggregates (JSON columns decoded) or None if not found
+    """
     if not db_pool:
         print("Database pool not initialized")
         return None
     
     try:
-        connection = db_pool.get_connection()
-        cursor = connection.cursor(dictionary=True)
+        query = """
+            SELECT 
+                traveler_id,
+                booking_count,
+                avg_nights,
+                avg_guests,
+                property_types,
+                cities,
+                budget_tier,
+                booking_snapshots,
+                history_fingerprint,
+                inferred_preferences,
+                inferred_fingerprint,
+                last_synced_at
+            FROM traveler_profiles
+            WHERE traveler_id = %s
+        """
         
+        result = _execute(query, (traveler_id,), fetch="one", dictionary=True)
+        
+        if result:
+            for column in PROFILE_JSON_COLUMNS:
+                if result.get(column):
+                    result[column] = json.loads(result[column])
+        
+        return result
+        
+    except Error as e:
+        print(f"Error fetching traveler profile: {e}")
+        return None
+
+
+def get_traveler_bookings_since(traveler_id: int, since: Optional[Any] = None) -> List[Dict[str, Any]]:
+    """
+    Retrieve a traveler's bookings created or updated since a timestamp
+    
+    Args:
+        traveler_id: The traveler ID
+        since: Only return bookings created or updated at or after this (None for all)
+        
+    Returns:
+        List of booking history rows including created_at and updated_at
+    """
+    if not db_pool:
+        print("Database pool not initialized")
+        return []
+    
+    try:
         query = """
             SELECT 
                 b.id,
-                b.property_id,
-                b.traveler_id,
-                b.start_date,
-                b.end_date,
+                COALESCE(p.city, p.location) as location,
+                b.start_date as check_in_date,
+                b.end_date as check_out_date,
                 b.guests,
-                b.total_price,
                 b.status,
-                p.name as property_name,
+                DATEDIFF(b.end_date, b.start_date) as nights,
                 p.type as property_type,
-                p.city,
-                p.state,
-                p.country,
-                p.location,
                 p.price as price_per_night,
-                t.name as traveler_name,
-                t.email as traveler_email,
-                DATEDIFF(b.end_date, b.start_date) as nights
+                b.created_at,
+                b.updated_at
             FROM bookings b
             JOIN properties p ON b.property_id = p.id
-            JOIN travelers t ON b.traveler_id = t.id
-            WHERE b.id = %s
+            WHERE b.traveler_id = %s
         """
+        params = [traveler_id]
+        if since is not None:
+            query += " AND (b.updated_at >= %s OR b.created_at >= %s)"
+            params.extend([since, since])
         
-        cursor.execute(query, (booking_id,))
-        result = cursor.fetchone()
-        
-        cursor.close()
-        connection.close()
+        results = _execute(query, tuple(params), dictionary=True)
         
-        if result:
-            # Convert date objects to strings
-            if result.get('start_date'):
-                result['start_date'] = result['start_date'].strftime('%Y-%m-%d')
-            if result.get('end_date'):
-                result['end_date'] = result['end_date'].strftime('%Y-%m-%d')
+        for booking in results:
+            for key in ['check_in_date', 'check_out_date']:
+                if booking.get(key):
+                    booking[key] = str(booking[key])
         
-        return result
+        return results
         
     except Error as e:
-        print(f"Error fetching booking: {e}")
-        return None
+        print(f"Error fetching traveler bookings: {e}")
+        return []
 
 
-def get_property_by_id(property_id: int) -> Optional[Dict[str, Any]]:
+def save_traveler_profile(profile: Dict[str, Any]) -> bool:
     """
-    Retrieve property details by ID
+    Insert or update a traveler's materialized preference profile
     
     Args:
-        property_id: The property ID
+        profile: Dictionary with the traveler_profiles columns
         
     Returns:
-        Dictionary with property details or None if not found
+        True if saved, False otherwise
     """
     if not db_pool:
         print("Database pool not initialized")
-        return None
+        return False
     
     try:
-        connection = db_pool.get_connection()
-        cursor = connection.cursor(dictionary=True)
+        columns = [
+            "traveler_id", "booking_count", "avg_nights", "avg_guests",
+            "property_types", "cities", "budget_tier", "booking_snapshots",
+            "history_fingerprint", "inferred_preferences", "inferred_fingerprint",
+            "last_synced_at"
+        ]
+        values = [
+            json.dumps(profile.get(column), default=str)
+            if column in PROFILE_JSON_COLUMNS and profile.get(column) is not None
+            else profile.get(column)
+            for column in columns
+        ]
         
-        query = """
-            SELECT 
-                id,
-                owner_id,
-                name,
-                type,
-                location,
-                city,
-                state,
-                country,
-                price,
-                bedrooms,
-                bathrooms,
-                max_guests,
-                image_url,
-                description,
-                amenities
-            FROM properties
-            WHERE id = %s
+        query = f"""
+            INSERT INTO traveler_profiles ({", ".join(columns)})
+            VALUES ({", ".join(["%s"] * len(columns))})
+            ON DUPLICATE KEY UPDATE
+                {", ".join(f"{c} = VALUES({c})" for c in columns[1:])}
         """
         
-        cursor.execute(query, (property_id,))
-        result = cursor.fetchone()
+        _execute(query, tuple(values), fetch=None)
         
-        cursor.close()
-        connection.close()
-        
-        return result
+        return True
         
     except Error as e:
-        print(f"Error fetching property: {e}")
-        return None
+        print(f"Error saving traveler profile: {e}")
+        return False
 
 
-def get_traveler_preferences(traveler_id: int) -> Optional[Dict[str, Any]]:
+def get_popular_cities(
+    limit: int,
+    recent_days: int = 30,
+    upcoming_days: int = 60,
+    upcoming_weight: float = 2.0
+) -> List[Dict[str, Any]]:
     """
-    Retrieve traveler profile for preferences
+    Rank destination cities by recent and upcoming bookings
+    
+    Groups along the properties idx_city index and reaches bookings through
+    idx_property; rejected and cancelled bookings are ignored.
     
     Args:
-        traveler_id: The traveler ID
+        limit: Number of cities to return
+        recent_days: Bookings created within this many days count once
+        upcoming_days: Stays starting within this many days count upcoming_weight times
+        upcoming_weight: Weight of an upcoming stay relative to a recent booking
         
     Returns:
-        Dictionary with traveler details or None if not found
+        List of {city, recent, upcoming, score}, most popular first
     """
     if not db_pool:
         print("Database pool not initialized")
-        return None
+        return []
     
     try:
-        connection = db_pool.get_connection()
-        cursor = connection.cursor(dictionary=True)
-        
         query = """
-            SELECT 
-                id,
-                name,
-                email,
-                city,
-                state,
-                country,
-                about,
-                languages
-            FROM travelers
-            WHERE id = %s
+            SELECT city, recent, upcoming, recent + %s * upcoming AS score
+            FROM (
+                SELECT
+                    p.city,
+                    SUM(b.created_at >= NOW() - INTERVAL %s DAY) AS recent,
+                    SUM(b.start_date BETWEEN CURDATE() AND CURDATE() + INTERVAL %s DAY) AS upcoming
+                FROM properties p USE INDEX FOR GROUP BY (idx_city)
+                JOIN bookings b ON b.property_id = p.id
+                WHERE b.status IN ('PENDING', 'ACCEPTED', 'COMPLETED')
+                  AND (b.created_at >= NOW() - INTERVAL %s DAY
+                       OR b.start_date BETWEEN CURDATE() AND CURDATE() + INTERVAL %s DAY)
+                GROUP BY p.city
+            ) ranked
+            ORDER BY score DESC
+            LIMIT %s
         """
         
-        cursor.execute(query, (traveler_id,))
-        result = cursor.fetchone()
-        
-        cursor.close()
-        connection.close()
+        results = _execute(
+            query, (upcoming_weight, recent_days, upcoming_days, recent_days, upcoming_days, limit),
+            dictionary=True
+        )
         
-        return result
+        return [
+            {"city": row["city"], "recent": int(row["recent"] or 0),
+             "upcoming": int(row["upcoming"] or 0), "score": float(row["score"] or 0)}
+            for row in results
+        ]
         
     except Error as e:
-        print(f"Error fetching traveler: {e}")
-        return None
+        print(f"Error ranking popular cities: {e}")
+        return []
 
 
 def test_connection() -> bool:
@@ -201,12 +671,7 @@ def test_connection() -> bool:
         return False
     
     try:
-        connection = db_pool.get_connection()
-        cursor = connection.cursor()
-        cursor.execute("SELECT 1")
-        cursor.fetchone()
-        cursor.close()
-        connection.close()
+        _execute("SELECT 1", fetch="one")
         print("Database connection test successful")
         return True
     except Error as e:
@@ -0,0 +1,90 @@
+"""
+Request deadlines for AI Agent
+Splits an end-to-end time budget across plan stages and falls back when a stage runs out
+"""
+
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from typing import Any, Callable, List, Optional
+
+import metrics
+import profiling
+
+# Default end-to-end budget for a plan request (overridden per request by the client)
+PLAN_DEADLINE_SECONDS = float(os.getenv("PLAN_DEADLINE_SECONDS", 45))
+
+# Stages with less than this left are skipped straight to their fallback
+MIN_STAGE_SECONDS = float(os.getenv("MIN_STAGE_SECONDS", 0.5))
+
+STAGE_WORKERS = int(os.getenv("STAGE_WORKERS", 32))
+
+# Shared pool for stages and concurrent searches; abandoned stages finish in the background
+executor = ThreadPoolExecutor(max_workers=STAGE_WORKERS, thread_name_prefix="plan-stage")
+
+
+class Deadline:
+    """Remaining time for one plan request plus the sections that had to degrade"""
+
+    def __init__(self, seconds: Optional[float] = None):
+        self.seconds = PLAN_DEADLINE_SECONDS if seconds is None else seconds
+        self.expires_at = time.monotonic() + self.seconds
+        self.degraded: List[str] = []
+
+    def shortened(self) -> bool:
+        """Whether the client asked for less than the server's default budget"""
+        return self.seconds < PLAN_DEADLINE_SECONDS
+
+    def remaining(self) -> float:
+        """Seconds left before the deadline"""
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def budget(self, share: float = 1.0) -> float:
+        """Time allotted to a stage taking `share` of what is left"""
+        return self.remaining() * min(max(share, 0.0), 1.0)
+
+    def mark_degraded(self, section: str) -> None:
+        """Record a response section that was served from a fallback"""
+        if section not in self.degraded:
+            self.degraded.append(section)
+            metrics.increment(f"degraded_{section}")
+
+    def run_stage(
+        self,
+        name: str,
+        fn: Callable,
+        *args,
+        share: float = 1.0,
+        fallback: Callable[[], Any] = lambda: None,
+        **kwargs
+    ) -> Any:
+        """
+        Run a stage within its share of the remaining budget
+
+        Args:
+            name: Response section the stage produces (reported when degraded)
+            fn: Stage function
+            share: Fraction of the remaining budget the stage may use
+            fallback: Called to produce the result when the stage runs out of time
+
+        Returns:
+            The stage result, or the fallback result on timeout
+        """
+        timeout = self.budget(share)
+        if timeout < MIN_STAGE_SECONDS:
+            print(f"Warning: no time left for {name}, using fallback")
+            self.mark_degraded(name)
+            return fallback()
+
+        started = time.monotonic()
+        future = executor.submit(profiling.bind(fn), *args, **kwargs)
+        try:
+            with profiling.span(f"stage.{name}"):
+                return future.result(timeout=timeout)
+        except FutureTimeout:
+            future.cancel()
+            print(f"Warning: {name} exceeded its {timeout:.1f}s budget, using fallback")
+            self.mark_degraded(name)
+            return fallback()
+        finally:
+            metrics.observe(f"stage_{name}_ms", (time.monotonic() - started) * 1000)
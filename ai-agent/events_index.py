@@ -0,0 +1,221 @@
+"""
+Local events index for AI Agent
+Structured events per city in a date-interval index, with the date windows already searched
+"""
+
+import os
+import threading
+import time
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from datetime import date, timedelta
+from typing import Dict, Any, List, Optional, Tuple
+
+import climate
+
+# Searched windows are trusted for this long before a live search runs again
+COVERAGE_TTL_SECONDS = float(os.getenv("EVENTS_COVERAGE_TTL_SECONDS", 12 * 3600))
+MAX_EVENTS_PER_CITY = int(os.getenv("EVENTS_MAX_PER_CITY", 500))
+MAX_CITIES = int(os.getenv("EVENTS_MAX_CITIES", 1000))
+
+# Longest event accepted (multi-month "events" are usually season listings, not events)
+MAX_EVENT_DAYS = 60
+
+_lock = threading.Lock()
+_cities: "OrderedDict[str, CityEvents]" = OrderedDict()
+
+
+def parse_date(value: Any) -> Optional[date]:
+    """ISO date (YYYY-MM-DD, time part ignored) or None"""
+    try:
+        return date.fromisoformat(str(value)[:10])
+    except (TypeError, ValueError):
+        return None
+
+
+def stay_window(dates: Dict[str, str]) -> Optional[Tuple[date, date]]:
+    """(start, end) of a stay, or None when the dates are missing or reversed"""
+    start = parse_date((dates or {}).get("startDate"))
+    end = parse_date((dates or {}).get("endDate"))
+    if not start or not end or end < start:
+        return None
+    return start, end
+
+
+class CityEvents:
+    """
+    Events of one city sorted by start date, with a running maximum of end dates
+
+    Events overlapping [start, end] are those starting on or before `end` whose
+    end is on or after `start`. Because the running maximum of end dates never
+    decreases, the first event that can reach `start` is found by bisection,
+    and the last candidate by bisecting the start dates, so a lookup only
+    scans events near the window.
+    """
+
+    def __init__(self):
+        self.events: List[Dict[str, Any]] = []
+        self.starts: List[date] = []
+        self.max_ends: List[date] = []
+        self.coverage: List[Tuple[date, date, float]] = []
+
+    def _rebuild(self) -> None:
+        self.events.sort(key=lambda e: (e["_start"], e["_end"]))
+        self.starts = [e["_start"] for e in self.events]
+        self.max_ends = []
+        running = date.min
+        for event in self.events:
+            running = max(running, event["_end"])
+            self.max_ends.append(running)
+
+    def add(self, events: List[Dict[str, Any]]) -> None:
+        """Insert events, replacing earlier copies (same name and start date)"""
+        by_key = {(e["name"].lower(), e["_start"]): e for e in self.events}
+        for event in events:
+            by_key[(event["name"].lower(), event["_start"])] = event
+        today = date.today()
+        self.events = [e for e in by_key.values() if e["_end"] >= today]
+        if len(self.events) > MAX_EVENTS_PER_CITY:
+            self.events.sort(key=lambda e: e["_end"])
+            self.events = self.events[-MAX_EVENTS_PER_CITY:]
+        self._rebuild()
+
+    def overlapping(self, start: date, end: date) -> List[Dict[str, Any]]:
+        """Events overlapping [start, end] (inclusive), in start order"""
+        first = bisect_left(self.max_ends, start)
+        last = bisect_right(self.starts, end)
+        return [e for e in self.events[first:last] if e["_end"] >= start]
+
+    def cover(self, start: date, end: date) -> None:
+        """Record that a window has been searched"""
+        self.expire_coverage()
+        self.coverage.append((start, end, time.time()))
+
+    def expire_coverage(self) -> bool:
+        """Forget searched windows older than the TTL; True when none are left"""
+        now = time.time()
+        self.coverage = [c for c in self.coverage if now - c[2] < COVERAGE_TTL_SECONDS]
+        return not self.coverage
+
+    def uncovered(self, start: date, end: date) -> List[Tuple[date, date]]:
+        """Parts of [start, end] not inside a fresh searched window"""
+        now = time.time()
+        fresh = sorted((s, e) for s, e, at in self.coverage if now - at < COVERAGE_TTL_SECONDS)
+        gaps = []
+        cursor = start
+        for covered_start, covered_end in fresh:
+            if covered_end < cursor:
+                continue
+            if covered_start > end:
+                break
+            if covered_start > cursor:
+                gaps.append((cursor, covered_start - timedelta(days=1)))
+            cursor = max(cursor, covered_end + timedelta(days=1))
+            if cursor > end:
+                break
+        if cursor <= end:
+            gaps.append((cursor, end))
+        return gaps
+
+
+def _city(location: str) -> Optional[CityEvents]:
+    """Index of a city, or None if nothing was indexed for it (caller holds the lock)"""
+    return _cities.get(climate.normalize_city(location))
+
+
+def _indexed_city(location: str) -> CityEvents:
+    """
+    Index of a city, created on first write (caller holds the lock)
+
+    Cities are kept in write order; those whose searched windows have all
+    expired are dropped (they would be searched again anyway), then the
+    least recently written beyond EVENTS_MAX_CITIES.
+    """
+    key = climate.normalize_city(location)
+    if key not in _cities:
+        for stale in [k for k, city in _cities.items() if city.expire_coverage()]:
+            del _cities[stale]
+        _cities[key] = CityEvents()
+        while len(_cities) > MAX_CITIES:
+            _cities.popitem(last=False)
+    _cities.move_to_end(key)
+    return _cities[key]
+
+
+def uncovered_windows(location: str, dates: Dict[str, str]) -> List[Dict[str, str]]:
+    """
+    Parts of a stay that still need a live events search
+
+    Returns:
+        List of {startDate, endDate} windows (empty when the stay is fully covered or has no dates)
+    """
+    window = stay_window(dates)
+    if window is None:
+        return []
+    with _lock:
+        city = _city(location)
+        gaps = city.uncovered(*window) if city else [window]
+    return [{"startDate": s.isoformat(), "endDate": e.isoformat()} for s, e in gaps]
+
+
+def _normalize(event: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Validate an extracted event; undated or implausible events are dropped"""
+    name = str(event.get("name") or "").strip()
+    start = parse_date(event.get("startDate"))
+    end = parse_date(event.get("endDate")) or start
+    if not name or not start or end < start or (end - start).days > MAX_EVENT_DAYS:
+        return None
+    return {
+        "name": name,
+        "startDate": start.isoformat(),
+        "endDate": end.isoformat(),
+        "venue": str(event.get("venue") or ""),
+        "url": str(event.get("url") or ""),
+        "description": str(event.get("description") or "")[:200],
+        "_start": start,
+        "_end": end
+    }
+
+
+def add_events(location: str, windows: List[Dict[str, str]], events: List[Dict[str, Any]]) -> int:
+    """
+    Index extracted events and mark the searched windows as covered
+
+    Args:
+        location: City the events are in
+        windows: {startDate, endDate} windows the events were searched for
+        events: Extracted events (name, startDate, endDate, venue, url, description)
+
+    Returns:
+        Number of events indexed
+    """
+    normalized = [e for e in (_normalize(event) for event in events or []) if e]
+    with _lock:
+        city = _indexed_city(location)
+        city.add(normalized)
+        for window in windows:
+            start, end = parse_date(window.get("startDate")), parse_date(window.get("endDate"))
+            if start and end:
+                city.cover(start, end)
+    return len(normalized)
+
+
+def events_for_stay(location: str, dates: Dict[str, str], limit: int = 10) -> List[Dict[str, str]]:
+    """Indexed events overlapping a stay, in start order"""
+    window = stay_window(dates)
+    if window is None:
+        return []
+    with _lock:
+        city = _city(location)
+        events = city.overlapping(*window) if city else []
+    return [{k: v for k, v in e.items() if not k.startswith("_")} for e in events[:limit]]
+
+
+def status() -> Dict[str, Any]:
+    """Indexed cities, events and searched windows for the metrics endpoint"""
+    with _lock:
+        return {
+            "cities": len(_cities),
+            "events": sum(len(c.events) for c in _cities.values()),
+            "coveredWindows": sum(len(c.coverage) for c in _cities.values())
+        }
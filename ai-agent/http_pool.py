@@ -0,0 +1,158 @@
+"""
+Shared HTTP connection pool for AI Agent
+One keep-alive httpx client for OpenAI and Tavily calls, with per-host connection metrics
+"""
+
+import os
+import threading
+import time
+from typing import Dict, Any
+
+import httpx
+
+import metrics
+
+# Connections across all hosts, and idle connections kept open for reuse
+MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", 64))
+MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", 32))
+
+# Idle connections are closed after this long (providers drop them server-side after ~60-90s)
+KEEPALIVE_EXPIRY_SECONDS = float(os.getenv("HTTP_KEEPALIVE_EXPIRY_SECONDS", 55))
+
+CONNECT_TIMEOUT_SECONDS = float(os.getenv("HTTP_CONNECT_TIMEOUT_SECONDS", 5))
+READ_TIMEOUT_SECONDS = float(os.getenv("HTTP_READ_TIMEOUT_SECONDS", 100))
+# Longest a request waits for a free pooled connection
+POOL_TIMEOUT_SECONDS = float(os.getenv("HTTP_POOL_TIMEOUT_SECONDS", 10))
+
+# HTTP/2 multiplexes concurrent calls to one host over a single connection (needs the h2 package)
+HTTP2_ENABLED = os.getenv("HTTP2_ENABLED", "true").lower() == "true"
+
+_lock = threading.Lock()
+_hosts: Dict[str, Dict[str, int]] = {}
+
+
+def _http2_available() -> bool:
+    """Whether HTTP/2 is enabled and the h2 package is installed"""
+    if not HTTP2_ENABLED:
+        return False
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        print("Warning: h2 not installed, provider calls use HTTP/1.1 keep-alive")
+        return False
+
+
+def _host_entry(host: str) -> Dict[str, int]:
+    """Get or create a host's counters (caller holds the lock)"""
+    return _hosts.setdefault(host, {"requests": 0, "connectionsOpened": 0, "connectFailures": 0})
+
+
+def _tracer(host: str):
+    """httpcore trace callback counting new connections and timing TCP/TLS setup for a host"""
+    started = {}
+
+    def trace(event: str, info: Dict[str, Any]) -> None:
+        if event in ("connection.connect_tcp.started", "connection.start_tls.started"):
+            started[event.rsplit(".", 1)[0]] = time.monotonic()
+        elif event == "connection.connect_tcp.complete":
+            with _lock:
+                _host_entry(host)["connectionsOpened"] += 1
+            metrics.observe(f"http_{host}_connect_ms",
+                            (time.monotonic() - started.get("connection.connect_tcp", time.monotonic())) * 1000)
+        elif event == "connection.start_tls.complete":
+            metrics.observe(f"http_{host}_tls_ms",
+                            (time.monotonic() - started.get("connection.start_tls", time.monotonic())) * 1000)
+        elif event == "connection.connect_tcp.failed":
+            with _lock:
+                _host_entry(host)["connectFailures"] += 1
+
+    return trace
+
+
+def _on_request(request: httpx.Request) -> None:
+    """Count the request and trace whether it opens a new connection"""
+    host = request.url.host
+    with _lock:
+        _host_entry(host)["requests"] += 1
+    request.extensions["trace"] = _tracer(host)
+
+
+HTTP2 = _http2_available()
+
+client = httpx.Client(
+    http2=HTTP2,
+    limits=httpx.Limits(
+        max_connections=MAX_CONNECTIONS,
+        max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=KEEPALIVE_EXPIRY_SECONDS
+    ),
+    timeout=httpx.Timeout(
+        READ_TIMEOUT_SECONDS,
+        connect=CONNECT_TIMEOUT_SECONDS,
+        pool=POOL_TIMEOUT_SECONDS
+    ),
+    event_hooks={"request": [_on_request]}
+)
+
+
+def _open_connections() -> Dict[str, Dict[str, int]]:
+    """Open and idle pooled connections per host, read from the transport's pool"""
+    counts: Dict[str, Dict[str, int]] = {}
+    try:
+        connections = list(client._transport._pool.connections)
+    except AttributeError:
+        return counts
+    for connection in connections:
+        origin = getattr(connection, "_origin", None)
+        host = origin.host.decode("ascii", "ignore") if origin is not None else "unknown"
+        entry = counts.setdefault(host, {"open": 0, "idle": 0})
+        entry["open"] += 1
+        if connection.is_idle():
+            entry["idle"] += 1
+    return counts
+
+
+def status() -> Dict[str, Any]:
+    """Pool limits and per-host request, connection and handshake statistics"""
+    with _lock:
+        hosts = {host: dict(entry) for host, entry in _hosts.items()}
+    pooled = _open_connections()
+    for host in pooled:
+        hosts.setdefault(host, {"requests": 0, "connectionsOpened": 0, "connectFailures": 0})
+
+    return {
+        "limits": {
+            "maxConnections": MAX_CONNECTIONS,
+            "maxKeepaliveConnections": MAX_KEEPALIVE_CONNECTIONS,
+            "keepaliveExpirySeconds": KEEPALIVE_EXPIRY_SECONDS,
+            "http2": HTTP2
+        },
+        "hosts": {
+            host: {
+                **entry,
+                **pooled.get(host, {"open": 0, "idle": 0}),
+                "reuseRate": round(1 - entry["connectionsOpened"] / entry["requests"], 3) if entry["requests"] else 0.0,
+                "connectMsP50": round(metrics.percentile(f"http_{host}_connect_ms", 50), 1),
+                "tlsMsP50": round(metrics.percentile(f"http_{host}_tls_ms", 50), 1)
+            }
+            for host, entry in hosts.items()
+        }
+    }
+
+
+def post_json(url: str, payload: Dict[str, Any], headers: Dict[str, str] = None) -> Dict[str, Any]:
+    """
+    POST a JSON body over the shared pool and return the decoded response
+
+    Raises:
+        httpx.HTTPStatusError: for non-2xx responses
+    """
+    response = client.post(url, json=payload, headers=headers)
+    response.raise_for_status()
+    return response.json()
+
+
+def close() -> None:
+    """Close pooled connections (called on shutdown)"""
+    client.close()
@@ -0,0 +1,295 @@
+"""
+Constraint-based itinerary scheduler for AI Agent
+Assigns extracted activities and restaurants to day slots without an LLM call
+"""
+
+import re
+from datetime import datetime, timedelta
+from typing import Dict, Any, List, Optional
+
+import packing_rules
+
+# Hours available for activities in each slot (meals are scheduled separately)
+SLOT_HOURS = {"morning": 3.5, "afternoon": 4.5, "evening": 2.5}
+SLOTS = ("morning", "afternoon", "evening")
+
+# Families get a shorter afternoon with a rest break
+FAMILY_AFTERNOON_HOURS = 3.0
+
+DEFAULT_DURATION_HOURS = 2.0
+
+# Slot-fit points an activity gives up to avoid a day that already has one more activity
+DAY_LOAD_PENALTY = 1.5
+
+OUTDOOR_TAGS = {"outdoor", "outdoors", "nature", "park", "hiking", "hike", "beach", "beaches",
+                "adventure", "garden", "walking", "mountain", "water"}
+EVENING_TAGS = {"nightlife", "romantic", "entertainment", "theater", "theatre", "show", "music",
+                "food", "bar", "cruise"}
+DAYTIME_ONLY_TAGS = {"museum", "museums", "gallery", "shopping", "market", "zoo", "garden",
+                     "hiking", "hike", "beach", "beaches", "park"}
+
+# Highest activity cost tier per budget (tiers above it are scheduled last)
+BUDGET_MAX_COST = {"budget": 1, "medium": 3, "luxury": 4}
+
+HOT_HIGH_C = 30
+COLD_HIGH_C = 5
+
+_DURATION_NUMBER = re.compile(r"(\d+(?:\.\d+)?)")
+
+
+def parse_duration_hours(duration: Any) -> float:
+    """
+    Estimate hours from an estimatedDuration string
+
+    Handles "2-3 hours" (average), "90 minutes", "half day" and "full day";
+    anything unparseable counts as DEFAULT_DURATION_HOURS.
+    """
+    text = str(duration or "").lower()
+    if "full day" in text or "all day" in text:
+        return 6.0
+    if "half day" in text or "half-day" in text:
+        return 3.5
+    numbers = [float(n) for n in _DURATION_NUMBER.findall(text)]
+    if not numbers:
+        return DEFAULT_DURATION_HOURS
+    hours = sum(numbers[:2]) / len(numbers[:2])
+    if "min" in text and "hour" not in text:
+        hours /= 60
+    return min(max(hours, 0.5), 6.0)
+
+
+def cost_tier(cost: Any) -> int:
+    """Price tier 0 (free) to 4 ($$$$); unknown counts as 2"""
+    text = str(cost or "").strip().lower()
+    if text.startswith("free"):
+        return 0
+    if text.startswith("$"):
+        return min(text.count("$"), 4)
+    return 2
+
+
+def _tags(item: Dict[str, Any]) -> set:
+    """Lower-cased tags of an activity"""
+    return {str(tag).strip().lower() for tag in item.get("tags", []) or []}
+
+
+def _is_false(value: Any) -> bool:
+    """True only for an explicit false (unknown is kept)"""
+    return value is False or str(value).strip().lower() == "false"
+
+
+def _weather_profile(weather: Dict[str, Any]) -> Dict[str, bool]:
+    """Whether the trip is expected to be rainy, hot or cold"""
+    weather = weather or {}
+    conditions = str(weather.get("conditions", "")).lower()
+    rain_days = weather.get("rainDays")
+    temps = packing_rules.temperature_range(weather)
+    return {
+        "rainy": (rain_days is not None and rain_days >= packing_rules.RAIN_DAYS_THRESHOLD) or
+                 any(word in conditions for word in ("rain", "shower", "storm", "wet")),
+        "hot": temps is not None and temps[1] >= HOT_HIGH_C,
+        "cold": temps is not None and temps[1] <= COLD_HIGH_C
+    }
+
+
+def eligible_activities(
+    activities: List[Dict[str, Any]],
+    party_type: str,
+    mobility_needs: List[str]
+) -> List[Dict[str, Any]]:
+    """Drop activities explicitly unsuitable for the party or its mobility needs"""
+    needs = {str(need).strip().lower() for need in mobility_needs or []}
+    result = []
+    for activity in activities or []:
+        if not activity.get("name"):
+            continue
+        if needs & {"wheelchair", "limited-mobility", "elderly"} and _is_false(activity.get("wheelchairAccessible")):
+            continue
+        if ((party_type or "").lower() == "family" or "child-friendly" in needs) and \
+                _is_false(activity.get("childFriendly")):
+            continue
+        result.append(activity)
+    return result
+
+
+def _score(activity: Dict[str, Any], interests: set, budget: str, profile: Dict[str, bool]) -> float:
+    """Priority of an activity; higher is scheduled first"""
+    tags = _tags(activity)
+    score = 2.0 * len(tags & interests)
+    if cost_tier(activity.get("cost")) > BUDGET_MAX_COST.get(budget, 3):
+        score -= 3.0
+    if profile["rainy"] and tags & OUTDOOR_TAGS:
+        score -= 1.0
+    return score
+
+
+def _slot_fit(activity: Dict[str, Any], slot: str, profile: Dict[str, bool]) -> Optional[float]:
+    """How well an activity suits a slot (None if it must not go there)"""
+    tags = _tags(activity)
+    outdoor = bool(tags & OUTDOOR_TAGS)
+    if slot == "evening":
+        if tags & DAYTIME_ONLY_TAGS:
+            return None
+        return 1.0 if tags & EVENING_TAGS else 0.0
+    fit = 0.0
+    if outdoor and profile["hot"]:
+        fit += 1.0 if slot == "morning" else -1.0
+    if outdoor and profile["cold"]:
+        fit += 1.0 if slot == "afternoon" else -0.5
+    if tags & EVENING_TAGS and not tags & DAYTIME_ONLY_TAGS:
+        fit -= 0.5
+    return fit
+
+
+def filter_restaurants(
+    restaurants: List[Dict[str, Any]],
+    dietary_filters: List[str],
+    budget: str
+) -> List[Dict[str, Any]]:
+    """
+    Restaurants matching every dietary filter, cheapest-fitting first
+
+    Falls back to all restaurants when none match the filters.
+    """
+    restaurants = [r for r in restaurants or [] if r.get("name")]
+    filters = {str(f).strip().lower() for f in dietary_filters or []}
+    if filters:
+        matching = [
+            r for r in restaurants
+            if filters <= {str(o).strip().lower() for o in r.get("dietaryOptions", []) or []}
+        ]
+        restaurants = matching or restaurants
+    max_tier = BUDGET_MAX_COST.get(budget, 3)
+    return sorted(restaurants, key=lambda r: cost_tier(r.get("priceRange")) > max_tier)
+
+
+def _describe(activity: Dict[str, Any], profile: Dict[str, bool]) -> str:
+    """Slot text for one activity"""
+    text = activity["name"]
+    if activity.get("estimatedDuration"):
+        text += f" ({activity['estimatedDuration']})"
+    if profile["rainy"] and _tags(activity) & OUTDOOR_TAGS:
+        text += " - keep an indoor backup in case of rain"
+    return text
+
+
+def schedule_itinerary(
+    location: str,
+    dates: Dict[str, str],
+    party_type: str,
+    activities: List[Dict[str, Any]],
+    restaurants: List[Dict[str, Any]],
+    weather: Dict[str, Any],
+    preferences: Dict[str, Any],
+    events: Optional[List[Dict[str, Any]]] = None
+) -> List[Dict[str, Any]]:
+    """
+    Build a day-by-day plan by assigning activities to slots
+
+    Activities are filtered by the party's child-friendly and wheelchair needs,
+    ranked by interest match and budget, then placed one at a time into the
+    best-fitting slot of the least busy day, so activities spread across the
+    trip. Durations are budgeted against each slot's hours; outdoor activities
+    move to the cooler or warmer part of the day in hot or cold weather, and
+    museums and other daytime venues are kept out of evenings. Restaurants are
+    rotated through lunch and dinner, and dated local events are listed on
+    each day they run.
+
+    Args:
+        location: City or destination name
+        dates: Dictionary with startDate and endDate
+        party_type: Party type: solo, couple, family, friends
+        activities: Extracted activities
+        restaurants: Extracted restaurants
+        weather: Weather context (lowC/highC, rainDays, temperature, conditions)
+        preferences: Dictionary with budget, interests, dietaryFilters, mobilityNeeds
+        events: Local events with startDate and endDate (YYYY-MM-DD)
+
+    Returns:
+        One plan per day with morning/afternoon/evening text and a structured schedule
+    """
+    dates = dates or {}
+    preferences = preferences or {}
+    start_date = datetime.fromisoformat(dates.get("startDate", ""))
+    end_date = datetime.fromisoformat(dates.get("endDate", ""))
+    num_days = max((end_date - start_date).days + 1, 0)
+
+    budget = preferences.get("budget") or "medium"
+    interests = {str(i).strip().lower() for i in preferences.get("interests", []) or []}
+    profile = _weather_profile(weather)
+    family = (party_type or "").lower() == "family"
+
+    pool = sorted(
+        eligible_activities(activities, party_type, preferences.get("mobilityNeeds", [])),
+        key=lambda a: -_score(a, interests, budget, profile)
+    )
+
+    hours_left = {
+        (day, slot): FAMILY_AFTERNOON_HOURS if family and slot == "afternoon" else SLOT_HOURS[slot]
+        for day in range(num_days) for slot in SLOTS
+    }
+    assigned = {key: [] for key in hours_left}
+    day_load = [0] * num_days
+
+    # Best-ranked activities first, each into the best-fitting slot of the least busy day
+    for activity in pool:
+        hours = parse_duration_hours(activity.get("estimatedDuration"))
+        best, best_value = None, None
+        for key, left in hours_left.items():
+            fit = _slot_fit(activity, key[1], profile)
+            if fit is None or hours > left + 0.5:
+                continue
+            value = fit - DAY_LOAD_PENALTY * day_load[key[0]] - (1.0 if assigned[key] else 0.0)
+            if best_value is None or value > best_value:
+                best, best_value = key, value
+        if best is not None:
+            assigned[best].append(activity)
+            hours_left[best] -= hours
+            day_load[best[0]] += 1
+
+    meals = filter_restaurants(restaurants, preferences.get("dietaryFilters", []), budget)
+
+    def restaurant(index: int) -> str:
+        return meals[index % len(meals)]["name"] if meals else "a local restaurant"
+
+    plans = []
+    for day in range(num_days):
+        schedule = []
+        for slot in SLOTS:
+            for activity in assigned[(day, slot)]:
+                schedule.append({
+                    "slot": slot,
+                    "type": "activity",
+                    "name": activity["name"],
+                    "durationHours": parse_duration_hours(activity.get("estimatedDuration"))
+                })
+        lunch, dinner = restaurant(2 * day), restaurant(2 * day + 1)
+        schedule.append({"slot": "afternoon", "type": "meal", "meal": "lunch", "name": lunch})
+        schedule.append({"slot": "evening", "type": "meal", "meal": "dinner", "name": dinner})
+
+        date = (start_date + timedelta(days=day)).strftime("%Y-%m-%d")
+        happening = [
+            e["name"] for e in events or []
+            if e.get("name") and e.get("startDate", "") <= date <= (e.get("endDate") or e.get("startDate", ""))
+        ]
+
+        morning = [_describe(a, profile) for a in assigned[(day, "morning")]]
+        afternoon = [_describe(a, profile) for a in assigned[(day, "afternoon")]]
+        evening = [_describe(a, profile) for a in assigned[(day, "evening")]]
+
+        plans.append({
+            "day": day + 1,
+            "date": date,
+            "morning": "Breakfast at a local cafe, then " + (
+                ", then ".join(morning) if morning else f"explore {location}'s neighborhoods"
+            ) + ".",
+            "afternoon": f"Lunch at {lunch}, then " + (
+                ", then ".join(afternoon) if afternoon else "free time for sightseeing"
+            ) + (". Rest break at the accommodation." if family else "."),
+            "evening": f"Dinner at {dinner}" + (
+                ", then " + ", then ".join(evening) if evening else ", then an evening stroll"
+            ) + "." + (f" Happening today: {', '.join(happening)}." if happening else ""),
+            "schedule": schedule,
+            "events": happening
+        })
+    return plans
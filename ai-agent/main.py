@@ -3,17 +3,36 @@ FastAPI Server for AI Travel Agent
 Main entry point for the AI Agent service
 """
 
+import asyncio
+import hmac
 import os
+import time
 from typing import Dict, Any, List, Optional
 from datetime import datetime
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 from pydantic import BaseModel, Field
 from dotenv import load_dotenv
 
+import admission
 import agent
+import cache_warmer
+import circuit_breaker
 import database
+from deadline import Deadline
+import events_index
+import http_pool
+import metrics
+import outbound
+import plan_cache
+import plan_session
+import profiling
+import response_encoding
+import search_planner
+import semantic_cache
+import work_scheduler
 
 load_dotenv()
 
@@ -44,12 +63,12 @@ class BookingDates(BaseModel):
 
 class BookingContext(BaseModel):
     travelerId: Optional[int] = Field(None, description="Traveler ID for fetching history")
-    bookingId: Optional[int] = Field(None, description="Existing booking ID")
-    propertyId: Optional[int] = Field(None, description="Property ID")
-    location: Optional[str] = Field(None, description="Destination city")
-    dates: Optional[BookingDates] = Field(None, description="Travel dates")
+    bookingId: Optional[int] = Field(None, description="Existing booking ID (hydrates location, dates, guests, travelerId)")
+    propertyId: Optional[int] = Field(None, description="Property ID (hydrates location)")
+    location: Optional[str] = Field(None, description="Destination city (overrides the booking's)")
+    dates: Optional[BookingDates] = Field(None, description="Travel dates (override the booking's)")
     partyType: str = Field(default="solo", description="Party type: solo, couple, family, friends")
-    guests: int = Field(default=1, description="Number of guests")
+    guests: int = Field(default=1, description="Number of guests (defaults to the booking's, else 1)")
 
 
 class TravelPreferences(BaseModel):
@@ -66,6 +85,11 @@ class TravelPlanRequest(BaseModel):
         default_factory=TravelPreferences,
         description="User preferences (optional, AI will infer if missing)"
     )
+    deadlineSeconds: Optional[float] = Field(
+        None,
+        gt=0,
+        description="End-to-end time budget in seconds (defaults to the deployment's PLAN_DEADLINE_SECONDS)"
+    )
     
     class Config:
         schema_extra = {
@@ -90,6 +114,21 @@ class TravelPlanRequest(BaseModel):
         }
 
 
+class TravelPlanUpdate(BaseModel):
+    query: Optional[str] = Field(None, description="Replacement free-text query")
+    bookingContext: Optional[Dict[str, Any]] = Field(
+        None, description="Booking context fields to change (e.g. dates, partyType)"
+    )
+    preferences: Optional[Dict[str, Any]] = Field(
+        None, description="Preference fields to change (e.g. dietaryFilters)"
+    )
+    deadlineSeconds: Optional[float] = Field(
+        None,
+        gt=0,
+        description="End-to-end time budget in seconds (defaults to the deployment's PLAN_DEADLINE_SECONDS)"
+    )
+
+
 class LocalContext(BaseModel):
     weather: Dict[str, Any]
     events: List[Dict[str, str]]
@@ -103,6 +142,23 @@ class TravelPlanResponse(BaseModel):
     restaurants: List[Dict[str, Any]]
     packingChecklist: List[str]
     localContext: LocalContext
+    degradedSections: List[str] = Field(
+        default_factory=list,
+        description="Sections served from fallbacks because their stage ran out of time"
+    )
+    sessionId: Optional[str] = Field(None, description="Plan session to PATCH for incremental replans")
+    reusedStages: List[str] = Field(
+        default_factory=list,
+        description="Stages reused from the previous plan in this session"
+    )
+    cacheStatus: Optional[str] = Field(
+        None,
+        description="Plan cache result: hit, stale (served while it refreshes), similar (plan of a near-duplicate query) or miss"
+    )
+    profile: Optional[Dict[str, Any]] = Field(
+        None,
+        description="Wall-clock stage spans (only when the request sent an X-Profile header)"
+    )
 
 
 # API Endpoints
@@ -117,6 +173,8 @@ async def root():
         "endpoints": {
             "health": "/health",
             "plan": "/ai-agent/plan (POST)",
+            "replan": "/ai-agent/plan/{sessionId} (PATCH)",
+            "metrics": "/metrics",
             "docs": "/docs",
             "redoc": "/redoc"
         }
@@ -126,12 +184,16 @@ async def root():
 @app.get("/health")
 async def health_check():
     """Health check endpoint"""
+    circuits = circuit_breaker.status()
+    circuits_closed = all(c["state"] == "closed" for c in circuits.values())
+    
     try:
         db_status = database.test_connection()
         
         return {
-            "status": "healthy" if db_status else "degraded",
+            "status": "healthy" if db_status and circuits_closed else "degraded",
             "database": "connected" if db_status else "disconnected",
+            "circuits": circuits,
             "timestamp": datetime.now().isoformat()
         }
     except Exception as e:
@@ -139,12 +201,105 @@ async def health_check():
             "status": "degraded",
             "database": "error",
             "error": str(e),
+            "circuits": circuits,
             "timestamp": datetime.now().isoformat()
         }
 
 
-@app.post("/ai-agent/plan", response_model=TravelPlanResponse)
-async def generate_travel_plan(request: TravelPlanRequest):
+@app.get("/metrics")
+async def get_metrics():
+    """In-process counters and latency/size series"""
+    return {
+        **metrics.snapshot(),
+        "admission": admission.controller.status(),
+        "outbound": outbound.status(),
+        "circuits": circuit_breaker.status(),
+        "searchPlanner": search_planner.status(),
+        "scheduler": work_scheduler.status(),
+        "planCache": plan_cache.status(),
+        "cacheWarming": cache_warmer.status(),
+        "eventsIndex": events_index.status(),
+        "semanticCache": semantic_cache.status(),
+        "http": http_pool.status(),
+        "timestamp": datetime.now().isoformat()
+    }
+
+
+def require_admin(http_request: Request) -> None:
+    """
+    Check the admin token for profiling endpoints
+    
+    Raises:
+        HTTPException: 404 when PROFILING_ADMIN_TOKEN is not configured, 403 on a wrong token
+    """
+    if not profiling.ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Profiling endpoints are disabled")
+    token = http_request.headers.get("x-admin-token", "")
+    if not hmac.compare_digest(token, profiling.ADMIN_TOKEN):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+
+@app.get("/admin/profile/sample", response_class=PlainTextResponse)
+async def sample_profile(
+    http_request: Request,
+    seconds: float = Query(10, gt=0, description="Sampling duration (capped by PROFILE_MAX_SAMPLE_SECONDS)"),
+    intervalMs: float = Query(profiling.DEFAULT_INTERVAL_MS, ge=1, description="Time between samples"),
+    threads: Optional[str] = Query(None, description="Only sample threads whose name starts with this, e.g. plan-")
+):
+    """
+    Collect a time-boxed sampling profile of all worker threads
+    
+    Returns collapsed stacks ("thread;frame;frame count" per line) for
+    flamegraph.pl or speedscope. The event loop thread is included, so request
+    parsing and pydantic validation show up under MainThread.
+    """
+    require_admin(http_request)
+    try:
+        return await asyncio.to_thread(profiling.sample_stacks, seconds, intervalMs, threads)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+
+@app.get("/admin/profile/requests")
+async def recent_request_profiles(http_request: Request):
+    """Stage spans of recently profiled plan requests (X-Profile or sampled), newest first"""
+    require_admin(http_request)
+    return {"profiles": profiling.recent_profiles()}
+
+
+@app.on_event("startup")
+async def start_cache_warming():
+    """Start warming searches and extractions for the most booked cities"""
+    cache_warmer.start(agent.warm_destination)
+
+
+@app.on_event("shutdown")
+async def flush_search_statistics():
+    """Persist search planner statistics before the process exits"""
+    search_planner.flush()
+
+
+@app.on_event("shutdown")
+async def close_http_pool():
+    """Close pooled provider connections"""
+    http_pool.close()
+
+
+@app.post("/ai-agent/plan", responses={200: {"model": TravelPlanResponse}})
+async def generate_travel_plan(
+    request: TravelPlanRequest,
+    http_request: Request,
+    fields: Optional[str] = Query(
+        None,
+        description="Comma-separated fields to return, e.g. dayByDayPlan,activities,localContext.weather"
+    ),
+    includeRaw: bool = Query(False, description="Include raw search payloads (localContext.weather.raw_results)"),
+    priority: str = Query(
+        work_scheduler.INTERACTIVE,
+        pattern="^(interactive|background|batch)$",
+        description="Scheduling class; precompute and bulk callers should use background or batch"
+    )
+):
     """
     Generate a personalized travel plan
     
@@ -155,43 +310,12 @@ async def generate_travel_plan(request: TravelPlanRequest):
     4. Uses LangChain + GPT-4 to generate personalized itinerary
     5. Uses AI to infer user preferences from booking history if not provided
     6. Returns comprehensive travel plan with activities, restaurants, packing list
+    
+    Responses drop raw search payloads unless includeRaw=true, honor a sparse
+    `fields` selection and are gzip/brotli compressed when the client accepts it.
     """
     try:
-        print("=" * 70)
-        print("Received travel plan request")
-        print(f"Query: {request.query}")
-        print(f"Booking Context: {request.bookingContext.dict()}")
-        print(f"Preferences: {request.preferences.dict() if request.preferences else {}}")
-        print("=" * 70)
-        
-        # Convert Pydantic models to dictionaries
-        booking_context = request.bookingContext.dict()
-        
-        # Handle optional preferences - if empty, pass empty dict for AI inference
-        preferences = request.preferences.dict() if request.preferences else {}
-        
-        # Generate travel plan using AI agent
-        travel_plan = agent.create_travel_plan(
-            query=request.query,
-            booking_context=booking_context,
-            preferences=preferences
-        )
-        
-        if not travel_plan.get("success"):
-            raise HTTPException(
-                status_code=500,
-                detail="Failed to generate travel plan"
-            )
-        
-        print("=" * 70)
-        print("Travel plan generated successfully!")
-        print(f"Activities: {len(travel_plan.get('activities', []))}")
-        print(f"Restaurants: {len(travel_plan.get('restaurants', []))}")
-        print(f"Days: {len(travel_plan.get('dayByDayPlan', []))}")
-        print("=" * 70)
-        
-        return travel_plan
-        
+        return await schedule_plan(priority, request, http_request, fields, includeRaw)
     except HTTPException:
         raise
     except Exception as e:
@@ -202,6 +326,221 @@ async def generate_travel_plan(request: TravelPlanRequest):
         )
 
 
+@app.patch("/ai-agent/plan/{sessionId}", responses={200: {"model": TravelPlanResponse}})
+async def replan_travel_plan(
+    sessionId: str,
+    update: TravelPlanUpdate,
+    http_request: Request,
+    fields: Optional[str] = Query(
+        None,
+        description="Comma-separated fields to return, e.g. dayByDayPlan,activities,localContext.weather"
+    ),
+    includeRaw: bool = Query(False, description="Include raw search payloads (localContext.weather.raw_results)"),
+    priority: str = Query(
+        work_scheduler.INTERACTIVE,
+        pattern="^(interactive|background|batch)$",
+        description="Scheduling class; precompute and bulk callers should use background or batch"
+    )
+):
+    """
+    Replan an existing plan session after a partial change
+    
+    Only the stages whose inputs changed are recomputed (e.g. a new dietary
+    filter re-runs the restaurant search, restaurant extraction and day plan,
+    while activities, weather and events are reused).
+    """
+    session = plan_session.load(sessionId)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Plan session not found or expired")
+    
+    try:
+        inputs = plan_session.merge_inputs(session["inputs"], update.dict(exclude_none=True))
+        request = TravelPlanRequest(**inputs, deadlineSeconds=update.deadlineSeconds)
+    except Exception as e:
+        raise HTTPException(status_code=422, detail=f"Invalid plan update: {str(e)}")
+    
+    try:
+        return await schedule_plan(
+            priority, request, http_request, fields, includeRaw, session["stages"], sessionId
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"Error replanning travel plan: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Internal server error: {str(e)}"
+        )
+
+
+async def schedule_plan(priority: str, request: TravelPlanRequest, http_request: Request, *args):
+    """
+    Admit a plan and run it on the priority scheduler without blocking the event loop
+    
+    The deadline starts before admission, so time spent queuing for admission
+    or a worker counts against the request's budget. Only plan endpoints go
+    through admission control; health and metrics are never shed. The
+    admission slot is held until the plan finishes on its worker, even if the
+    client disconnects first.
+    
+    Requests with an X-Profile header (or picked by PROFILE_SAMPLE_RATE) record
+    wall-clock spans for admission, queueing and every plan stage.
+    
+    Raises:
+        HTTPException: 503 with Retry-After if the request is shed or
+            background/batch work was preempted
+    """
+    deadline = Deadline(request.deadlineSeconds)
+    profile = profiling.start_request(bool(http_request.headers.get("x-profile")))
+    admission_started = time.perf_counter()
+    try:
+        await admission.controller.acquire(deadline)
+    except admission.Overloaded as e:
+        raise HTTPException(
+            status_code=503,
+            detail=str(e),
+            headers={"Retry-After": str(e.retry_after)}
+        )
+    
+    loop = asyncio.get_running_loop()
+    timing = {"submitted": time.perf_counter()}
+    if profile is not None:
+        profile.add("admission", admission_started, timing["submitted"])
+    future = work_scheduler.submit(
+        timed_run_plan,
+        timing,
+        profile,
+        request,
+        http_request,
+        *args,
+        deadline=deadline,
+        priority=priority,
+        traveler_id=request.bookingContext.travelerId
+    )
+    
+    def release(_):
+        worker_wait_ms = (timing["started"] - timing["submitted"]) * 1000 if "started" in timing else None
+        # A client-shortened deadline degrades by choice; only the default budget running out signals overload
+        overloaded = bool(deadline.degraded) and not deadline.shortened()
+        admission.controller.release(worker_wait_ms, degraded=overloaded)
+    
+    future.add_done_callback(lambda f: loop.call_soon_threadsafe(release, f))
+    try:
+        return await asyncio.wrap_future(future)
+    except work_scheduler.Preempted as e:
+        raise HTTPException(
+            status_code=503,
+            detail=str(e),
+            headers={"Retry-After": "5"}
+        )
+
+
+def timed_run_plan(timing: Dict[str, float], profile: Optional[profiling.RequestProfile], *args, **kwargs):
+    """Run a plan, recording when a worker picked it up and how long it ran"""
+    timing["started"] = time.perf_counter()
+    if profile is None:
+        try:
+            return run_plan(*args, **kwargs)
+        finally:
+            metrics.observe("plan_run_ms", (time.perf_counter() - timing["started"]) * 1000)
+    
+    profile.add("queue", timing["submitted"], timing["started"])
+    http_request = args[1]
+    try:
+        with profiling.activate(profile):
+            return run_plan(*args, **kwargs)
+    finally:
+        metrics.observe("plan_run_ms", (time.perf_counter() - timing["started"]) * 1000)
+        profiling.finish_request(profile, f"{http_request.method} {http_request.url.path}")
+
+
+def run_plan(
+    request: TravelPlanRequest,
+    http_request: Request,
+    fields: Optional[str],
+    include_raw: bool,
+    stages: Optional[plan_session.StageCache] = None,
+    session_id: Optional[str] = None,
+    deadline: Optional[Deadline] = None
+):
+    """
+    Generate a plan, store it in its session and encode the response
+    
+    Args:
+        request: Validated plan request
+        http_request: Incoming request (for Accept-Encoding)
+        fields: Sparse field selection
+        include_raw: Keep raw search payloads
+        stages: Stage results from the session's previous plan
+        session_id: Existing session to update (None to start one)
+        deadline: Request deadline (started when the request was queued)
+        
+    Returns:
+        Encoded response
+    """
+    deadline = deadline or Deadline(request.deadlineSeconds)
+    stages = stages if stages is not None else plan_session.StageCache()
+    
+    print("=" * 70)
+    print("Received travel plan request")
+    print(f"Query: {request.query}")
+    print(f"Booking Context: {request.bookingContext.dict()}")
+    print(f"Preferences: {request.preferences.dict() if request.preferences else {}}")
+    print("=" * 70)
+    
+    # Convert Pydantic models to dictionaries; unset fields are left for the agent
+    # to hydrate from bookingId/propertyId (client-sent fields take precedence)
+    booking_context = request.bookingContext.dict(exclude_unset=True)
+    
+    # Handle optional preferences - if empty, pass empty dict for AI inference
+    preferences = request.preferences.dict() if request.preferences else {}
+    
+    # Generate travel plan using AI agent
+    travel_plan = agent.create_travel_plan(
+        query=request.query,
+        booking_context=booking_context,
+        preferences=preferences,
+        deadline=deadline,
+        stages=stages
+    )
+    
+    if not travel_plan.get("success"):
+        raise HTTPException(
+            status_code=500,
+            detail="Failed to generate travel plan"
+        )
+    
+    travel_plan["sessionId"] = plan_session.save(
+        {"query": request.query, "bookingContext": booking_context, "preferences": preferences},
+        stages,
+        session_id
+    )
+    
+    print("=" * 70)
+    print("Travel plan generated successfully!")
+    print(f"Activities: {len(travel_plan.get('activities', []))}")
+    print(f"Restaurants: {len(travel_plan.get('restaurants', []))}")
+    print(f"Days: {len(travel_plan.get('dayByDayPlan', []))}")
+    print(f"Reused stages: {travel_plan.get('reusedStages', [])}")
+    print(f"Plan cache: {travel_plan.get('cacheStatus')}")
+    print("=" * 70)
+    
+    profile = profiling.current()
+    if profile is not None and profile.reason == "header":
+        travel_plan["profile"] = profile.summary()
+    
+    with profiling.span("encode"):
+        response = response_encoding.build_response(
+            travel_plan,
+            fields=fields,
+            include_raw=include_raw,
+            accept_encoding=http_request.headers.get("accept-encoding", "")
+        )
+    if profile is not None:
+        response.headers["Server-Timing"] += ", " + profile.server_timing()
+    return response
+
+
 @app.get("/ai-agent/test")
 async def test_components():
     """
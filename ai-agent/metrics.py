@@ -0,0 +1,77 @@
+"""
+In-process metrics for AI Agent
+Thread-safe counters and rolling value series exposed on the /metrics endpoint
+"""
+
+import threading
+from collections import deque
+from typing import Dict, Any
+
+# Number of recent observations kept per series for percentiles
+SERIES_WINDOW = 1000
+
+_lock = threading.Lock()
+_counters: Dict[str, float] = {}
+_series: Dict[str, deque] = {}
+_series_totals: Dict[str, list] = {}
+
+
+def increment(name: str, amount: float = 1) -> None:
+    """Add to a counter"""
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + amount
+
+
+def observe(name: str, value: float) -> None:
+    """Record one observation (latency, size, ...) in a rolling series"""
+    with _lock:
+        if name not in _series:
+            _series[name] = deque(maxlen=SERIES_WINDOW)
+            _series_totals[name] = [0, 0.0]
+        _series[name].append(value)
+        _series_totals[name][0] += 1
+        _series_totals[name][1] += value
+
+
+def percentile(name: str, pct: float) -> float:
+    """Return the given percentile (0-100) of a series' recent window, or 0.0 if empty"""
+    with _lock:
+        values = sorted(_series.get(name, ()))
+    if not values:
+        return 0.0
+    index = min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))
+    return values[index]
+
+
+def sample_count(name: str) -> int:
+    """Number of observations currently in a series' window"""
+    with _lock:
+        return len(_series.get(name, ()))
+
+
+def _summarize(values: list, count: int, total: float) -> Dict[str, float]:
+    """Summary statistics for one series"""
+    ordered = sorted(values)
+
+    def pick(pct: float) -> float:
+        return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+    return {
+        "count": count,
+        "avg": round(total / count, 3) if count else 0.0,
+        "p50": round(pick(50), 3),
+        "p95": round(pick(95), 3),
+        "p99": round(pick(99), 3),
+        "max": round(ordered[-1], 3)
+    }
+
+
+def snapshot() -> Dict[str, Any]:
+    """Return all counters and series summaries"""
+    with _lock:
+        counters = dict(_counters)
+        series = {name: (list(values), *_series_totals[name]) for name, values in _series.items() if values}
+    return {
+        "counters": counters,
+        "series": {name: _summarize(values, count, total) for name, (values, count, total) in series.items()}
+    }
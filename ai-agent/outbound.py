@@ -0,0 +1,257 @@
+"""
+Outbound call governor for AI Agent
+Token buckets, AIMD adaptive concurrency and Retry-After handling per provider and model
+"""
+
+import os
+import threading
+import time
+from typing import Dict, Any, Callable, Optional
+
+import metrics
+
+# Longest a caller waits in the queue for a token or concurrency slot
+MAX_WAIT_SECONDS = float(os.getenv("OUTBOUND_MAX_WAIT_SECONDS", 10))
+
+# Latency above this multiple of the baseline counts as congestion
+LATENCY_CONGESTION_FACTOR = float(os.getenv("OUTBOUND_LATENCY_FACTOR", 2.0))
+
+PROVIDER_LIMITS = {
+    "openai": {
+        "rate": float(os.getenv("OPENAI_REQUESTS_PER_SECOND", 5)),
+        "burst": float(os.getenv("OPENAI_BURST", 10)),
+        "max_concurrency": int(os.getenv("OPENAI_MAX_CONCURRENCY", 16))
+    },
+    "tavily": {
+        "rate": float(os.getenv("TAVILY_REQUESTS_PER_SECOND", 10)),
+        "burst": float(os.getenv("TAVILY_BURST", 20)),
+        "max_concurrency": int(os.getenv("TAVILY_MAX_CONCURRENCY", 24))
+    }
+}
+
+DEFAULT_LIMITS = {"rate": 5.0, "burst": 10.0, "max_concurrency": 8}
+
+
+class GovernorTimeout(Exception):
+    """Raised when a call cannot be admitted within the allowed wait"""
+
+
+class TokenBucket:
+    """Classic token bucket refilled continuously at `rate` tokens per second"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self, deadline: float) -> bool:
+        """Take one token, sleeping until one is available or the deadline passes"""
+        while True:
+            with self.lock:
+                self._refill()
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return True
+                wait = (1 - self.tokens) / self.rate if self.rate > 0 else MAX_WAIT_SECONDS
+            if time.monotonic() + wait > deadline:
+                return False
+            time.sleep(wait)
+
+
+class AdaptiveLimiter:
+    """
+    AIMD concurrency limit
+
+    The limit grows by roughly one slot per round trip while calls are fast and
+    succeed, and is cut multiplicatively on throttling or congestion latency.
+    Latency baselines are kept per call kind (e.g. prompt stage), so a long
+    generation is only compared with earlier calls of the same kind.
+    """
+
+    def __init__(self, max_limit: int, initial: Optional[float] = None, min_limit: int = 1):
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.limit = float(initial or max(min_limit, max_limit // 2))
+        self.in_flight = 0
+        self.baselines_ms: Dict[Optional[str], float] = {}
+        self.condition = threading.Condition()
+
+    def acquire(self, deadline: float) -> bool:
+        """Wait for a concurrency slot until the deadline"""
+        with self.condition:
+            while self.in_flight >= int(self.limit):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self.condition.wait(remaining)
+            self.in_flight += 1
+            return True
+
+    def release(self, latency_ms: Optional[float], throttled: bool = False,
+                latency_key: Optional[str] = None) -> None:
+        """
+        Free a slot and adjust the limit from the call outcome
+
+        Args:
+            latency_ms: Call latency (None when the call failed)
+            throttled: Whether the provider rate limited the call
+            latency_key: Kind of call whose latency baseline the sample is compared with
+        """
+        with self.condition:
+            self.in_flight -= 1
+            if throttled:
+                self.limit = max(self.min_limit, self.limit * 0.5)
+            elif latency_ms is not None:
+                baseline = self.baselines_ms.setdefault(latency_key, latency_ms)
+                if latency_ms > baseline * LATENCY_CONGESTION_FACTOR:
+                    self.limit = max(self.min_limit, self.limit * 0.9)
+                else:
+                    self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+                # Slow-moving baseline that tracks the fast end of observed latency
+                weight = 0.05 if latency_ms > baseline else 0.2
+                self.baselines_ms[latency_key] = baseline + (latency_ms - baseline) * weight
+            self.condition.notify()
+
+
+def _status_code(exc: Exception) -> Optional[int]:
+    """HTTP status carried by a provider exception, if any"""
+    response = getattr(exc, "response", None)
+    return getattr(exc, "status_code", None) or getattr(response, "status_code", None)
+
+
+def _retry_after(exc: Exception) -> Optional[float]:
+    """Seconds from a Retry-After header on a provider exception, if any"""
+    headers = getattr(getattr(exc, "response", None), "headers", None) or {}
+    value = headers.get("retry-after") or headers.get("Retry-After")
+    try:
+        return float(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def is_throttled(exc: Exception) -> bool:
+    """Check whether an exception is a provider rate-limit response"""
+    if _status_code(exc) == 429:
+        return True
+    text = f"{type(exc).__name__} {exc}".lower()
+    return "ratelimit" in text or "rate limit" in text or "429" in text
+
+
+class Governor:
+    """Admission and adaptive concurrency for one provider/model"""
+
+    def __init__(self, key: str, rate: float, burst: float, max_concurrency: int):
+        self.key = key
+        self.bucket = TokenBucket(rate, burst)
+        self.limiter = AdaptiveLimiter(max_concurrency)
+        self.blocked_until = 0.0
+        self.lock = threading.Lock()
+
+    def _admit(self, deadline: float) -> None:
+        """Wait out Retry-After, then take a token and a concurrency slot"""
+        blocked_for = self.blocked_until - time.monotonic()
+        if blocked_for > 0:
+            if time.monotonic() + blocked_for > deadline:
+                raise GovernorTimeout(f"{self.key} is rate limited for {blocked_for:.1f}s")
+            time.sleep(blocked_for)
+
+        if not self.bucket.acquire(deadline):
+            raise GovernorTimeout(f"{self.key} request rate exhausted")
+        if not self.limiter.acquire(deadline):
+            raise GovernorTimeout(f"{self.key} concurrency limit reached")
+
+    def call(self, fn: Callable, *args, max_wait: Optional[float] = None,
+             latency_key: Optional[str] = None, **kwargs) -> Any:
+        """
+        Run a provider call under this governor
+
+        Args:
+            fn: Provider call (e.g. llm.generate, tavily_client.search)
+            max_wait: Longest time to queue for admission (default OUTBOUND_MAX_WAIT_SECONDS)
+            latency_key: Kind of call (e.g. prompt stage); calls of very different lengths
+                need separate keys so long ones are not mistaken for congestion
+
+        Returns:
+            The provider call's result
+
+        Raises:
+            GovernorTimeout: if the call could not be admitted in time
+        """
+        max_wait = MAX_WAIT_SECONDS if max_wait is None else max_wait
+        deadline = time.monotonic() + max_wait
+
+        for attempt in range(2):
+            queued = time.monotonic()
+            try:
+                self._admit(deadline)
+            except GovernorTimeout:
+                metrics.increment(f"outbound_{self.key}_rejected")
+                raise
+            metrics.observe(f"outbound_{self.key}_wait_ms", (time.monotonic() - queued) * 1000)
+
+            started = time.monotonic()
+            try:
+                result = fn(*args, **kwargs)
+            except Exception as e:
+                throttled = is_throttled(e)
+                self.limiter.release(None, throttled=throttled)
+                metrics.increment(f"outbound_{self.key}_errors")
+                if not throttled:
+                    raise
+
+                metrics.increment(f"outbound_{self.key}_throttled")
+                retry_after = _retry_after(e) or 1.0
+                with self.lock:
+                    self.blocked_until = max(self.blocked_until, time.monotonic() + retry_after)
+                # Retry once if the Retry-After fits in the remaining wait budget
+                if attempt == 0 and time.monotonic() + retry_after < deadline:
+                    print(f"Warning: {self.key} rate limited, retrying after {retry_after:.1f}s")
+                    continue
+                raise
+
+            latency_ms = (time.monotonic() - started) * 1000
+            self.limiter.release(latency_ms, latency_key=latency_key)
+            metrics.observe(f"outbound_{self.key}_latency_ms", latency_ms)
+            return result
+
+    def status(self) -> Dict[str, Any]:
+        """Current limits for the metrics endpoint"""
+        return {
+            "concurrencyLimit": round(self.limiter.limit, 2),
+            "inFlight": self.limiter.in_flight,
+            "tokens": round(self.bucket.tokens, 2),
+            "blockedForSeconds": round(max(0.0, self.blocked_until - time.monotonic()), 2)
+        }
+
+
+_governors: Dict[str, Governor] = {}
+_registry_lock = threading.Lock()
+
+
+def get_governor(provider: str, model: Optional[str] = None) -> Governor:
+    """Return the shared governor for a provider (and model)"""
+    key = f"{provider}:{model}" if model else provider
+    with _registry_lock:
+        if key not in _governors:
+            limits = PROVIDER_LIMITS.get(provider, DEFAULT_LIMITS)
+            _governors[key] = Governor(key, limits["rate"], limits["burst"], limits["max_concurrency"])
+        return _governors[key]
+
+
+def call(provider: str, model: Optional[str], fn: Callable, *args, **kwargs) -> Any:
+    """Run fn through the governor for provider/model"""
+    return get_governor(provider, model).call(fn, *args, **kwargs)
+
+
+def status() -> Dict[str, Dict[str, Any]]:
+    """Status of every governor created so far"""
+    with _registry_lock:
+        governors = list(_governors.values())
+    return {g.key: g.status() for g in governors}
@@ -0,0 +1,178 @@
+"""
+Rule-based packing checklist engine for AI Agent
+Builds a weather, activity, party and mobility aware checklist without an LLM call
+"""
+
+import re
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Tuple
+
+ESSENTIALS = [
+    "Travel documents and ID",
+    "Phone charger and power adapter",
+    "Camera or smartphone",
+    "Comfortable walking shoes",
+    "Reusable water bottle",
+    "Medications and first aid kit",
+    "Hand sanitizer"
+]
+
+# (upper bound of band in °C, items); bands are checked against the daily low then high
+COLD_BANDS = [
+    (0, ["Insulated winter coat", "Thermal base layers", "Warm hat, gloves and scarf",
+         "Insulated waterproof boots"]),
+    (10, ["Warm jacket", "Sweaters or fleece layers", "Long pants"]),
+    (18, ["Light jacket or sweater", "Layers for changing temperatures"])
+]
+
+HOT_BANDS = [
+    (30, ["Electrolyte packets", "Cooling towel"]),
+    (24, ["Lightweight breathable clothing", "Shorts or skirts", "Sunscreen (SPF 30+)",
+          "Sunglasses and sun hat"])
+]
+
+UNKNOWN_WEATHER_ITEMS = ["Weather-appropriate clothing", "Light jacket or sweater",
+                         "Sunscreen and sunglasses"]
+
+RAIN_ITEMS = ["Compact umbrella", "Waterproof rain jacket"]
+SNOW_ITEMS = ["Waterproof boots", "Warm socks"]
+
+# Rain days per month at or above which rain gear is recommended
+RAIN_DAYS_THRESHOLD = 8
+
+TAG_RULES = [
+    (("beach", "beaches", "swimming", "water", "island"),
+     ["Swimwear", "Beach towel", "Flip-flops or sandals", "Reef-safe sunscreen"]),
+    (("hiking", "hike", "nature", "outdoor", "outdoors", "adventure", "park", "mountain"),
+     ["Hiking shoes or trail sneakers", "Daypack", "Insect repellent"]),
+    (("museum", "museums", "culture", "art", "history", "historic", "indoor"),
+     ["Smart-casual outfit for museums and tours", "Small crossbody bag"]),
+    (("nightlife", "romantic", "fine dining", "theater", "theatre"),
+     ["Evening outfit for dinners out"]),
+    (("wellness", "spa"),
+     ["Swimwear for spa facilities"])
+]
+
+PARTY_RULES = {
+    "family": ["Snacks for kids", "Entertainment for children", "Stroller or baby carrier (if needed)",
+               "Child-safe sunscreen", "Wet wipes"],
+    "couple": ["Outfit for a special dinner"],
+    "friends": ["Portable phone battery pack"]
+}
+
+MOBILITY_RULES = {
+    "wheelchair": ["Wheelchair repair kit and spare parts", "Medical and accessibility documentation",
+                   "Portable ramp (if needed)"],
+    "limited-mobility": ["Folding cane or walking aid", "Copies of prescriptions"],
+    "elderly": ["Folding cane or walking aid", "Copies of prescriptions", "Pill organizer"],
+    "child-friendly": ["Stroller or baby carrier (if needed)"]
+}
+
+_TEMPERATURE_PATTERN = re.compile(r"(-?\d+(?:\.\d+)?)\s*(?:-|to|–)\s*(-?\d+(?:\.\d+)?)\s*°?\s*([CF])", re.IGNORECASE)
+
+
+def _to_celsius(value: float, unit: str) -> float:
+    """Convert a temperature to °C"""
+    return (value - 32) * 5 / 9 if unit.upper() == "F" else value
+
+
+def temperature_range(weather: Dict[str, Any]) -> Optional[Tuple[float, float]]:
+    """
+    Read the expected low and high temperature (°C) from weather context
+
+    Uses numeric lowC/highC when present, otherwise parses a "12-18°C" or
+    "55-65°F" style temperature string.
+    """
+    weather = weather or {}
+    if weather.get("lowC") is not None and weather.get("highC") is not None:
+        return float(weather["lowC"]), float(weather["highC"])
+
+    match = _TEMPERATURE_PATTERN.search(str(weather.get("temperature", "")))
+    if not match:
+        return None
+    low, high, unit = float(match.group(1)), float(match.group(2)), match.group(3)
+    return _to_celsius(low, unit), _to_celsius(high, unit)
+
+
+def _activity_tags(activities: List[Dict[str, Any]]) -> set:
+    """Collect lower-cased tags across all activities"""
+    tags = set()
+    for activity in activities or []:
+        for tag in activity.get("tags", []) or []:
+            tags.add(str(tag).strip().lower())
+    return tags
+
+
+def _trip_nights(dates: Dict[str, str]) -> int:
+    """Number of nights between startDate and endDate (0 if unknown)"""
+    try:
+        start = datetime.fromisoformat(dates.get("startDate", ""))
+        end = datetime.fromisoformat(dates.get("endDate", ""))
+        return max((end - start).days, 0)
+    except (TypeError, ValueError, AttributeError):
+        return 0
+
+
+def build_checklist(
+    dates: Dict[str, str],
+    weather: Dict[str, Any],
+    activities: List[Dict[str, Any]],
+    party_type: str,
+    mobility_needs: List[str]
+) -> List[str]:
+    """
+    Build a packing checklist from the rule base
+
+    Args:
+        dates: Dictionary with startDate and endDate
+        weather: Weather context (lowC/highC, rainDays, temperature, conditions)
+        activities: Extracted activities with tags
+        party_type: Party type: solo, couple, family, friends
+        mobility_needs: List of mobility requirements
+
+    Returns:
+        De-duplicated list of packing items
+    """
+    items = list(ESSENTIALS)
+    weather = weather or {}
+
+    # Temperature bands
+    temps = temperature_range(weather)
+    if temps is None:
+        items.extend(UNKNOWN_WEATHER_ITEMS)
+    else:
+        low, high = temps
+        for bound, band_items in COLD_BANDS:
+            if low <= bound:
+                items.extend(band_items)
+                break
+        for bound, band_items in HOT_BANDS:
+            if high >= bound:
+                items.extend(band_items)
+        if high < 24:
+            items.append("Sunglasses")
+
+    # Precipitation
+    conditions = str(weather.get("conditions", "")).lower()
+    rain_days = weather.get("rainDays")
+    if (rain_days is not None and rain_days >= RAIN_DAYS_THRESHOLD) or \
+            any(word in conditions for word in ("rain", "shower", "storm", "wet")):
+        items.extend(RAIN_ITEMS)
+    if "snow" in conditions:
+        items.extend(SNOW_ITEMS)
+
+    # Activity tags
+    tags = _activity_tags(activities)
+    for keywords, tag_items in TAG_RULES:
+        if tags.intersection(keywords):
+            items.extend(tag_items)
+
+    # Party type and mobility needs
+    items.extend(PARTY_RULES.get((party_type or "").lower(), []))
+    for need in mobility_needs or []:
+        items.extend(MOBILITY_RULES.get(str(need).strip().lower(), []))
+
+    if _trip_nights(dates or {}) >= 7:
+        items.append("Laundry bag and travel detergent")
+
+    return list(dict.fromkeys(items))
@@ -0,0 +1,268 @@
+"""
+Whole-plan cache for AI Agent
+Serves identical plan requests from memory, refreshing stale plans in the background
+"""
+
+import copy
+import hashlib
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Any, Callable, List, Optional
+
+import climate
+import metrics
+import work_scheduler
+from plan_session import fingerprint
+
+# How long each kind of stage output stays fresh; weather and events change faster than venues
+FIELD_TTL_SECONDS = {
+    "weather": float(os.getenv("PLAN_CACHE_WEATHER_TTL_SECONDS", 3 * 3600)),
+    "events": float(os.getenv("PLAN_CACHE_EVENTS_TTL_SECONDS", 6 * 3600)),
+    "activities": float(os.getenv("PLAN_CACHE_ACTIVITIES_TTL_SECONDS", 24 * 3600)),
+    "restaurants": float(os.getenv("PLAN_CACHE_RESTAURANTS_TTL_SECONDS", 24 * 3600))
+}
+
+# Stage -> field whose TTL applies; stages not listed (preferences, day plan, ...) use the longest TTL
+STAGE_FIELDS = {
+    "search.weather": "weather",
+    "search.events": "events",
+    "events": "events",
+    "search.pois": "activities",
+    "activities": "activities",
+    "search.restaurants": "restaurants",
+    "restaurants": "restaurants"
+}
+
+# A plan whose oldest expired field expired less than this long ago is served while it refreshes
+STALE_SECONDS = float(os.getenv("PLAN_CACHE_STALE_SECONDS", 6 * 3600))
+MAX_ENTRIES = int(os.getenv("PLAN_CACHE_MAX_ENTRIES", 500))
+
+# Stage results shared across plans (searches and extractions keyed by their inputs)
+MAX_SHARED_STAGES = int(os.getenv("PLAN_CACHE_MAX_SHARED_STAGES", 5000))
+
+_entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+_shared: "OrderedDict[tuple, Dict[str, Any]]" = OrderedDict()
+_refreshing = set()
+_lock = threading.Lock()
+
+
+def _canonical_list(values: Optional[List[Any]]) -> List[str]:
+    """Lower-cased, de-duplicated, sorted list"""
+    return sorted({str(v).strip().lower() for v in values or [] if str(v).strip()})
+
+
+def _context(
+    booking_context: Dict[str, Any],
+    preferences: Dict[str, Any],
+    booking_history: list
+) -> Dict[str, Any]:
+    """Normalized plan inputs other than the free-text query"""
+    dates = booking_context.get("dates") or {}
+    preferences = preferences or {}
+    return {
+        "location": climate.normalize_city(booking_context.get("location")),
+        "dates": [str(dates.get("startDate")), str(dates.get("endDate"))],
+        "partyType": (booking_context.get("partyType") or "solo").lower(),
+        "guests": int(booking_context.get("guests") or 1),
+        "preferences": {
+            "budget": (preferences.get("budget") or "").strip().lower() or None,
+            "interests": _canonical_list(preferences.get("interests")),
+            "dietaryFilters": _canonical_list(preferences.get("dietaryFilters")),
+            "mobilityNeeds": _canonical_list(preferences.get("mobilityNeeds"))
+        },
+        "history": fingerprint(booking_history or [])
+    }
+
+
+def context_key(
+    booking_context: Dict[str, Any],
+    preferences: Dict[str, Any],
+    booking_history: list
+) -> str:
+    """Key of everything a plan depends on except the query (plans for near-duplicate queries share it)"""
+    return fingerprint(_context(booking_context, preferences, booking_history))
+
+
+def plan_key(
+    query: str,
+    booking_context: Dict[str, Any],
+    preferences: Dict[str, Any],
+    booking_history: list
+) -> str:
+    """
+    Cache key of a normalized plan request
+
+    Booking and property IDs are left out (they only matter through the
+    hydrated location and dates), so different travelers asking for the same
+    trip share an entry unless their booking history differs.
+
+    Args:
+        query: Free-text user query
+        booking_context: Hydrated booking context
+        preferences: Preferences as sent by the client (before inference)
+        booking_history: History preference inference will read
+
+    Returns:
+        Hex key
+    """
+    normalized_query = re.sub(r"\s+", " ", (query or "").strip().lower())
+    return fingerprint({
+        **_context(booking_context, preferences, booking_history),
+        "query": hashlib.sha256(normalized_query.encode("utf-8")).hexdigest()
+    })
+
+
+def _stage_ttl(name: str) -> float:
+    """Freshness lifetime of a stage output"""
+    field = STAGE_FIELDS.get(name)
+    return FIELD_TTL_SECONDS[field] if field else max(FIELD_TTL_SECONDS.values())
+
+
+def _expired_for(entry: Dict[str, Any], now: float) -> float:
+    """Seconds since the entry's first stage expired (0 or less while every stage is fresh)"""
+    return max(
+        (now - stage.get("storedAt", entry["stored"]) - _stage_ttl(name) for name, stage in entry["stages"].items()),
+        default=now - entry["stored"] - max(FIELD_TTL_SECONDS.values())
+    )
+
+
+def fresh_stages(key: str) -> Dict[str, Dict[str, Any]]:
+    """Stage results of a cached plan that are still within their TTL (for partial recomputes)"""
+    now = time.time()
+    with _lock:
+        entry = _entries.get(key)
+        if not entry:
+            return {}
+        return {
+            name: stage for name, stage in entry["stages"].items()
+            if now - stage.get("storedAt", entry["stored"]) < _stage_ttl(name)
+        }
+
+
+def share_stages(stages: Dict[str, Dict[str, Any]], warmed: bool = False) -> None:
+    """
+    Make stage results available to other plans with the same stage inputs
+
+    Args:
+        stages: StageCache entries (name -> key, output, storedAt)
+        warmed: Whether the results were precomputed by the cache warmer
+    """
+    with _lock:
+        for name, stage in stages.items():
+            slot = (name, stage["key"])
+            existing = _shared.get(slot)
+            if existing is not None and existing.get("storedAt", 0) >= stage.get("storedAt", 0):
+                continue
+            _shared[slot] = {**stage, "warmed": warmed}
+            _shared.move_to_end(slot)
+        while len(_shared) > MAX_SHARED_STAGES:
+            _shared.popitem(last=False)
+
+
+def shared_stage(name: str, key: str) -> Optional[Dict[str, Any]]:
+    """Fresh shared result for a stage name and input fingerprint (StageCache shared lookup)"""
+    with _lock:
+        stage = _shared.get((name, key))
+        if stage is not None and time.time() - stage.get("storedAt", 0) >= _stage_ttl(name):
+            del _shared[(name, key)]
+            stage = None
+        if stage is not None:
+            _shared.move_to_end((name, key))
+    if stage is None:
+        metrics.increment("shared_stage_misses")
+        return None
+    metrics.increment("shared_stage_warmed_hits" if stage["warmed"] else "shared_stage_hits")
+    return {k: v for k, v in stage.items() if k != "warmed"}
+
+
+def peek_stage(name: str, key: str) -> Optional[Dict[str, Any]]:
+    """Fresh shared result without counting a lookup (for the cache warmer)"""
+    with _lock:
+        stage = _shared.get((name, key))
+    if stage is None or time.time() - stage.get("storedAt", 0) >= _stage_ttl(name):
+        return None
+    return {k: v for k, v in stage.items() if k != "warmed"}
+
+
+def get(key: str) -> Optional[Dict[str, Any]]:
+    """
+    Look up a cached plan
+
+    Returns:
+        None on a miss (or when too stale to serve), else a dictionary with a
+        copy of the plan, its stage results and whether it is stale
+    """
+    now = time.time()
+    with _lock:
+        entry = _entries.get(key)
+        if entry is not None:
+            _entries.move_to_end(key)
+    if entry is None:
+        metrics.increment("plan_cache_misses")
+        return None
+
+    expired_for = _expired_for(entry, now)
+    if expired_for > STALE_SECONDS:
+        metrics.increment("plan_cache_misses")
+        return None
+    stale = expired_for > 0
+    metrics.increment("plan_cache_stale_hits" if stale else "plan_cache_hits")
+    return {"plan": copy.deepcopy(entry["plan"]), "stages": dict(entry["stages"]), "stale": stale}
+
+
+def put(key: str, plan: Dict[str, Any], stages: Dict[str, Dict[str, Any]]) -> None:
+    """Store a complete (non-degraded) plan and the stage results that produced it"""
+    plan = {k: v for k, v in plan.items() if k not in ("degradedSections", "reusedStages", "sessionId")}
+    with _lock:
+        _entries[key] = {"plan": copy.deepcopy(plan), "stages": dict(stages), "stored": time.time()}
+        _entries.move_to_end(key)
+        while len(_entries) > MAX_ENTRIES:
+            _entries.popitem(last=False)
+    share_stages(stages)
+
+
+def refresh(key: str, rebuild: Callable[[], Any], traveler_id: Optional[Any] = None) -> None:
+    """
+    Rebuild a stale plan on the scheduler's background class (one refresh per key at a time)
+
+    Args:
+        key: Plan cache key
+        rebuild: Recomputes the plan and stores it with put()
+        traveler_id: Fairness key for the scheduler
+    """
+    with _lock:
+        if key in _refreshing:
+            return
+        _refreshing.add(key)
+
+    def done(future) -> None:
+        with _lock:
+            _refreshing.discard(key)
+        if future.cancelled() or future.exception() is not None:
+            metrics.increment("plan_cache_refresh_failures")
+            if not future.cancelled():
+                print(f"Warning: plan cache refresh failed: {future.exception()}")
+
+    metrics.increment("plan_cache_refreshes")
+    future = work_scheduler.submit(rebuild, priority=work_scheduler.BACKGROUND, traveler_id=traveler_id)
+    future.add_done_callback(done)
+
+
+def status() -> Dict[str, Any]:
+    """Entry count, refreshes in flight and hit rate for the metrics endpoint"""
+    counters = metrics.snapshot()["counters"]
+    hits = counters.get("plan_cache_hits", 0)
+    stale_hits = counters.get("plan_cache_stale_hits", 0)
+    lookups = hits + stale_hits + counters.get("plan_cache_misses", 0)
+    with _lock:
+        entries, refreshing, shared = len(_entries), len(_refreshing), len(_shared)
+    return {
+        "entries": entries,
+        "sharedStages": shared,
+        "refreshing": refreshing,
+        "hitRate": round((hits + stale_hits) / lookups, 3) if lookups else 0.0,
+        "staleHitRate": round(stale_hits / lookups, 3) if lookups else 0.0
+    }
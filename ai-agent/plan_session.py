@@ -0,0 +1,149 @@
+"""
+Plan sessions for AI Agent
+Stores plan inputs and per-stage intermediate results so replans recompute only what changed
+"""
+
+import copy
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Dict, Any, Callable, Optional, Tuple
+
+SESSION_TTL_SECONDS = float(os.getenv("PLAN_SESSION_TTL_SECONDS", 3600))
+MAX_SESSIONS = int(os.getenv("PLAN_SESSION_MAX", 1000))
+
+
+def fingerprint(inputs: Any) -> str:
+    """Stable hash of a stage's inputs"""
+    encoded = json.dumps(inputs, sort_keys=True, default=str, separators=(",", ":"))
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+class StageCache:
+    """
+    Stage results keyed by an input fingerprint
+
+    A stage is reused when its inputs hash to the same key as last time; any
+    upstream change alters the inputs of every dependent stage, so only those
+    stages recompute.
+    """
+
+    def __init__(
+        self,
+        entries: Optional[Dict[str, Dict[str, Any]]] = None,
+        shared: Optional[Callable[[str, str], Optional[Dict[str, Any]]]] = None
+    ):
+        self.entries = entries if entries is not None else {}
+        self.shared = shared
+        self.reused = []
+        self.computed = []
+
+    def lookup(self, name: str, inputs: Any) -> Tuple[bool, Any]:
+        """
+        Return (hit, output) for a stage with the given inputs
+
+        When the session has no matching result, the shared lookup (stage
+        results of other plans, keyed by stage name and input fingerprint) is
+        consulted.
+        """
+        key = fingerprint(inputs)
+        entry = self.entries.get(name)
+        if (not entry or entry["key"] != key) and self.shared is not None:
+            entry = self.shared(name, key)
+            if entry:
+                self.entries[name] = entry
+        if entry and entry["key"] == key:
+            self.reused.append(name)
+            return True, entry["output"]
+        return False, None
+
+    def store(self, name: str, inputs: Any, output: Any) -> None:
+        """Remember a stage output for its inputs (with the wall-clock time it was computed)"""
+        self.entries[name] = {"key": fingerprint(inputs), "output": output, "storedAt": time.time()}
+        self.computed.append(name)
+
+    def run(self, name: str, inputs: Any, compute: Callable[[], Any], deadline=None) -> Any:
+        """
+        Reuse a stage output or compute and store it
+
+        Outputs produced while the deadline degraded a section are not stored,
+        so the next replan retries them.
+        """
+        hit, output = self.lookup(name, inputs)
+        if hit:
+            return output
+
+        degraded_before = len(deadline.degraded) if deadline else 0
+        output = compute()
+        if deadline and len(deadline.degraded) > degraded_before:
+            self.computed.append(name)
+            return output
+        self.store(name, inputs, output)
+        return output
+
+
+_sessions: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+_lock = threading.Lock()
+
+
+def _expire() -> None:
+    """Drop expired and excess sessions (caller holds the lock)"""
+    now = time.monotonic()
+    for session_id in [s for s, v in _sessions.items() if now - v["touched"] > SESSION_TTL_SECONDS]:
+        del _sessions[session_id]
+    while len(_sessions) > MAX_SESSIONS:
+        _sessions.popitem(last=False)
+
+
+def save(inputs: Dict[str, Any], stages: StageCache, session_id: Optional[str] = None) -> str:
+    """
+    Store a session's inputs and stage results
+
+    Args:
+        inputs: Plan request inputs (query, bookingContext, preferences)
+        stages: Stage cache produced by the plan run
+        session_id: Existing session to overwrite (None to create one)
+
+    Returns:
+        The session ID
+    """
+    session_id = session_id or uuid.uuid4().hex
+    with _lock:
+        _sessions[session_id] = {
+            "inputs": copy.deepcopy(inputs),
+            "stages": stages.entries,
+            "touched": time.monotonic()
+        }
+        _sessions.move_to_end(session_id)
+        _expire()
+    return session_id
+
+
+def load(session_id: str) -> Optional[Dict[str, Any]]:
+    """Return a copy of a session's inputs and a fresh StageCache over its results"""
+    with _lock:
+        _expire()
+        session = _sessions.get(session_id)
+        if not session:
+            return None
+        session["touched"] = time.monotonic()
+        _sessions.move_to_end(session_id)
+        return {
+            "inputs": copy.deepcopy(session["inputs"]),
+            "stages": StageCache(dict(session["stages"]))
+        }
+
+
+def merge_inputs(previous: Dict[str, Any], changes: Dict[str, Any]) -> Dict[str, Any]:
+    """Apply a partial update (query, bookingContext, preferences fields) to stored inputs"""
+    merged = copy.deepcopy(previous)
+    if changes.get("query") is not None:
+        merged["query"] = changes["query"]
+    for section in ("bookingContext", "preferences"):
+        if changes.get(section):
+            merged[section] = {**(merged.get(section) or {}), **changes[section]}
+    return merged
@@ -0,0 +1,253 @@
+"""
+Local preference classifier for AI Agent
+Rule and keyword based inference of budget, interests, dietary and mobility preferences
+"""
+
+import os
+import re
+from typing import Dict, Any, List, Optional, Tuple
+
+# Minimum confidence for the local result to be used without calling the LLM
+CONFIDENCE_THRESHOLD = float(os.getenv("PREFERENCE_CONFIDENCE_THRESHOLD", 0.7))
+
+# Weight of each field in the overall confidence score
+FIELD_WEIGHTS = {
+    "budget": 0.35,
+    "interests": 0.45,
+    "dietaryFilters": 0.1,
+    "mobilityNeeds": 0.1
+}
+
+BUDGET_KEYWORDS = {
+    "budget": ["cheap", "budget", "hostel", "backpack", "backpacker", "backpacking",
+               "affordable", "inexpensive", "low cost", "low-cost", "save money", "shoestring"],
+    "luxury": ["luxury", "luxurious", "expensive", "5-star", "5 star", "five star", "five-star",
+               "premium", "high-end", "high end", "upscale", "splurge", "fine dining"],
+    "medium": ["mid-range", "mid range", "moderate", "reasonably priced", "not too expensive"]
+}
+
+INTEREST_KEYWORDS = {
+    "museums": ["museum", "museums", "gallery", "galleries", "exhibit", "exhibition"],
+    "food": ["food", "foodie", "eat", "eating", "cuisine", "restaurant", "restaurants",
+             "dining", "culinary", "street food", "tasting"],
+    "beaches": ["beach", "beaches", "seaside", "coast", "surf", "surfing", "snorkel", "snorkeling"],
+    # Plain "party" is left out: it usually means the travel party ("party of four")
+    "nightlife": ["nightlife", "bar", "bars", "club", "clubs", "clubbing", "partying", "party scene",
+                  "bachelor party", "bachelorette party", "stag party", "hen party", "pub", "pubs"],
+    "shopping": ["shopping", "shop", "shops", "market", "markets", "boutique", "boutiques", "mall"],
+    "nature": ["nature", "hike", "hiking", "park", "parks", "mountain", "mountains", "outdoors",
+               "outdoor", "wildlife", "garden", "gardens", "lake", "trail", "trails"],
+    "culture": ["culture", "cultural", "history", "historic", "historical", "heritage",
+                "architecture", "landmark", "landmarks", "theatre", "theater", "opera"],
+    "art": ["art", "arts", "artist", "painting", "paintings", "sculpture"],
+    "adventure": ["adventure", "adventurous", "kayak", "kayaking", "climbing", "zipline",
+                  "rafting", "skydiving", "scuba", "diving", "ski", "skiing"],
+    "romantic": ["romantic", "romance", "honeymoon", "anniversary", "date night"],
+    "family-friendly": ["kid", "kids", "child", "children", "family", "toddler", "toddlers",
+                        "baby", "babies", "son", "daughter"],
+    "wellness": ["wellness", "spa", "spas", "yoga", "massage", "relax", "relaxing", "retreat"],
+    "relaxation": ["relaxation", "chill", "unwind", "slow pace", "laid back", "laid-back"]
+}
+
+DIETARY_KEYWORDS = {
+    "vegetarian": ["vegetarian", "vegetarians", "veggie", "no meat", "meat-free", "meatless"],
+    "vegan": ["vegan", "vegans", "plant-based", "plant based"],
+    "gluten-free": ["gluten-free", "gluten free", "celiac", "coeliac", "no gluten"],
+    "halal": ["halal"],
+    "kosher": ["kosher"]
+}
+
+MOBILITY_KEYWORDS = {
+    "wheelchair": ["wheelchair", "wheelchairs", "wheel chair"],
+    "limited-mobility": ["limited mobility", "mobility issues", "cannot walk far", "can't walk far",
+                         "walker", "cane", "crutches", "bad knees", "step-free", "no stairs"],
+    "elderly": ["elderly", "senior", "seniors", "grandma", "grandpa", "grandparents",
+                "grandmother", "grandfather", "older parents"],
+    "child-friendly": ["stroller", "pram", "toddler", "toddlers", "baby", "babies",
+                       "kid", "kids", "child", "children"]
+}
+
+# Destination types used to infer interests from booking history
+CULTURAL_CITIES = {
+    "paris", "rome", "london", "florence", "venice", "vienna", "prague", "barcelona",
+    "madrid", "berlin", "amsterdam", "athens", "istanbul", "kyoto", "tokyo", "new york",
+    "washington", "boston", "st. petersburg", "lisbon", "budapest", "edinburgh"
+}
+
+BEACH_DESTINATIONS = {
+    "miami", "honolulu", "maui", "cancun", "san diego", "malibu", "santa monica",
+    "bali", "phuket", "ibiza", "nice", "cannes", "rio de janeiro", "tulum",
+    "key west", "myrtle beach", "gold coast", "fort lauderdale", "santa barbara"
+}
+
+NUMBER_WORDS = r"(?:\d+|a|one|two|three|four|five|six|seven|eight|nine|ten)"
+
+
+def _compile(keywords: Dict[str, List[str]]) -> List[Tuple[str, "re.Pattern"]]:
+    """Compile a keyword table into one word-bounded regex per label"""
+    compiled = []
+    for label, phrases in keywords.items():
+        alternatives = "|".join(re.escape(p) for p in sorted(phrases, key=len, reverse=True))
+        compiled.append((label, re.compile(rf"(?<![\w-])(?:{alternatives})(?![\w-])", re.IGNORECASE)))
+    return compiled
+
+
+_BUDGET_PATTERNS = _compile(BUDGET_KEYWORDS)
+_INTEREST_PATTERNS = _compile(INTEREST_KEYWORDS)
+_DIETARY_PATTERNS = _compile(DIETARY_KEYWORDS)
+_MOBILITY_PATTERNS = _compile(MOBILITY_KEYWORDS)
+_PARTY_COUNT_PATTERN = re.compile(
+    rf"\b{NUMBER_WORDS}\s+(?:kids?|children|child|sons?|daughters?|toddlers?|babies|baby)\b",
+    re.IGNORECASE
+)
+
+
+def _match_labels(text: str, patterns: List[Tuple[str, "re.Pattern"]]) -> List[str]:
+    """Return every label whose keywords appear in the text, in table order"""
+    return [label for label, pattern in patterns if pattern.search(text)]
+
+
+def budget_tier_for_nights(average_nights: float) -> str:
+    """Map an average stay length to a budget tier (1-2 nights budget, 7+ luxury)"""
+    if average_nights <= 2:
+        return "budget"
+    if average_nights >= 7:
+        return "luxury"
+    return "medium"
+
+
+def explicit_budget(query: str) -> Optional[str]:
+    """Return the budget tier stated in the query, if any"""
+    matches = _match_labels(query or "", _BUDGET_PATTERNS)
+    return matches[0] if matches else None
+
+
+def _budget_from_history(booking_history: List[Dict[str, Any]]) -> Optional[str]:
+    """Map typical stay length to a budget tier using the prompt's night-count rules"""
+    nights = [int(b["nights"]) for b in booking_history if b.get("nights") is not None]
+    if not nights:
+        return None
+    return budget_tier_for_nights(sum(nights) / len(nights))
+
+
+def _interests_from_history(booking_history: List[Dict[str, Any]]) -> List[str]:
+    """Map past destinations and party sizes to interests"""
+    interests = []
+    for booking in booking_history:
+        city = str(booking.get("location") or "").strip().lower()
+        if city in CULTURAL_CITIES:
+            interests.extend(["museums", "culture", "art"])
+        if city in BEACH_DESTINATIONS:
+            interests.extend(["beaches", "relaxation"])
+        if int(booking.get("guests") or 0) >= 3:
+            interests.append("family-friendly")
+    return list(dict.fromkeys(interests))
+
+
+def classify_preferences(
+    query: str,
+    booking_history: List[Dict[str, Any]] = None,
+    existing_preferences: Dict[str, Any] = None
+) -> Dict[str, Any]:
+    """
+    Infer travel preferences locally from the query text and booking history
+
+    Args:
+        query: Free-text user query
+        booking_history: Previous bookings as returned by get_user_booking_history
+        existing_preferences: Preferences already provided (may be partial)
+
+    Returns:
+        Dictionary with budget, interests, dietaryFilters, mobilityNeeds,
+        reasoning, a confidence score between 0 and 1 and the fields that
+        were only defaulted
+    """
+    query = query or ""
+    booking_history = booking_history or []
+    existing_preferences = existing_preferences or {}
+    reasons = []
+    scores = {}
+    defaulted = []
+
+    # Budget: explicit keywords win over history, history wins over the default
+    budget_matches = _match_labels(query, _BUDGET_PATTERNS)
+    history_budget = _budget_from_history(booking_history)
+    if existing_preferences.get("budget"):
+        budget = existing_preferences["budget"]
+        scores["budget"] = 1.0
+    elif budget_matches:
+        budget = budget_matches[0]
+        scores["budget"] = 1.0
+        reasons.append(f"budget '{budget}' from query keywords")
+    elif history_budget:
+        budget = history_budget
+        scores["budget"] = 0.8 if len(booking_history) >= 2 else 0.6
+        reasons.append(f"budget '{budget}' from typical stay length")
+    else:
+        budget = "medium"
+        scores["budget"] = 0.0
+
+    # Interests: query keywords plus destination and party-size patterns
+    query_interests = _match_labels(query, _INTEREST_PATTERNS)
+    if _PARTY_COUNT_PATTERN.search(query) and "family-friendly" not in query_interests:
+        query_interests.append("family-friendly")
+    history_interests = _interests_from_history(booking_history)
+    interests = list(dict.fromkeys(query_interests + history_interests))
+    if existing_preferences.get("interests"):
+        scores["interests"] = 1.0
+    elif query_interests:
+        scores["interests"] = 1.0
+        reasons.append(f"interests {query_interests} from query keywords")
+    elif history_interests:
+        scores["interests"] = 0.6
+        reasons.append(f"interests {history_interests} from past destinations")
+    else:
+        scores["interests"] = 0.0
+        defaulted.append("interests")
+
+    # Without price words or history "medium" is also the LLM's answer, so it only
+    # needs the LLM when the interests are a guess too (or history could say more)
+    if not scores["budget"]:
+        if not booking_history and scores["interests"]:
+            scores["budget"] = 0.6
+            reasons.append("budget 'medium' (no price words or booking history)")
+        else:
+            defaulted.insert(0, "budget")
+            reasons.append("budget defaulted to 'medium'")
+
+    # Dietary and mobility: an absent mention usually means no restriction
+    dietary = _match_labels(query, _DIETARY_PATTERNS)
+    mobility = _match_labels(query, _MOBILITY_PATTERNS)
+    scores["dietaryFilters"] = 1.0 if dietary or existing_preferences.get("dietaryFilters") else 0.8
+    scores["mobilityNeeds"] = 1.0 if mobility or existing_preferences.get("mobilityNeeds") else 0.8
+    if dietary:
+        reasons.append(f"dietary {dietary} from query keywords")
+    if mobility:
+        reasons.append(f"mobility {mobility} from query keywords")
+
+    confidence = sum(FIELD_WEIGHTS[field] * score for field, score in scores.items())
+
+    return {
+        "budget": budget,
+        "interests": interests,
+        "dietaryFilters": dietary,
+        "mobilityNeeds": mobility,
+        "reasoning": "Local classifier: " + ("; ".join(reasons) if reasons else "no explicit signals"),
+        "confidence": round(confidence, 3),
+        "defaulted": defaulted
+    }
+
+
+def is_confident(inferred: Dict[str, Any], threshold: float = None) -> bool:
+    """
+    Check whether a classifier result is confident enough to skip the LLM
+
+    A result with a defaulted field is never confident: the default is a
+    guess, which is exactly what the LLM is asked to resolve. A "medium"
+    budget for a first-time traveler whose interests matched is not counted
+    as defaulted, since the LLM would answer the same.
+    """
+    threshold = CONFIDENCE_THRESHOLD if threshold is None else threshold
+    if inferred.get("defaulted"):
+        return False
+    return inferred.get("confidence", 0.0) >= threshold
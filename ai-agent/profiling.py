@@ -0,0 +1,200 @@
+"""
+On-demand profiling for AI Agent
+Per-request wall-clock stage spans and a time-boxed sampling profiler with collapsed-stack output
+"""
+
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter, deque
+from contextlib import contextmanager
+from typing import Dict, Any, Callable, List, Optional
+
+# Share of plan requests profiled without the X-Profile header (0 disables sampling)
+SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", 0))
+
+# Recent request profiles kept for the admin endpoint
+RECENT_PROFILES = int(os.getenv("PROFILE_RECENT_MAX", 50))
+
+# Longest and default sampling profile, and the sampling interval
+MAX_SAMPLE_SECONDS = float(os.getenv("PROFILE_MAX_SAMPLE_SECONDS", 60))
+DEFAULT_INTERVAL_MS = 5.0
+
+# Admin profiling endpoints are disabled unless a token is configured
+ADMIN_TOKEN = os.getenv("PROFILING_ADMIN_TOKEN", "")
+
+_current = threading.local()
+_recent: deque = deque(maxlen=RECENT_PROFILES)
+_recent_lock = threading.Lock()
+_sampler_lock = threading.Lock()
+
+
+class RequestProfile:
+    """Wall-clock spans recorded for one plan request, from any thread it uses"""
+
+    def __init__(self, reason: str):
+        self.reason = reason
+        self.started = time.perf_counter()
+        self.started_at = time.time()
+        self.spans: List[Dict[str, Any]] = []
+        self.lock = threading.Lock()
+
+    def add(self, name: str, start: float, end: float) -> None:
+        """Record a span from perf_counter start and end times"""
+        with self.lock:
+            self.spans.append({
+                "name": name,
+                "startMs": round((start - self.started) * 1000, 2),
+                "durationMs": round((end - start) * 1000, 2),
+                "thread": threading.current_thread().name
+            })
+
+    def summary(self) -> Dict[str, Any]:
+        """Spans in start order, plus total wall time per span name"""
+        with self.lock:
+            spans = sorted(self.spans, key=lambda s: s["startMs"])
+        totals: Dict[str, float] = {}
+        for span_ in spans:
+            totals[span_["name"]] = round(totals.get(span_["name"], 0.0) + span_["durationMs"], 2)
+        return {
+            "reason": self.reason,
+            "startedAt": self.started_at,
+            "totalMs": round((time.perf_counter() - self.started) * 1000, 2),
+            "spans": spans,
+            "byName": totals
+        }
+
+    def server_timing(self) -> str:
+        """Server-Timing header entries (one per span name, summed)"""
+        return ", ".join(
+            f"{name.replace('.', '-')};dur={duration:.2f}" for name, duration in self.summary()["byName"].items()
+        )
+
+
+def start_request(requested: bool) -> Optional[RequestProfile]:
+    """
+    Decide whether to profile a request
+
+    Args:
+        requested: The client sent X-Profile
+
+    Returns:
+        A profile, or None (the common case) when the request is not profiled
+    """
+    if requested:
+        return RequestProfile("header")
+    if SAMPLE_RATE > 0 and random.random() < SAMPLE_RATE:
+        return RequestProfile("sampled")
+    return None
+
+
+def finish_request(profile: RequestProfile, label: str) -> Dict[str, Any]:
+    """Keep a finished request profile for the admin endpoint and return its summary"""
+    summary = {**profile.summary(), "request": label}
+    with _recent_lock:
+        _recent.append(summary)
+    return summary
+
+
+def recent_profiles() -> List[Dict[str, Any]]:
+    """Recently finished request profiles, newest first"""
+    with _recent_lock:
+        return list(reversed(_recent))
+
+
+def current() -> Optional[RequestProfile]:
+    """Profile of the request this thread is working for"""
+    return getattr(_current, "profile", None)
+
+
+@contextmanager
+def activate(profile: Optional[RequestProfile]):
+    """Make a profile current on this thread for the duration of the block"""
+    previous = current()
+    _current.profile = profile
+    try:
+        yield
+    finally:
+        _current.profile = previous
+
+
+@contextmanager
+def span(name: str):
+    """Record the block as a span of the current request profile (no-op when not profiling)"""
+    profile = getattr(_current, "profile", None)
+    if profile is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        profile.add(name, start, time.perf_counter())
+
+
+def bind(fn: Callable) -> Callable:
+    """Carry the current profile into a function run on another thread (fn itself when not profiling)"""
+    profile = current()
+    if profile is None:
+        return fn
+
+    def bound(*args, **kwargs):
+        with activate(profile):
+            return fn(*args, **kwargs)
+
+    return bound
+
+
+def _frame_stack(frame) -> List[str]:
+    """Root-first "module:function" names of a frame's stack"""
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        module = os.path.splitext(os.path.basename(code.co_filename))[0]
+        names.append(f"{module}:{code.co_name}")
+        frame = frame.f_back
+    names.reverse()
+    return names
+
+
+def sample_stacks(seconds: float, interval_ms: float = DEFAULT_INTERVAL_MS,
+                  thread_prefix: Optional[str] = None) -> str:
+    """
+    Sample every thread's stack for a while and return collapsed stacks
+
+    Each output line is "thread;frame;frame;... count", the format read by
+    flamegraph.pl, speedscope and most flamegraph viewers. Only one sampling
+    session runs at a time.
+
+    Args:
+        seconds: Sampling duration (capped at PROFILE_MAX_SAMPLE_SECONDS)
+        interval_ms: Time between samples
+        thread_prefix: Only sample threads whose name starts with this (e.g. "plan-")
+
+    Returns:
+        Collapsed stack text
+
+    Raises:
+        RuntimeError: if another sampling session is running
+    """
+    if not _sampler_lock.acquire(blocking=False):
+        raise RuntimeError("A sampling profile is already running")
+    try:
+        seconds = min(max(seconds, 0.1), MAX_SAMPLE_SECONDS)
+        interval = max(interval_ms, 1.0) / 1000
+        me = threading.get_ident()
+        counts: Counter = Counter()
+        ends_at = time.monotonic() + seconds
+        while time.monotonic() < ends_at:
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                name = names.get(ident, str(ident))
+                if ident == me or (thread_prefix and not name.startswith(thread_prefix)):
+                    continue
+                counts[";".join([name] + _frame_stack(frame))] += 1
+            time.sleep(interval)
+        return "\n".join(f"{stack} {count}" for stack, count in counts.most_common()) + "\n"
+    finally:
+        _sampler_lock.release()
@@ -1,7 +1,38 @@
 """
 Prompt templates for LangChain AI Agent
+
+Each task prompt is a PromptLayout: a static instruction prefix that is
+byte-identical on every call (so provider-side prefix caching applies) followed
+by the per-request data, which always comes last.
 """
 
+from string import Formatter
+from typing import Tuple
+
+
+class PromptLayout:
+    """Static instruction prefix plus a per-request data template, prepared once at import"""
+    
+    def __init__(self, name: str, role: str, instructions: str, data_template: str):
+        self.name = name
+        self.prefix = f"{role}\n\n{instructions.strip()}\n"
+        self.data_template = data_template.strip()
+        self.fields = frozenset(
+            field for _, field, _, _ in Formatter().parse(self.data_template) if field
+        )
+    
+    def render(self, **values) -> Tuple[str, str]:
+        """
+        Return (static prefix, data) for one call
+        
+        Raises:
+            KeyError: if a data field is missing
+        """
+        missing = self.fields - values.keys()
+        if missing:
+            raise KeyError(f"{self.name} prompt is missing {sorted(missing)}")
+        return self.prefix, self.data_template.format(**values)
+
 TRAVEL_PLANNER_SYSTEM_PROMPT = """You are an expert AI travel concierge assistant specializing in creating personalized travel itineraries.
 
 Your role is to:
@@ -30,7 +61,92 @@ Generate a structured JSON response with:
 5. localContext: Weather, events, and transportation tips
 """
 
-ACTIVITY_EXTRACTION_PROMPT = """Based on the POI search results, extract and structure activity information.
+JSON_ONLY_ROLE = "You are a JSON-only response bot. Return valid JSON only."
+
+QUERY_PREFERENCE_PROMPT = PromptLayout(
+    "preferences_query",
+    JSON_ONLY_ROLE,
+    """
+You are a travel preferences analyzer. Analyze the user's query (given at the end) and infer their travel preferences.
+
+**Task**: Infer missing preferences from the query. Return JSON only.
+
+**Inference Rules**:
+- Budget: "budget"/"low" for cheap/hostel/backpacker, "high"/"luxury" for expensive/5-star/premium, "medium" otherwise
+- Interests: Extract activities mentioned (museums, food, beaches, nightlife, shopping, nature, culture, adventure, romantic, family-friendly, wellness)
+- Dietary: Extract any diet mentions (vegetarian, vegan, gluten-free, halal, kosher)
+- Mobility: Extract any accessibility needs (wheelchair, elderly, child-friendly)
+
+**Response Format** (JSON only):
+{
+  "budget": "medium",
+  "interests": ["museums", "food"],
+  "dietaryFilters": ["vegetarian"],
+  "mobilityNeeds": [],
+  "reasoning": "Brief explanation of inference logic"
+}
+
+Return ONLY the JSON, nothing else.
+""",
+    """
+**User Query**: "{query}"
+
+**Current Preferences** (may be empty or partial):
+{existing_preferences}
+"""
+)
+
+HISTORY_PREFERENCE_PROMPT = PromptLayout(
+    "preferences_history",
+    JSON_ONLY_ROLE,
+    """
+You are a travel preferences analyzer. Based on the user's booking history and current query (given at the end), infer their travel preferences.
+
+**Task**: Analyze patterns in booking history and the query to infer missing preferences. Return JSON only.
+
+**Inference Rules**:
+1. **Budget**: 
+   - "low" if mostly short stays (1-2 nights) or budget destinations
+   - "high" if long stays (7+ nights) or luxury destinations  
+   - "medium" for 3-6 night stays
+   
+2. **Interests**: Based on destination types:
+   - Cultural cities (Paris, Rome, etc.) -> "museums", "culture", "art"
+   - Beach destinations -> "beaches", "relaxation"
+   - Family patterns (3-4+ guests) -> "family-friendly"
+   - Extract explicit interests from query
+   
+3. **Dietary**: Extract from query if mentioned (vegetarian, vegan, etc.)
+
+4. **Mobility**: Extract from query if mentioned (wheelchair, elderly, etc.)
+
+**Response Format** (JSON only):
+{
+  "budget": "medium",
+  "interests": ["museums", "culture", "family-friendly"],
+  "dietaryFilters": ["vegetarian"],
+  "mobilityNeeds": [],
+  "reasoning": "Brief explanation of your inference logic based on the history and query"
+}
+
+Return ONLY the JSON, nothing else.
+""",
+    """
+**Booking History**:
+{history}
+
+**Current Query**: "{query}"
+
+**Current Preferences** (may be empty or partial):
+{existing_preferences}
+"""
+)
+
+ACTIVITY_EXTRACTION_PROMPT = PromptLayout(
+    "activities",
+    "You are a travel data extraction expert. Return only valid JSON.",
+    """
+Based on the POI search results (given at the end), extract and structure activity information.
 
 For each activity, provide:
 - name: Activity name
@@ -44,18 +160,11 @@ For each activity, provide:
 
 Note: Do NOT include geolocation field if coordinates are not available.
 
-Search Results:
-{search_results}
-
-Party Type: {party_type}
-Interests: {interests}
-Mobility Needs: {mobility_needs}
-
 Extract and structure the activities as JSON array. Return valid JSON only.
 
 Example format:
 [
-  {{
+  {
     "name": "Museum of Modern Art",
     "address": "123 Main St",
     "estimatedDuration": "2-3 hours",
@@ -64,11 +173,24 @@ Example format:
     "tags": ["museum", "culture", "indoor"],
     "wheelchairAccessible": true,
     "childFriendly": true
-  }}
+  }
 ]
+""",
+    """
+Party Type: {party_type}
+Interests: {interests}
+Mobility Needs: {mobility_needs}
+
+Search Results:
+{search_results}
 """
+)
 
-RESTAURANT_EXTRACTION_PROMPT = """Based on the restaurant search results, extract and structure restaurant information.
+RESTAURANT_EXTRACTION_PROMPT = PromptLayout(
+    "restaurants",
+    "You are a culinary expert. Return only valid JSON.",
+    """
+Based on the restaurant search results (given at the end), extract and structure restaurant information.
 
 For each restaurant, provide:
 - name: Restaurant name
@@ -80,52 +202,89 @@ For each restaurant, provide:
 
 Note: Do NOT include geolocation field if coordinates are not available.
 
-Search Results:
-{search_results}
-
-Dietary Filters: {dietary_filters}
-Budget: {budget}
-
 Filter and prioritize restaurants that match the dietary requirements and budget.
 Return as valid JSON array only.
 
 Example format:
 [
-  {{
+  {
     "name": "Green Leaf Bistro",
     "cuisine": "Contemporary Vegetarian",
     "address": "456 Oak Ave",
     "priceRange": "$$",
     "dietaryOptions": ["vegetarian", "vegan", "gluten-free"],
     "description": "Farm-to-table vegetarian restaurant with vegan options"
-  }}
+  }
 ]
+""",
+    """
+Dietary Filters: {dietary_filters}
+Budget: {budget}
+
+Search Results:
+{search_results}
 """
+)
+
+EVENT_EXTRACTION_PROMPT = PromptLayout(
+    "events",
+    "You are a travel data extraction expert. Return only valid JSON.",
+    """
+Based on the event search results (given at the end), extract the individual dated events.
+
+For each event, provide:
+- name: Event name
+- startDate: First day of the event (YYYY-MM-DD)
+- endDate: Last day of the event (YYYY-MM-DD, same as startDate for one-day events)
+- venue: Venue or neighbourhood (or "")
+- url: URL of the search result the event came from
+- description: Brief description
+
+Only include events whose dates are stated in the results; skip undated listings,
+permanent attractions and generic "things to do" pages. Events outside the search
+window are still useful: include them with their real dates.
+
+Return as valid JSON array only.
 
-DAY_BY_DAY_PROMPT = """Create a detailed day-by-day itinerary for the trip.
+Example format:
+[
+  {
+    "name": "Autumn Jazz Festival",
+    "startDate": "2025-11-02",
+    "endDate": "2025-11-04",
+    "venue": "Riverside Park",
+    "url": "https://example.com/jazz-festival",
+    "description": "Three days of open-air jazz concerts"
+  }
+]
+""",
+    """
+Location: {location}
+Search Windows: {windows}
 
+Search Results:
+{search_results}
+"""
+)
+
+DAY_PLAN_POLISH_PROMPT = PromptLayout(
+    "day_plan_polish",
+    "You are a travel itinerary writer. Return only valid JSON.",
+    """
+Rewrite the wording of the scheduled itinerary (given at the end) so it reads naturally.
+
+Rules:
+- Keep every activity and restaurant in the same day and slot; do not add, remove or move any
+- Keep each slot to one or two sentences
+- Keep the same day and date values
+
+Return as valid JSON array only, one object per day with day, date, morning, afternoon and evening.
+""",
+    """
 Trip Details:
 - Location: {location}
-- Start Date: {start_date}
-- End Date: {end_date}
-- Duration: {nights} nights
 - Party Type: {party_type}
 - Number of Guests: {guests}
-
-Available Activities:
-{activities}
-
-Available Restaurants:
-{restaurants}
-
-Weather:
-{weather}
-
-Local Events:
-{events}
-
-User Preferences:
-- Budget: {budget}
 - Interests: {interests}
 - Dietary Restrictions: {dietary_filters}
 - Mobility Needs: {mobility_needs}
@@ -133,46 +292,16 @@ User Preferences:
 User Query (free text):
 {user_query}
 
-Create a day-by-day plan with:
-- day: Day number (1, 2, 3, etc.)
-- date: Date in YYYY-MM-DD format
-- morning: Morning activities (8am-12pm) with specific recommendations
-- afternoon: Afternoon activities (12pm-6pm) with lunch and sightseeing
-- evening: Evening activities (6pm-10pm) with dinner recommendations
-
-Consider:
-- Travel time between locations
-- Meal times (breakfast, lunch, dinner)
-- Rest periods for families with children
-- Weather conditions
-- Local events
-- Opening hours
-- Accessibility requirements
-
-Return as valid JSON array only.
-
-Example format:
-[
-  {{
-    "day": 1,
-    "date": "2025-11-17",
-    "morning": "Start with breakfast at Green Leaf Bistro, then visit Museum of Modern Art",
-    "afternoon": "Lunch at downtown cafe, explore historic district",
-    "evening": "Dinner at waterfront restaurant, evening stroll"
-  }}
-]
+Scheduled Days:
+{days}
 """
+)
 
-PACKING_CHECKLIST_PROMPT = """Generate a weather-aware packing checklist.
-
-Trip Details:
-- Location: {location}
-- Start Date: {start_date}
-- End Date: {end_date}
-- Weather: {weather}
-- Activities: {activities}
-- Party Type: {party_type}
-- Mobility Needs: {mobility_needs}
+PACKING_CHECKLIST_PROMPT = PromptLayout(
+    "packing",
+    "You are a travel packing expert. Return a JSON array of packing items.",
+    """
+Generate a weather-aware packing checklist for the trip (details given at the end).
 
 Generate a comprehensive packing list that includes:
 - Weather-appropriate clothing (based on temperature and conditions)
@@ -194,7 +323,18 @@ Example format:
   "Camera or smartphone",
   "Reusable water bottle"
 ]
+""",
+    """
+Trip Details:
+- Location: {location}
+- Start Date: {start_date}
+- End Date: {end_date}
+- Weather: {weather}
+- Activities: {activities}
+- Party Type: {party_type}
+- Mobility Needs: {mobility_needs}
 """
+)
 
 def format_search_results(results: list, max_length: int = 3000) -> str:
     """Format search results for prompt inclusion"""
@@ -220,3 +360,4 @@ def format_activities_summary(activities: list) -> str:
     unique_tags = list(set(flat_tags))
     
     return ", ".join(unique_tags[:10])  # Top 10 unique activity types
+
@@ -0,0 +1,141 @@
+"""
+Compact response encoding for AI Agent
+Sparse fieldsets, raw payload stripping, fast JSON encoding and gzip/brotli negotiation
+"""
+
+import gzip
+import json
+import time
+from typing import Dict, Any, List, Optional, Tuple
+
+from fastapi.responses import Response
+
+import metrics
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Bodies smaller than this are sent uncompressed
+MIN_COMPRESS_BYTES = 1024
+
+# Keys holding full search payloads that the frontend never renders
+RAW_PAYLOAD_KEYS = ("raw_results",)
+
+
+def strip_raw_payloads(value: Any) -> Any:
+    """Return a copy of the response without raw search payloads"""
+    if isinstance(value, dict):
+        return {k: strip_raw_payloads(v) for k, v in value.items() if k not in RAW_PAYLOAD_KEYS}
+    if isinstance(value, list):
+        return [strip_raw_payloads(item) for item in value]
+    return value
+
+
+def parse_fields(fields: Optional[str]) -> List[str]:
+    """Parse a comma-separated fields parameter (dotted paths allowed)"""
+    if not fields:
+        return []
+    return [f.strip() for f in fields.split(",") if f.strip()]
+
+
+def select_fields(content: Dict[str, Any], fields: List[str]) -> Dict[str, Any]:
+    """
+    Keep only the requested fields of a response
+
+    Args:
+        content: Full response dictionary
+        fields: Field paths such as "activities" or "localContext.weather"
+
+    Returns:
+        Response containing "success" plus the selected fields
+    """
+    if not fields:
+        return content
+
+    selected = {"success": content.get("success")}
+    for path in fields:
+        parts = path.split(".")
+        source, target = content, selected
+        for i, part in enumerate(parts):
+            if not isinstance(source, dict) or part not in source:
+                break
+            if i == len(parts) - 1:
+                target[part] = source[part]
+            else:
+                source = source[part]
+                target = target.setdefault(part, {})
+    return selected
+
+
+def encode_json(content: Any) -> bytes:
+    """Serialize to JSON bytes with orjson when available"""
+    if orjson is not None:
+        return orjson.dumps(content, default=str, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(content, ensure_ascii=False, separators=(",", ":"), default=str).encode("utf-8")
+
+
+def compress(body: bytes, accept_encoding: str) -> Tuple[bytes, Optional[str]]:
+    """Compress a body with the best encoding the client accepts (br, then gzip)"""
+    if len(body) < MIN_COMPRESS_BYTES:
+        return body, None
+
+    accepted = {part.split(";")[0].strip().lower() for part in (accept_encoding or "").split(",")}
+    if brotli is not None and "br" in accepted:
+        return brotli.compress(body, quality=4), "br"
+    if "gzip" in accepted:
+        return gzip.compress(body, compresslevel=5), "gzip"
+    return body, None
+
+
+def build_response(
+    content: Dict[str, Any],
+    fields: Optional[str] = None,
+    include_raw: bool = False,
+    accept_encoding: str = "",
+    metric_prefix: str = "plan_response"
+) -> Response:
+    """
+    Encode a response dictionary into a compact, optionally compressed response
+
+    Records payload size and serialization time per response.
+
+    Args:
+        content: Response dictionary
+        fields: Comma-separated sparse fieldset (None for all fields)
+        include_raw: Keep raw search payloads in the response
+        accept_encoding: Client Accept-Encoding header
+        metric_prefix: Prefix for recorded metrics
+
+    Returns:
+        FastAPI Response with JSON body
+    """
+    started = time.perf_counter()
+
+    if not include_raw:
+        content = strip_raw_payloads(content)
+    content = select_fields(content, parse_fields(fields))
+
+    body = encode_json(content)
+    raw_size = len(body)
+    body, encoding = compress(body, accept_encoding)
+
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    metrics.observe(f"{metric_prefix}_serialize_ms", elapsed_ms)
+    metrics.observe(f"{metric_prefix}_json_bytes", raw_size)
+    metrics.observe(f"{metric_prefix}_wire_bytes", len(body))
+
+    headers = {
+        "Vary": "Accept-Encoding",
+        "Server-Timing": f"serialize;dur={elapsed_ms:.2f}"
+    }
+    if encoding:
+        headers["Content-Encoding"] = encoding
+
+    return Response(content=body, media_type="application/json", headers=headers)
@@ -0,0 +1,96 @@
+"""
+Search result de-duplication for AI Agent
+Normalizes URLs and drops near-duplicate pages (word shingles + Jaccard) before extraction
+"""
+
+import os
+import re
+from typing import Dict, Any, List
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+# Results whose shingle sets overlap at least this much are treated as the same page
+SIMILARITY_THRESHOLD = float(os.getenv("SEARCH_DEDUP_SIMILARITY", 0.5))
+
+# Words per shingle
+SHINGLE_SIZE = 3
+
+TRACKING_PARAMS = {"fbclid", "gclid", "mc_cid", "mc_eid", "ref", "ref_src", "amp"}
+HOST_PREFIXES = ("www.", "m.", "amp.", "mobile.")
+
+_WORD = re.compile(r"[a-z0-9]+")
+
+
+def normalize_url(url: str) -> str:
+    """
+    Canonical form of a URL for duplicate detection
+
+    Lower-cases the host, drops www./m./amp. prefixes, the scheme, fragments,
+    tracking parameters, trailing slashes and /amp or index.html suffixes.
+    """
+    if not url:
+        return ""
+    parts = urlsplit(url.strip())
+    host = parts.netloc.lower().split("@")[-1].split(":")[0]
+    for prefix in HOST_PREFIXES:
+        if host.startswith(prefix):
+            host = host[len(prefix):]
+            break
+    path = re.sub(r"/(amp|index\.html?)$", "", parts.path).rstrip("/")
+    query = urlencode(sorted(
+        (k, v) for k, v in parse_qsl(parts.query)
+        if not k.lower().startswith("utm_") and k.lower() not in TRACKING_PARAMS
+    ))
+    return urlunsplit(("", host, path, query, ""))
+
+
+def shingles(text: str, size: int = SHINGLE_SIZE) -> set:
+    """Set of hashed word n-grams of a text"""
+    words = _WORD.findall((text or "").lower())
+    if len(words) < size:
+        return {hash(" ".join(words))} if words else set()
+    return {hash(" ".join(words[i:i + size])) for i in range(len(words) - size + 1)}
+
+
+def jaccard(a: set, b: set) -> float:
+    """Jaccard similarity of two sets (0.0 when either is empty)"""
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def dedupe_results(
+    results: List[Dict[str, Any]],
+    threshold: float = None
+) -> List[Dict[str, Any]]:
+    """
+    Drop results that repeat an earlier URL or near-duplicate its content
+
+    Results are considered in Tavily score order so the best-ranked copy of a
+    page is the one kept; the original order of kept results is preserved.
+    Result sets are small (at most a few dozen), so exact Jaccard over the
+    shingle sets is cheaper than MinHash signatures here.
+
+    Args:
+        results: Tavily results (title, url, content, score)
+        threshold: Jaccard similarity at or above which two results are duplicates
+
+    Returns:
+        The diverse subset of results
+    """
+    threshold = SIMILARITY_THRESHOLD if threshold is None else threshold
+    ranked = sorted(range(len(results or [])), key=lambda i: -float(results[i].get("score") or 0))
+
+    seen_urls = set()
+    kept = []
+    for index in ranked:
+        result = results[index]
+        url = normalize_url(result.get("url", ""))
+        if url and url in seen_urls:
+            continue
+        signature = shingles(f"{result.get('title', '')} {result.get('content', '')}")
+        if any(jaccard(signature, other) >= threshold for _, other in kept):
+            continue
+        seen_urls.add(url)
+        kept.append((index, signature))
+
+    return [results[index] for index, _ in sorted(kept)]
@@ -0,0 +1,244 @@
+"""
+Adaptive search planning for AI Agent
+Tracks per-depth and per-domain yield and latency, and picks the cheapest search configuration
+"""
+
+import json
+import os
+import random
+import threading
+import time
+from typing import Dict, Any, List
+from urllib.parse import urlsplit
+
+import climate
+
+STATS_PATH = os.getenv(
+    "SEARCH_STATS_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "search_stats.json")
+)
+STATS_SAVE_SECONDS = float(os.getenv("SEARCH_STATS_SAVE_SECONDS", 30))
+
+# Extracted items a search should yield to count as successful
+TARGET_ITEMS = {
+    "pois": int(os.getenv("SEARCH_TARGET_ACTIVITIES", 8)),
+    "restaurants": int(os.getenv("SEARCH_TARGET_RESTAURANTS", 6))
+}
+
+# Observations needed before a configuration or domain is judged
+MIN_SAMPLES = int(os.getenv("SEARCH_PLANNER_MIN_SAMPLES", 5))
+
+# Share of searches that try an unproven cheaper configuration or a pruned domain
+EXPLORE_RATE = float(os.getenv("SEARCH_EXPLORE_RATE", 0.1))
+
+# Domains below this many extracted items per result are dropped from include_domains
+MIN_DOMAIN_YIELD = float(os.getenv("SEARCH_MIN_DOMAIN_YIELD", 0.1))
+MIN_DOMAINS = 2
+
+DEPTHS = ("basic", "advanced")
+
+# Bounds on tracked statistics (least recently searched cities and lowest-traffic domains go first)
+MAX_CITIES = int(os.getenv("SEARCH_STATS_MAX_CITIES", 500))
+MAX_DOMAINS = int(os.getenv("SEARCH_STATS_MAX_DOMAINS", 2000))
+
+_lock = threading.Lock()
+_last_saved = 0.0
+
+
+def _load() -> Dict[str, Dict[str, Dict[str, float]]]:
+    """Read persisted statistics (empty on first run or a corrupt file)"""
+    try:
+        with open(STATS_PATH, "r", encoding="utf-8") as f:
+            stats = json.load(f)
+        configs = stats.get("configs", {})
+        # Files written before cities were tracked: treat every city as least recently used
+        cities = stats.get("cities") or {k.split("|")[0]: 0.0 for k in configs if not k.startswith("*|")}
+        return {"configs": configs, "domains": stats.get("domains", {}), "cities": cities}
+    except (OSError, ValueError, AttributeError):
+        return {"configs": {}, "domains": {}, "cities": {}}
+
+
+def _prune() -> None:
+    """Drop the least recently searched cities and lowest-traffic domains beyond the caps (caller holds the lock)"""
+    cities = _stats["cities"]
+    if len(cities) > MAX_CITIES:
+        evicted = set(sorted(cities, key=cities.get)[:len(cities) - MAX_CITIES])
+        for city in evicted:
+            del cities[city]
+        _stats["configs"] = {k: v for k, v in _stats["configs"].items() if k.split("|")[0] not in evicted}
+    domains = _stats["domains"]
+    if len(domains) > MAX_DOMAINS:
+        for key in sorted(domains, key=lambda k: domains[k]["results"])[:len(domains) - MAX_DOMAINS]:
+            del domains[key]
+
+
+_stats = _load()
+_prune()
+
+
+def _save(force: bool = False) -> None:
+    """Write statistics to disk at most every STATS_SAVE_SECONDS (caller holds the lock)"""
+    global _last_saved
+    if not force and time.monotonic() - _last_saved < STATS_SAVE_SECONDS:
+        return
+    _last_saved = time.monotonic()
+    try:
+        tmp_path = f"{STATS_PATH}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(_stats, f)
+        os.replace(tmp_path, STATS_PATH)
+    except OSError as e:
+        print(f"Warning: could not save search statistics: {e}")
+
+
+def domain_of(url: str) -> str:
+    """Registrable-looking host of a URL (www. stripped)"""
+    host = urlsplit(url or "").netloc.lower().split(":")[0]
+    return host[4:] if host.startswith("www.") else host
+
+
+def _config_keys(location: str, category: str, depth: str) -> List[str]:
+    """City-specific and all-cities keys for a configuration"""
+    return [f"{climate.normalize_city(location)}|{category}|{depth}", f"*|{category}|{depth}"]
+
+
+def _entry(table: Dict[str, Dict[str, float]], key: str) -> Dict[str, float]:
+    """Get or create a statistics entry"""
+    return table.setdefault(key, {"searches": 0, "latencyMs": 0.0, "results": 0, "runs": 0, "items": 0})
+
+
+def _touch_city(location: str) -> None:
+    """Mark a city as just searched (caller holds the lock)"""
+    _stats["cities"][climate.normalize_city(location)] = time.time()
+
+
+def record_search(location: str, category: str, depth: str, latency_ms: float,
+                  results: List[Dict[str, Any]]) -> None:
+    """Record one search's latency and result count"""
+    with _lock:
+        _touch_city(location)
+        for key in _config_keys(location, category, depth):
+            entry = _entry(_stats["configs"], key)
+            entry["searches"] += 1
+            entry["latencyMs"] += latency_ms
+            entry["results"] += len(results)
+        for result in results:
+            _entry(_stats["domains"], f"{category}|{domain_of(result.get('url'))}")["results"] += 1
+        _prune()
+        _save()
+
+
+def record_yield(location: str, category: str, results: List[Dict[str, Any]],
+                 items: List[Dict[str, Any]]) -> None:
+    """
+    Record how many items extraction produced from a search's results
+
+    Each item is credited to the domain of the first result whose title or
+    content mentions its name.
+
+    Args:
+        location: City the search was for
+        category: Search category (pois, restaurants)
+        results: Search results the items were extracted from (tagged with search_depth)
+        items: Extracted activities or restaurants
+    """
+    if not results:
+        return
+    depth = results[0].get("search_depth", "advanced")
+    texts = [(domain_of(r.get("url")), f"{r.get('title', '')} {r.get('content', '')}".lower()) for r in results]
+
+    with _lock:
+        _touch_city(location)
+        for key in _config_keys(location, category, depth):
+            entry = _entry(_stats["configs"], key)
+            entry["runs"] += 1
+            entry["items"] += len(items)
+        for item in items:
+            name = str(item.get("name", "")).lower()
+            domain = next((d for d, text in texts if name and name in text), None)
+            if domain:
+                _entry(_stats["domains"], f"{category}|{domain}")["items"] += 1
+        _prune()
+        _save()
+
+
+def _average_items(location: str, category: str, depth: str):
+    """(runs, average items) for a depth, city-level if proven else across all cities"""
+    for key in _config_keys(location, category, depth):
+        entry = _stats["configs"].get(key)
+        if entry and entry["runs"] >= MIN_SAMPLES:
+            return entry["runs"], entry["items"] / entry["runs"]
+    return 0, 0.0
+
+
+def select_domains(category: str, domains: List[str]) -> List[str]:
+    """Drop domains that have returned results but rarely contributed extracted items"""
+    with _lock:
+        yields = {}
+        for domain in domains:
+            entry = _stats["domains"].get(f"{category}|{domain}")
+            if entry and entry["results"] >= MIN_SAMPLES:
+                yields[domain] = entry["items"] / entry["results"]
+
+    kept = [d for d in domains if yields.get(d, 1.0) >= MIN_DOMAIN_YIELD or random.random() < EXPLORE_RATE]
+    if len(kept) < MIN_DOMAINS:
+        kept = sorted(domains, key=lambda d: -yields.get(d, 1.0))[:MIN_DOMAINS]
+        kept = [d for d in domains if d in kept]
+    return kept
+
+
+def plan(location: str, category: str, domains: List[str]) -> Dict[str, Any]:
+    """
+    Choose search_depth and include_domains for a search
+
+    Basic depth is used once it has historically met the category's target
+    item count (for the city, or across all cities until the city has enough
+    runs); while basic is unproven a small share of searches explores it.
+
+    Args:
+        location: City or destination name
+        category: Search category (pois, restaurants)
+        domains: Candidate include_domains
+
+    Returns:
+        Dictionary with search_depth and include_domains
+    """
+    target = TARGET_ITEMS.get(category)
+    depth = "advanced"
+    if target is not None:
+        with _lock:
+            runs, average = _average_items(location, category, "basic")
+        if runs and average >= target:
+            depth = "basic"
+        elif not runs and random.random() < EXPLORE_RATE:
+            depth = "basic"
+    return {"search_depth": depth, "include_domains": select_domains(category, domains)}
+
+
+def status() -> Dict[str, Any]:
+    """All-cities statistics per configuration and domain for the metrics endpoint"""
+    with _lock:
+        configs = {k[2:]: dict(v) for k, v in _stats["configs"].items() if k.startswith("*|")}
+        domains = {k: dict(v) for k, v in _stats["domains"].items()}
+    return {
+        "configs": {
+            key: {
+                "searches": e["searches"],
+                "avgLatencyMs": round(e["latencyMs"] / e["searches"], 1) if e["searches"] else 0.0,
+                "avgResults": round(e["results"] / e["searches"], 2) if e["searches"] else 0.0,
+                "avgItems": round(e["items"] / e["runs"], 2) if e["runs"] else 0.0
+            }
+            for key, e in configs.items()
+        },
+        "domains": {
+            key: {"results": e["results"], "items": e["items"],
+                  "yield": round(e["items"] / e["results"], 3) if e["results"] else 0.0}
+            for key, e in domains.items()
+        }
+    }
+
+
+def flush() -> None:
+    """Persist statistics now (called on shutdown)"""
+    with _lock:
+        _save(force=True)
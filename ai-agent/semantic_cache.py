@@ -0,0 +1,240 @@
+"""
+Semantic query cache for AI Agent
+Reuses preference inference and plans across near-duplicate free-text queries for the same destination and dates
+"""
+
+import os
+import re
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Tuple
+
+import climate
+import metrics
+import preference_classifier
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Minimum cosine similarity for a cached result to be reused, per kind of result
+THRESHOLDS = {
+    "preferences": float(os.getenv("SEMANTIC_PREFERENCE_THRESHOLD", 0.9)),
+    "plan": float(os.getenv("SEMANTIC_PLAN_THRESHOLD", 0.95))
+}
+
+ENTRY_TTL_SECONDS = float(os.getenv("SEMANTIC_CACHE_TTL_SECONDS", 6 * 3600))
+MAX_ENTRIES_PER_SCOPE = int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES_PER_SCOPE", 256))
+MAX_SCOPES = int(os.getenv("SEMANTIC_CACHE_MAX_SCOPES", 2000))
+
+# Hashed feature space of the query vectorizer
+DIMENSIONS = 1024
+
+# Feature weights: preference keywords decide the result, other words only refine it
+LABEL_WEIGHT = 1.0
+WORD_WEIGHT = 0.35
+NGRAM_WEIGHT = 0.1
+
+# Width of the similarity histogram buckets reported for threshold tuning
+HISTOGRAM_STEP = 0.05
+
+STOPWORDS = frozenset(
+    "a an and are as at be but by for from have i in is it looking me my of on or our plan please "
+    "some that the to trip us want we with would like love".split()
+)
+NUMBERS = {"one": "1", "two": "2", "three": "3", "four": "4", "five": "5",
+           "six": "6", "seven": "7", "eight": "8", "nine": "9", "ten": "10"}
+
+_LABEL_PATTERNS = [
+    (f"{prefix}:{label}", pattern)
+    for prefix, table in (
+        ("budget", preference_classifier.BUDGET_KEYWORDS),
+        ("interest", preference_classifier.INTEREST_KEYWORDS),
+        ("diet", preference_classifier.DIETARY_KEYWORDS),
+        ("mobility", preference_classifier.MOBILITY_KEYWORDS)
+    )
+    for label, pattern in preference_classifier._compile(table)
+]
+
+_lock = threading.Lock()
+_scopes: "OrderedDict[Tuple[str, str, str], ScopeIndex]" = OrderedDict()
+_histograms: Dict[str, List[int]] = {kind: [0] * int(round(1 / HISTOGRAM_STEP)) for kind in THRESHOLDS}
+_warned = False
+
+
+def enabled() -> bool:
+    """Whether NumPy is installed (the cache is skipped without it)"""
+    global _warned
+    if np is None and not _warned:
+        _warned = True
+        print("Warning: numpy not installed, semantic query cache disabled")
+    return np is not None
+
+
+def query_features(query: str) -> Dict[str, float]:
+    """
+    Weighted features of a normalized query
+
+    Preference keywords become canonical labels ("veggie" and "vegetarian"
+    both give diet:vegetarian, "kids" and "children" the same family labels),
+    number words become digits, and the remaining non-stopwords are kept as
+    words and character trigrams so typos and word order barely matter.
+    """
+    query = (query or "").lower()
+    features = {label: LABEL_WEIGHT for label, pattern in _LABEL_PATTERNS if pattern.search(query)}
+    text = query
+    for _, pattern in _LABEL_PATTERNS:
+        text = pattern.sub(" ", text)
+    for word in re.findall(r"[a-z0-9]+", text):
+        word = NUMBERS.get(word, word)
+        if word in STOPWORDS:
+            continue
+        features[f"word:{word}"] = WORD_WEIGHT
+        padded = f" {word} "
+        for i in range(len(padded) - 2):
+            key = f"gram:{padded[i:i + 3]}"
+            features[key] = features.get(key, 0.0) + NGRAM_WEIGHT
+    return features
+
+
+def embed(query: str) -> Tuple["np.ndarray", str]:
+    """
+    Unit-length hashed feature vector of a query, plus its preference label signature
+
+    Queries only match when their signatures are equal, so a query that adds
+    or drops a preference keyword ("wheelchair", "vegan") never reuses a
+    result, however similar the rest of its wording is.
+    """
+    features = query_features(query)
+    vector = np.zeros(DIMENSIONS, dtype=np.float32)
+    for feature, weight in features.items():
+        bucket = zlib.crc32(feature.encode("utf-8"))
+        vector[bucket % DIMENSIONS] += weight if bucket & 0x80000000 else -weight
+    norm = np.linalg.norm(vector)
+    labels = ",".join(sorted(f for f in features if not f.startswith(("word:", "gram:"))))
+    return (vector / norm if norm else vector), labels
+
+
+def date_bucket(dates: Dict[str, str]) -> str:
+    """Month the stay starts in ("" without dates)"""
+    return str((dates or {}).get("startDate") or "")[:7]
+
+
+class ScopeIndex:
+    """Query vectors of one (kind, destination, date bucket) in a fixed-size ring buffer"""
+
+    def __init__(self):
+        self.vectors = np.zeros((MAX_ENTRIES_PER_SCOPE, DIMENSIONS), dtype=np.float32)
+        self.guards: List[Optional[str]] = [None] * MAX_ENTRIES_PER_SCOPE
+        self.payloads: List[Any] = [None] * MAX_ENTRIES_PER_SCOPE
+        self.added = np.zeros(MAX_ENTRIES_PER_SCOPE)
+        self.size = 0
+        self.next = 0
+
+    def best(self, vector: "np.ndarray", guard: str) -> Tuple[Optional[int], float]:
+        """Most similar fresh entry with the same guard, and its cosine similarity"""
+        if not self.size:
+            return None, 0.0
+        similarities = self.vectors[:self.size] @ vector
+        usable = np.array([g == guard for g in self.guards[:self.size]]) & \
+            (self.added[:self.size] > time.time() - ENTRY_TTL_SECONDS)
+        if not usable.any():
+            return None, 0.0
+        similarities = np.where(usable, similarities, -1.0)
+        index = int(np.argmax(similarities))
+        return index, float(similarities[index])
+
+    def add(self, vector: "np.ndarray", guard: str, payload: Any) -> None:
+        """Store an entry, replacing an identical query or the oldest entry"""
+        index, similarity = self.best(vector, guard)
+        if index is None or similarity < 0.999:
+            index = self.next
+            self.next = (self.next + 1) % MAX_ENTRIES_PER_SCOPE
+            self.size = min(self.size + 1, MAX_ENTRIES_PER_SCOPE)
+        self.vectors[index] = vector
+        self.guards[index] = guard
+        self.payloads[index] = payload
+        self.added[index] = time.time()
+
+
+def _scope_key(kind: str, location: str, dates: Dict[str, str]) -> Tuple[str, str, str]:
+    return kind, climate.normalize_city(location), date_bucket(dates)
+
+
+def lookup(kind: str, query: str, location: str, dates: Dict[str, str], guard: str) -> Optional[Any]:
+    """
+    Cached result of the most similar earlier query, if similar enough
+
+    Args:
+        kind: "preferences" or "plan" (selects the threshold)
+        query: Free-text user query
+        location: Destination the result is scoped to
+        dates: Stay dates (scoped by the month the stay starts)
+        guard: Everything else the result depends on; only entries with an equal guard
+            (and preference label signature) match
+
+    Returns:
+        The stored payload, or None on a miss
+    """
+    if not enabled() or not (query or "").strip():
+        return None
+    vector, labels = embed(query)
+    with _lock:
+        scope = _scopes.get(_scope_key(kind, location, dates))
+        index, similarity = scope.best(vector, f"{guard}|{labels}") if scope else (None, 0.0)
+        payload = scope.payloads[index] if index is not None else None
+        if index is not None:
+            bucket = min(int(max(similarity, 0.0) / HISTOGRAM_STEP), len(_histograms[kind]) - 1)
+            _histograms[kind][bucket] += 1
+
+    if index is not None:
+        metrics.observe(f"semantic_similarity_{kind}", similarity)
+    if index is not None and similarity >= THRESHOLDS[kind]:
+        metrics.increment(f"semantic_{kind}_hits")
+        return payload
+    metrics.increment(f"semantic_{kind}_misses")
+    return None
+
+
+def store(kind: str, query: str, location: str, dates: Dict[str, str], guard: str, payload: Any) -> None:
+    """Remember a result for later near-duplicate queries (same arguments as lookup)"""
+    if not enabled() or not (query or "").strip():
+        return
+    vector, labels = embed(query)
+    key = _scope_key(kind, location, dates)
+    with _lock:
+        if key not in _scopes:
+            _scopes[key] = ScopeIndex()
+            while len(_scopes) > MAX_SCOPES:
+                _scopes.popitem(last=False)
+        _scopes.move_to_end(key)
+        _scopes[key].add(vector, f"{guard}|{labels}", payload)
+
+
+def status() -> Dict[str, Any]:
+    """Hit rates, similarity distributions and index size for the metrics endpoint"""
+    counters = metrics.snapshot()["counters"]
+    with _lock:
+        histograms = {kind: list(counts) for kind, counts in _histograms.items()}
+        entries = sum(scope.size for scope in _scopes.values())
+        scopes = len(_scopes)
+    kinds = {}
+    for kind, threshold in THRESHOLDS.items():
+        hits = counters.get(f"semantic_{kind}_hits", 0)
+        lookups = hits + counters.get(f"semantic_{kind}_misses", 0)
+        series = f"semantic_similarity_{kind}"
+        kinds[kind] = {
+            "threshold": threshold,
+            "lookups": lookups,
+            "hitRate": round(hits / lookups, 3) if lookups else 0.0,
+            "similarityP50": round(metrics.percentile(series, 50), 3),
+            "similarityP90": round(metrics.percentile(series, 90), 3),
+            # Best-match similarity counts per bucket, keyed by the bucket's lower bound
+            "similarityHistogram": {
+                f"{i * HISTOGRAM_STEP:.2f}": count for i, count in enumerate(histograms[kind]) if count
+            }
+        }
+    return {"enabled": np is not None, "scopes": scopes, "entries": entries, **kinds}
@@ -4,14 +4,188 @@ Performs web searches for POIs, restaurants, weather, and local events
 """
 
 import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED, TimeoutError as FutureTimeout
 from typing import List, Dict, Any, Optional
 from tavily import TavilyClient
 from dotenv import load_dotenv
 
+import circuit_breaker
+import climate
+import events_index
+import http_pool
+import metrics
+import outbound
+import profiling
+import search_dedup
+import search_planner
+from deadline import Deadline, executor
+
 load_dotenv()
 
+
+class PooledTavilyClient(TavilyClient):
+    """TavilyClient that sends searches over the shared keep-alive pool instead of a new requests connection"""
+    
+    def _search(self, query, search_depth="basic", topic="general", days=2, max_results=5,
+                include_domains=None, exclude_domains=None,
+                include_answer=False, include_raw_content=False, include_images=False,
+                use_cache=True):
+        return http_pool.post_json(self.base_url, {
+            "query": query,
+            "search_depth": search_depth,
+            "topic": topic,
+            "days": days,
+            "include_answer": include_answer,
+            "include_raw_content": include_raw_content,
+            "max_results": max_results,
+            "include_domains": include_domains or None,
+            "exclude_domains": exclude_domains or None,
+            "include_images": include_images,
+            "api_key": self.api_key,
+            "use_cache": use_cache
+        }, headers=self.headers)
+
+
 # Initialize Tavily client
-tavily_client = TavilyClient(api_key=os.getenv("TAVILY_API_KEY"))
+tavily_client = PooledTavilyClient(api_key=os.getenv("TAVILY_API_KEY"))
+tavily_breaker = circuit_breaker.get_breaker("tavily")
+
+
+# Candidate domains; the search planner drops the ones that rarely yield extracted items
+POI_DOMAINS = ["tripadvisor.com", "lonelyplanet.com", "timeout.com", "viator.com"]
+RESTAURANT_DOMAINS = ["tripadvisor.com", "yelp.com", "timeout.com", "eater.com", "thefork.com", "happycow.net"]
+
+
+# Request hedging: after the HEDGE_PERCENTILE latency of a category, send a duplicate
+HEDGE_ENABLED = os.getenv("TAVILY_HEDGING", "false").lower() == "true"
+HEDGE_PERCENTILE = float(os.getenv("TAVILY_HEDGE_PERCENTILE", 95))
+HEDGE_MIN_SAMPLES = int(os.getenv("TAVILY_HEDGE_MIN_SAMPLES", 20))
+# Hedges may add at most this fraction of extra requests over any rolling window
+HEDGE_MAX_EXTRA_RATIO = float(os.getenv("TAVILY_HEDGE_MAX_EXTRA_RATIO", 0.1))
+HEDGE_WINDOW_SECONDS = float(os.getenv("TAVILY_HEDGE_WINDOW_SECONDS", 60))
+
+_hedge_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("TAVILY_HEDGE_WORKERS", 16)),
+    thread_name_prefix="tavily-hedge"
+)
+_hedge_lock = threading.Lock()
+# Send times of requests and hedges within the last HEDGE_WINDOW_SECONDS
+_hedge_window = {"requests": deque(), "hedges": deque()}
+
+
+def _timed_search(category: str, kwargs: Dict[str, Any]) -> Dict[str, Any]:
+    """Run one governed Tavily search and record its latency for the category"""
+    tavily_breaker.check()
+    started = time.monotonic()
+    with profiling.span(f"tavily.{category}"):
+        response = outbound.call("tavily", None, tavily_breaker.call, tavily_client.search, **kwargs)
+    metrics.observe(f"tavily_{category}_latency_ms", (time.monotonic() - started) * 1000)
+    return response
+
+
+def _hedge_delay(category: str) -> Optional[float]:
+    """Seconds to wait before hedging, or None until enough latency samples exist"""
+    name = f"tavily_{category}_latency_ms"
+    if metrics.sample_count(name) < HEDGE_MIN_SAMPLES:
+        return None
+    return metrics.percentile(name, HEDGE_PERCENTILE) / 1000
+
+
+def _expire_hedge_window(now: float) -> None:
+    """Drop send times older than the window (caller holds the lock)"""
+    for times in _hedge_window.values():
+        while times and times[0] <= now - HEDGE_WINDOW_SECONDS:
+            times.popleft()
+
+
+def _record_request() -> None:
+    """Count a search towards the current hedging window"""
+    now = time.monotonic()
+    with _hedge_lock:
+        _expire_hedge_window(now)
+        _hedge_window["requests"].append(now)
+
+
+def _reserve_hedge() -> bool:
+    """
+    Take a slot from the hedging allowance (extra load cap)
+    
+    The allowance is relative to requests in the last HEDGE_WINDOW_SECONDS,
+    so a quiet period does not bank hedges for the next latency spike.
+    """
+    now = time.monotonic()
+    with _hedge_lock:
+        _expire_hedge_window(now)
+        if len(_hedge_window["hedges"]) + 1 > HEDGE_MAX_EXTRA_RATIO * len(_hedge_window["requests"]):
+            return False
+        _hedge_window["hedges"].append(now)
+        return True
+
+
+def _diverse_results(category: str, results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Drop repeated and near-duplicate pages before they reach the extraction prompts"""
+    diverse = search_dedup.dedupe_results(results)
+    if len(diverse) < len(results):
+        metrics.increment(f"tavily_{category}_duplicates_removed", len(results) - len(diverse))
+    return diverse
+
+
+def _planned_search(category: str, location: str, domains: List[str], **kwargs) -> List[Dict[str, Any]]:
+    """
+    Search with the depth and domains the search planner picks for this city and category
+    
+    Results are tagged with search_depth so extraction yield can be credited to it.
+    """
+    config = search_planner.plan(location, category, domains)
+    started = time.monotonic()
+    response = _search(category, **config, **kwargs)
+    results = _diverse_results(category, response.get("results", []))
+    search_planner.record_search(
+        location, category, config["search_depth"], (time.monotonic() - started) * 1000, results
+    )
+    return [{**result, "search_depth": config["search_depth"]} for result in results]
+
+
+def _search(category: str, **kwargs) -> Dict[str, Any]:
+    """
+    Run a Tavily search through the shared outbound governor, optionally hedged
+    
+    When hedging is enabled and the primary request outlives the category's
+    latency percentile, a duplicate is sent and whichever answers first wins.
+    """
+    _record_request()
+    
+    delay = _hedge_delay(category) if HEDGE_ENABLED else None
+    if delay is None:
+        return _timed_search(category, kwargs)
+    
+    primary = _hedge_executor.submit(profiling.bind(_timed_search), category, kwargs)
+    try:
+        return primary.result(timeout=delay)
+    except FutureTimeout:
+        pass
+    
+    if not _reserve_hedge():
+        return primary.result()
+    
+    metrics.increment(f"tavily_{category}_hedged")
+    hedge = _hedge_executor.submit(profiling.bind(_timed_search), category, kwargs)
+    pending = {primary, hedge}
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            if future.exception() is None:
+                if future is hedge:
+                    metrics.increment(f"tavily_{category}_hedge_wins")
+                # Best effort: a request already on the wire cannot be interrupted
+                for other in pending:
+                    other.cancel()
+                return future.result()
+    # Both failed: surface the primary's error
+    return primary.result()
 
 
 def search_pois(location: str, interests: List[str] = None, max_results: int = 10) -> List[Dict[str, Any]]:
@@ -31,14 +205,7 @@ def search_pois(location: str, interests: List[str] = None, max_results: int = 1
         interest_str = " ".join(interests) if interests else "tourist attractions"
         query = f"top {interest_str} things to do in {location} attractions points of interest"
         
-        response = tavily_client.search(
-            query=query,
-            max_results=max_results,
-            search_depth="advanced",
-            include_domains=["tripadvisor.com", "lonelyplanet.com", "timeout.com", "viator.com"]
-        )
-        
-        return response.get("results", [])
+        return _planned_search("pois", location, POI_DOMAINS, query=query, max_results=max_results)
         
     except Exception as e:
         print(f"Error searching POIs: {e}")
@@ -66,21 +233,7 @@ def search_restaurants(
         dietary_str = " ".join(dietary_filters) if dietary_filters else ""
         query = f"best {dietary_str} restaurants in {location} dining food"
         
-        response = tavily_client.search(
-            query=query,
-            max_results=max_results,
-            search_depth="advanced",
-            include_domains=[
-                "tripadvisor.com", 
-                "yelp.com", 
-                "timeout.com", 
-                "eater.com",
-                "thefork.com",
-                "happycow.net"
-            ]
-        )
-        
-        return response.get("results", [])
+        return _planned_search("restaurants", location, RESTAURANT_DOMAINS, query=query, max_results=max_results)
         
     except Exception as e:
         print(f"Error searching restaurants: {e}")
@@ -89,7 +242,10 @@ def search_restaurants(
 
 def search_weather(location: str, dates: Dict[str, str]) -> Dict[str, Any]:
     """
-    Search for weather forecast
+    Get weather context for the stay
+    
+    Uses the bundled climate normals; a live forecast search is only made for
+    trips starting within the forecast window (or cities without normals).
     
     Args:
         location: City or destination name
@@ -98,11 +254,16 @@ def search_weather(location: str, dates: Dict[str, str]) -> Dict[str, Any]:
     Returns:
         Weather information
     """
+    normals = climate.weather_for_trip(location, dates)
+    if normals and not climate.within_forecast_window(dates):
+        return normals
+    
     try:
         start_date = dates.get("startDate", "")
         query = f"weather forecast {location} {start_date} temperature conditions"
         
-        response = tavily_client.search(
+        response = _search(
+            "weather",
             query=query,
             max_results=3,
             search_depth="basic",
@@ -111,19 +272,19 @@ def search_weather(location: str, dates: Dict[str, str]) -> Dict[str, Any]:
         
         results = response.get("results", [])
         
-        # Parse weather data from results
-        weather_info = {
+        # Structured fields come from normals; live results are attached as forecast sources
+        weather_info = dict(normals) if normals else {
             "temperature": "Information not available",
             "conditions": "Check local weather forecast",
-            "recommendation": "Pack layers and check weather before departure",
-            "raw_results": results
+            "recommendation": "Pack layers and check weather before departure"
         }
+        weather_info["raw_results"] = results
         
         return weather_info
         
     except Exception as e:
         print(f"Error searching weather: {e}")
-        return {
+        return normals or {
             "temperature": "Information not available",
             "conditions": "Unknown",
             "recommendation": "Check local weather forecast before departure"
@@ -134,30 +295,54 @@ def search_local_events(location: str, dates: Dict[str, str], max_results: int =
     """
     Search for local events during travel dates
     
+    Only the parts of the stay the events index has not searched recently are
+    searched live. Each result carries the window it was found for, so the
+    extracted events can be indexed and the window marked as covered; windows
+    without results are marked covered here. Stays without valid dates get one
+    undated search instead, which is not indexed.
+    
     Args:
         location: City or destination name
         dates: Dictionary with startDate and endDate
-        max_results: Maximum number of results
+        max_results: Maximum number of results per window
         
     Returns:
-        List of local events
+        List of event search results (empty when the stay is already covered)
     """
-    try:
-        start_date = dates.get("startDate", "")
-        end_date = dates.get("endDate", "")
-        query = f"events festivals activities in {location} {start_date} to {end_date}"
-        
-        response = tavily_client.search(
-            query=query,
-            max_results=max_results,
-            search_depth="advanced"
-        )
-        
-        return response.get("results", [])
-        
-    except Exception as e:
-        print(f"Error searching events: {e}")
-        return []
+    if events_index.stay_window(dates) is None:
+        try:
+            response = _search(
+                "events",
+                query=f"events festivals activities in {location}",
+                max_results=max_results,
+                search_depth="advanced"
+            )
+            return _diverse_results("events", response.get("results", []))
+        except Exception as e:
+            print(f"Error searching events: {e}")
+            return []
+    
+    results = []
+    for window in events_index.uncovered_windows(location, dates):
+        try:
+            query = f"events festivals activities in {location} {window['startDate']} to {window['endDate']}"
+            
+            response = _search(
+                "events",
+                query=query,
+                max_results=max_results,
+                search_depth="advanced"
+            )
+            
+            found = _diverse_results("events", response.get("results", []))
+            if not found:
+                events_index.add_events(location, [window], [])
+            results.extend({**result, "window": window} for result in found)
+            
+        except Exception as e:
+            print(f"Error searching events: {e}")
+    
+    return results
 
 
 def search_accessibility_info(location: str, mobility_needs: List[str]) -> List[Dict[str, Any]]:
@@ -178,49 +363,135 @@ def search_accessibility_info(location: str, mobility_needs: List[str]) -> List[
         mobility_str = " ".join(mobility_needs)
         query = f"{mobility_str} accessible attractions transportation in {location}"
         
-        response = tavily_client.search(
+        response = _search(
+            "accessibility",
             query=query,
             max_results=5,
             search_depth="advanced"
         )
         
-        return response.get("results", [])
+        return _diverse_results("accessibility", response.get("results", []))
         
     except Exception as e:
         print(f"Error searching accessibility info: {e}")
         return []
 
 
+# Response section each search category feeds (reported when degraded)
+SEARCH_SECTIONS = {
+    "pois": "activities",
+    "restaurants": "restaurants",
+    "weather": "weather",
+    "events": "events",
+    "accessibility": "accessibility"
+}
+
+
+def search_inputs(location: str, dates: Dict[str, str], preferences: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Inputs each search category depends on (used to reuse results across replans)
+    
+    Args:
+        location: City or destination name
+        dates: Dictionary with startDate and endDate
+        preferences: Dictionary with interests, dietaryFilters, mobilityNeeds
+        
+    Returns:
+        Dictionary of category -> inputs; accessibility only when mobility needs exist
+    """
+    inputs = {
+        "pois": (location, preferences.get("interests", [])),
+        "restaurants": (location, preferences.get("dietaryFilters", [])),
+        "weather": (location, dates),
+        "events": (location, dates)
+    }
+    if preferences.get("mobilityNeeds"):
+        inputs["accessibility"] = (location, preferences.get("mobilityNeeds", []))
+    return inputs
+
+
+def _category_searches(location: str, dates: Dict[str, str], preferences: Dict[str, Any]) -> Dict[str, tuple]:
+    """Search function, arguments and options per category (same keys as search_inputs)"""
+    searches = {
+        "pois": (search_pois, (location, preferences.get("interests", [])), {"max_results": 12}),
+        "restaurants": (search_restaurants, (location, preferences.get("dietaryFilters", [])), {"max_results": 10}),
+        "weather": (search_weather, (location, dates), {}),
+        "events": (search_local_events, (location, dates), {"max_results": 5})
+    }
+    if preferences.get("mobilityNeeds"):
+        searches["accessibility"] = (search_accessibility_info, (location, preferences["mobilityNeeds"]), {})
+    return searches
+
+
+def category_search(category: str, location: str, dates: Dict[str, str], preferences: Dict[str, Any]) -> Any:
+    """Run one category's search exactly as comprehensive_search would"""
+    fn, args, kwargs = _category_searches(location, dates, preferences)[category]
+    return fn(*args, **kwargs)
+
+
 def comprehensive_search(
     location: str,
     dates: Dict[str, str],
-    preferences: Dict[str, Any]
+    preferences: Dict[str, Any],
+    deadline: Optional[Deadline] = None,
+    share: float = 1.0,
+    cached: Optional[Dict[str, Any]] = None
 ) -> Dict[str, Any]:
     """
     Perform comprehensive search combining all categories
     
+    Categories are searched concurrently. With a deadline, categories still
+    running after their share of the remaining budget fall back to empty
+    results (or climate normals for weather) and are marked degraded.
+    
     Args:
         location: City or destination name
         dates: Dictionary with startDate and endDate
         preferences: Dictionary with interests, dietaryFilters, mobilityNeeds, budget
+        deadline: Optional request deadline
+        share: Fraction of the remaining deadline budget for all searches
+        cached: Category results to reuse instead of searching again
         
     Returns:
         Dictionary with all search results
     """
     print(f"Starting comprehensive search for {location}...")
     
-    interests = preferences.get("interests", [])
-    dietary_filters = preferences.get("dietaryFilters", [])
-    mobility_needs = preferences.get("mobilityNeeds", [])
+    cached = cached or {}
+    searches = _category_searches(location, dates, preferences)
     
-    results = {
-        "pois": search_pois(location, interests, max_results=12),
-        "restaurants": search_restaurants(location, dietary_filters, max_results=10),
-        "weather": search_weather(location, dates),
-        "events": search_local_events(location, dates, max_results=5),
-        "accessibility": search_accessibility_info(location, mobility_needs) if mobility_needs else []
+    futures = {
+        category: executor.submit(profiling.bind(fn), *args, **kwargs)
+        for category, (fn, args, kwargs) in searches.items()
+        if category not in cached
     }
     
+    timeout = deadline.budget(share) if deadline else None
+    wait(futures.values(), timeout=timeout)
+    
+    fallbacks = {
+        "pois": [],
+        "restaurants": [],
+        "weather": climate.weather_for_trip(location, dates) or {
+            "temperature": "Information not available",
+            "conditions": "Unknown",
+            "recommendation": "Check local weather forecast before departure"
+        },
+        "events": [],
+        "accessibility": []
+    }
+    
+    results = {"accessibility": [], **cached}
+    for category, future in futures.items():
+        if future.done():
+            results[category] = future.result()
+        else:
+            future.cancel()
+            print(f"Warning: {category} search exceeded the deadline, using fallback")
+            if deadline:
+                deadline.mark_degraded(SEARCH_SECTIONS[category])
+            results[category] = fallbacks[category]
+    
     print(f"Found {len(results['pois'])} POIs, {len(results['restaurants'])} restaurants, {len(results['events'])} events")
     
     return results
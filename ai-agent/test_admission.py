@@ -0,0 +1,21 @@
+"""
+Tests for plan admission control
+"""
+
+from admission import AdmissionController
+from deadline import Deadline, PLAN_DEADLINE_SECONDS
+
+
+def test_degraded_plan_backs_off_like_congestion():
+    controller = AdmissionController(max_limit=20, min_limit=2)
+    controller.in_flight = 1
+
+    controller.release(worker_wait_ms=0.0, degraded=True)
+
+    assert controller.limit == 18
+
+
+def test_client_shortened_deadline_is_not_overload():
+    assert Deadline(0.5).shortened()
+    assert not Deadline().shortened()
+    assert not Deadline(PLAN_DEADLINE_SECONDS * 2).shortened()
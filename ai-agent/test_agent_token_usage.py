@@ -0,0 +1,44 @@
+"""
+Tests for LLM token usage metrics
+"""
+
+import pytest
+
+pytest.importorskip("langchain_openai")
+
+from langchain.schema import AIMessage, ChatGeneration, LLMResult  # noqa: E402
+
+import agent  # noqa: E402
+import metrics  # noqa: E402
+from prompts import PACKING_CHECKLIST_PROMPT  # noqa: E402
+
+
+class FakeLLM:
+    """Returns a fixed response with the usage block langchain-openai puts in llm_output"""
+
+    model_name = "gpt-4"
+
+    def generate(self, batch):
+        return LLMResult(
+            generations=[[ChatGeneration(message=AIMessage(content='["Item"]'))]],
+            llm_output={
+                "token_usage": {"prompt_tokens": 1500, "prompt_tokens_details": {"cached_tokens": 1024}},
+                "model_name": self.model_name
+            }
+        )
+
+
+def test_invoke_prompt_records_token_usage(monkeypatch):
+    monkeypatch.setattr(agent, "llm", FakeLLM())
+    before = metrics.snapshot()["counters"]
+
+    response = agent.invoke_prompt(
+        PACKING_CHECKLIST_PROMPT,
+        **{field: "x" for field in PACKING_CHECKLIST_PROMPT.fields}
+    )
+
+    after = metrics.snapshot()["counters"]
+    assert response.content == '["Item"]'
+    assert after["llm_prompt_tokens"] - before.get("llm_prompt_tokens", 0) == 1500
+    assert after["llm_cached_prompt_tokens"] - before.get("llm_cached_prompt_tokens", 0) == 1024
+    assert metrics.sample_count("llm_packing_cached_tokens") >= 1
@@ -0,0 +1,99 @@
+"""
+Tests for MySQL access through the circuit breaker
+"""
+
+import pytest
+
+pytest.importorskip("mysql.connector")
+
+import circuit_breaker  # noqa: E402
+import database  # noqa: E402
+from mysql.connector import Error  # noqa: E402
+from mysql.connector.errors import PoolError  # noqa: E402
+
+
+class FakeCursor:
+    def __init__(self, fail):
+        self.fail = fail
+
+    def execute(self, query, params=()):
+        if self.fail:
+            raise Error("Lost connection to MySQL server during query")
+
+    def fetchone(self):
+        return (1,)
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    def __init__(self, fail):
+        self.fail = fail
+
+    def cursor(self, dictionary=False):
+        return FakeCursor(self.fail)
+
+    def close(self):
+        pass
+
+
+class FakePool:
+    def __init__(self, exhausted=False, query_fails=False):
+        self.exhausted = exhausted
+        self.query_fails = query_fails
+
+    def get_connection(self):
+        if self.exhausted:
+            raise PoolError("Failed getting connection; pool exhausted")
+        return FakeConnection(self.query_fails)
+
+
+@pytest.fixture
+def breaker(monkeypatch):
+    breaker = circuit_breaker.CircuitBreaker("mysql-test", min_calls=3, ignored=(PoolError,))
+    monkeypatch.setattr(database, "mysql_breaker", breaker)
+    return breaker
+
+
+def test_pool_exhaustion_does_not_open_the_circuit(monkeypatch, breaker):
+    monkeypatch.setattr(database, "db_pool", FakePool(exhausted=True))
+
+    for _ in range(10):
+        with pytest.raises(PoolError):
+            database._execute("SELECT 1", fetch="one")
+
+    assert breaker.state == circuit_breaker.CLOSED
+    assert not breaker.outcomes
+
+
+def test_query_failures_open_the_circuit(monkeypatch, breaker):
+    monkeypatch.setattr(database, "db_pool", FakePool(query_fails=True))
+
+    for _ in range(3):
+        with pytest.raises(Error):
+            database._execute("SELECT 1", fetch="one")
+
+    assert breaker.state == circuit_breaker.OPEN
+    with pytest.raises(database.DatabaseUnavailable):
+        database._execute("SELECT 1", fetch="one")
+
+
+def test_row_fetched_during_invalidation_is_not_cached(monkeypatch):
+    monkeypatch.setattr(database, "sweep_caches", lambda force=False: None)
+    monkeypatch.setitem(database._sweep_state, "ready", True)
+    versions = iter([1, 2])
+
+    def fetch_many(ids):
+        version = next(versions)
+        if version == 1:
+            # A sweep invalidates the row while this (older) read is in flight
+            cache.invalidate({7: 2})
+        return {7: ({"id": 7, "version": version}, version)}
+
+    cache = database.RowCache("test", fetch_many)
+
+    assert cache.get_many([7])[7]["version"] == 1
+    assert 7 not in cache.rows
+    assert cache.get_many([7])[7]["version"] == 2
+    assert cache.rows[7][1] == 2
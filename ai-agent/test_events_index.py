@@ -0,0 +1,27 @@
+"""
+Tests for the local events index
+"""
+
+import events_index
+
+STAY = {"startDate": "2099-11-01", "endDate": "2099-11-05"}
+
+
+def test_lookups_do_not_create_cities(monkeypatch):
+    monkeypatch.setattr(events_index, "_cities", events_index.OrderedDict())
+
+    assert events_index.events_for_stay("Nowhere", STAY) == []
+    assert events_index.uncovered_windows("Nowhere", STAY) == [STAY]
+    assert events_index.status()["cities"] == 0
+
+
+def test_indexed_cities_are_capped(monkeypatch):
+    monkeypatch.setattr(events_index, "_cities", events_index.OrderedDict())
+    monkeypatch.setattr(events_index, "MAX_CITIES", 2)
+
+    for city in ("Lisbon", "Porto", "Braga"):
+        events_index.add_events(city, [STAY], [{"name": f"{city} Fair", **STAY}])
+
+    assert list(events_index._cities) == ["porto", "braga"]
+    assert [e["name"] for e in events_index.events_for_stay("Braga", STAY)] == ["Braga Fair"]
+    assert events_index.uncovered_windows("Braga", STAY) == []
@@ -0,0 +1,33 @@
+"""
+Tests for the outbound call governor
+"""
+
+from outbound import AdaptiveLimiter
+
+
+def _run(limiter, latency_ms, latency_key):
+    assert limiter.acquire(deadline=float("inf"))
+    limiter.release(latency_ms, latency_key=latency_key)
+
+
+def test_mixed_short_and_long_calls_do_not_shrink_limit():
+    limiter = AdaptiveLimiter(max_limit=16)
+    initial = limiter.limit
+
+    # Preference JSON takes ~2s, the day-by-day plan ~30s, interleaved
+    for _ in range(50):
+        _run(limiter, 2000, "preferences_query")
+        _run(limiter, 30000, "day_plan_polish")
+
+    assert limiter.limit >= initial
+
+
+def test_congestion_within_one_kind_still_backs_off():
+    limiter = AdaptiveLimiter(max_limit=16)
+    for _ in range(10):
+        _run(limiter, 2000, "preferences_query")
+    before = limiter.limit
+
+    _run(limiter, 10000, "preferences_query")
+
+    assert limiter.limit < before
@@ -0,0 +1,45 @@
+"""
+Tests for the local preference classifier
+"""
+
+import preference_classifier
+
+
+def test_first_time_traveler_with_interests_is_confident():
+    inferred = preference_classifier.classify_preferences("We love museums and food, vegetarian")
+
+    assert inferred["budget"] == "medium"
+    assert inferred["defaulted"] == []
+    assert preference_classifier.is_confident(inferred)
+
+
+def test_defaulted_interests_are_not_confident():
+    inferred = preference_classifier.classify_preferences("A trip for two, vegetarian")
+
+    assert inferred["budget"] == "medium"
+    assert inferred["defaulted"] == ["budget", "interests"]
+    assert not preference_classifier.is_confident(inferred)
+    assert not preference_classifier.is_confident(inferred, threshold=0.0)
+
+
+def test_defaulted_budget_with_history_is_not_confident():
+    history = [{"location": "Springfield", "guests": 2}]
+    inferred = preference_classifier.classify_preferences("Museums and food", history)
+
+    assert inferred["defaulted"] == ["budget"]
+    assert not preference_classifier.is_confident(inferred)
+
+
+def test_explicit_signals_are_confident():
+    inferred = preference_classifier.classify_preferences("Cheap trip for museums and food")
+
+    assert inferred["budget"] == "budget"
+    assert inferred["defaulted"] == []
+    assert preference_classifier.is_confident(inferred)
+
+
+def test_party_of_four_is_not_nightlife():
+    inferred = preference_classifier.classify_preferences("A party of four visiting museums")
+
+    assert "nightlife" not in inferred["interests"]
+    assert "nightlife" in preference_classifier.classify_preferences("Bachelor party weekend")["interests"]
@@ -0,0 +1,27 @@
+"""
+Tests for adaptive search planning statistics
+"""
+
+import search_planner
+
+
+def _results(domain, count=1):
+    return [{"url": f"https://{domain}/{i}", "title": "t", "content": "c"} for i in range(count)]
+
+
+def test_tracked_cities_and_domains_are_capped(monkeypatch):
+    monkeypatch.setattr(search_planner, "_stats", {"configs": {}, "domains": {}, "cities": {}})
+    monkeypatch.setattr(search_planner, "STATS_SAVE_SECONDS", float("inf"))
+    monkeypatch.setattr(search_planner, "MAX_CITIES", 2)
+    monkeypatch.setattr(search_planner, "MAX_DOMAINS", 3)
+
+    search_planner.record_search("Lisbon", "pois", "basic", 100.0, _results("popular.com", 5))
+    for city in ("Porto", "Braga", "Faro"):
+        search_planner.record_search(city, "pois", "basic", 100.0, _results(f"{city.lower()}.com"))
+
+    stats = search_planner._stats
+    assert set(stats["cities"]) == {"braga", "faro"}
+    assert {k.split("|")[0] for k in stats["configs"]} == {"braga", "faro", "*"}
+    assert stats["configs"]["*|pois|basic"]["searches"] == 4
+    assert len(stats["domains"]) == 3
+    assert "pois|popular.com" in stats["domains"]
@@ -0,0 +1,48 @@
+"""
+Tests for the Tavily hedging allowance
+"""
+
+from collections import deque
+
+import pytest
+
+pytest.importorskip("tavily")
+
+import tavily_search
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(tavily_search.time, "monotonic", lambda: now[0])
+    monkeypatch.setattr(tavily_search, "_hedge_window", {"requests": deque(), "hedges": deque()})
+    monkeypatch.setattr(tavily_search, "HEDGE_MAX_EXTRA_RATIO", 0.1)
+    monkeypatch.setattr(tavily_search, "HEDGE_WINDOW_SECONDS", 60.0)
+    return now
+
+
+def test_quiet_period_does_not_bank_hedges(clock):
+    # Plenty of requests long ago...
+    for _ in range(1000):
+        tavily_search._record_request()
+    clock[0] += 3600
+
+    # ...then a burst of 20 slow requests may only hedge 10% of them
+    hedges = 0
+    for _ in range(20):
+        tavily_search._record_request()
+        hedges += tavily_search._reserve_hedge()
+
+    assert hedges == 2
+
+
+def test_window_forgets_old_hedges(clock):
+    for _ in range(10):
+        tavily_search._record_request()
+    assert tavily_search._reserve_hedge()
+    assert not tavily_search._reserve_hedge()
+
+    clock[0] += 61
+    for _ in range(10):
+        tavily_search._record_request()
+    assert tavily_search._reserve_hedge()
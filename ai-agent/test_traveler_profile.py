@@ -0,0 +1,58 @@
+"""
+Tests for materialized traveler profiles
+"""
+
+from datetime import datetime
+
+import pytest
+
+pytest.importorskip("mysql.connector")
+
+import database  # noqa: E402
+import traveler_profile  # noqa: E402
+
+
+def _booking(booking_id, status="COMPLETED", updated_at=datetime(2026, 1, 2)):
+    return {
+        "id": booking_id, "location": "Paris", "check_in_date": "2026-01-01", "check_out_date": "2026-01-04",
+        "guests": 2, "status": status, "nights": 3, "property_type": "apartment",
+        "created_at": datetime(2026, 1, 1), "updated_at": updated_at
+    }
+
+
+def test_sync_point_advances_when_history_is_unchanged(monkeypatch):
+    saved = []
+    stored = {}
+    monkeypatch.setattr(database, "db_pool", object())
+    monkeypatch.setattr(database, "get_traveler_profile", lambda traveler_id: stored.get(traveler_id))
+    monkeypatch.setattr(database, "save_traveler_profile", lambda profile: saved.append(dict(profile)))
+
+    monkeypatch.setattr(database, "get_traveler_bookings_since", lambda traveler_id, since: [_booking(1)])
+    stored[7] = traveler_profile.sync_profile(7)
+
+    # Booking touched again without changing what the history fingerprint covers
+    later = datetime(2026, 2, 1)
+    monkeypatch.setattr(database, "get_traveler_bookings_since", lambda traveler_id, since: [_booking(1, updated_at=later)])
+    profile = traveler_profile.sync_profile(7)
+
+    assert len(saved) == 2
+    assert profile["last_synced_at"] == later
+
+
+def test_query_signals_do_not_carry_over(monkeypatch):
+    monkeypatch.setattr(database, "save_traveler_profile", lambda profile: None)
+    profile = {"history_fingerprint": "h", "booking_snapshots": {}, "budget_tier": "medium"}
+
+    traveler_profile.store_inferred_preferences(
+        profile,
+        {"budget": "luxury", "interests": ["nightlife", "culture"], "dietaryFilters": ["vegan"], "mobilityNeeds": []},
+        "luxury nightlife trip, vegan food"
+    )
+    cached = traveler_profile.get_cached_preferences(profile)
+    combined = traveler_profile.combine_with_query(cached, "beaches please")
+    combined["interests"].append("shopping")
+
+    assert cached["interests"] == ["culture"]
+    assert profile["inferred_preferences"]["interests"] == ["culture"]
+    assert profile["inferred_preferences"]["budget"] == "medium"
+    assert combined["dietaryFilters"] == []
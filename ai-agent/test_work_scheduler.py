@@ -0,0 +1,40 @@
+"""
+Tests for the priority work scheduler
+"""
+
+import pytest
+
+import work_scheduler
+from work_scheduler import WorkScheduler, Preempted, BACKGROUND, BATCH, INTERACTIVE
+
+
+def test_preemption_skips_cancelled_jobs(monkeypatch):
+    # No workers, so everything stays queued; any interactive job counts as waiting too long
+    scheduler = WorkScheduler(workers=0)
+    monkeypatch.setattr(work_scheduler, "INTERACTIVE_WAIT_TARGET_SECONDS", -1.0)
+
+    cancelled = scheduler.submit(lambda: "background", priority=BACKGROUND)
+    assert cancelled.cancel()
+    queued = scheduler.submit(lambda: "batch", priority=BATCH)
+
+    interactive = scheduler.submit(lambda: "interactive", priority=INTERACTIVE)
+
+    assert cancelled.cancelled()
+    with pytest.raises(Preempted):
+        queued.result(timeout=0)
+    assert not interactive.done()
+    assert [job.priority for job in scheduler.queue] == [INTERACTIVE]
+
+
+def test_worker_runs_interactive_after_preempting_cancelled_job(monkeypatch):
+    scheduler = WorkScheduler(workers=0)
+    cancelled = scheduler.submit(lambda: "background", priority=BACKGROUND)
+    cancelled.cancel()
+    interactive = scheduler.submit(lambda: "interactive", priority=INTERACTIVE)
+
+    # The worker loop preempts too; a cancelled job must not kill the worker thread
+    monkeypatch.setattr(work_scheduler, "INTERACTIVE_WAIT_TARGET_SECONDS", -1.0)
+    with scheduler.condition:
+        job = scheduler._next_job()
+    assert job is not None and job.priority == INTERACTIVE
+    assert job.future is interactive
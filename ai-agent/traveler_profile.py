@@ -0,0 +1,189 @@
+"""
+Materialized traveler preference profiles for AI Agent
+Keeps per-traveler booking aggregates up to date incrementally so plan requests read one row
+"""
+
+import hashlib
+import json
+from collections import Counter
+from typing import Dict, Any, List, Optional
+
+import database
+import preference_classifier
+
+# Booking statuses that count as travel history (same as get_user_booking_history)
+HISTORY_STATUSES = ("ACCEPTED", "COMPLETED", "CANCELLED")
+HISTORY_LIMIT = 10
+
+
+def _snapshot(row: Dict[str, Any]) -> Dict[str, Any]:
+    """Reduce a booking row to the fields the history prompt and aggregates use"""
+    return {
+        "id": row["id"],
+        "location": row.get("location"),
+        "check_in_date": row.get("check_in_date"),
+        "check_out_date": row.get("check_out_date"),
+        "guests": int(row.get("guests") or 0),
+        "status": row.get("status"),
+        "nights": int(row.get("nights") or 0),
+        "property_type": row.get("property_type"),
+        "created_at": str(row.get("created_at") or "")
+    }
+
+
+def history_fingerprint(snapshots: Dict[str, Dict[str, Any]]) -> str:
+    """Hash of the booking fields that influence inferred preferences"""
+    material = sorted(
+        (s["id"], s["status"], s["check_in_date"], s["check_out_date"], s["guests"], s["location"])
+        for s in snapshots.values()
+    )
+    return hashlib.sha256(json.dumps(material, default=str).encode("utf-8")).hexdigest()
+
+
+def _aggregate(snapshots: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+    """Compute profile aggregates from booking snapshots"""
+    bookings = list(snapshots.values())
+    if not bookings:
+        return {
+            "booking_count": 0,
+            "avg_nights": None,
+            "avg_guests": None,
+            "property_types": {},
+            "cities": {},
+            "budget_tier": None
+        }
+
+    avg_nights = sum(b["nights"] for b in bookings) / len(bookings)
+    return {
+        "booking_count": len(bookings),
+        "avg_nights": round(avg_nights, 2),
+        "avg_guests": round(sum(b["guests"] for b in bookings) / len(bookings), 2),
+        "property_types": dict(Counter(b["property_type"] for b in bookings if b["property_type"])),
+        "cities": dict(Counter(b["location"] for b in bookings if b["location"])),
+        "budget_tier": preference_classifier.budget_tier_for_nights(avg_nights)
+    }
+
+
+def sync_profile(traveler_id: int) -> Optional[Dict[str, Any]]:
+    """
+    Load a traveler's profile and apply any bookings created or updated since the last sync
+
+    Args:
+        traveler_id: The traveler ID
+
+    Returns:
+        Up-to-date profile dictionary, or None if the database is unavailable
+    """
+    if not database.db_pool:
+        return None
+
+    profile = database.get_traveler_profile(traveler_id) or {
+        "traveler_id": traveler_id,
+        "booking_snapshots": {},
+        "last_synced_at": None
+    }
+    snapshots = profile.get("booking_snapshots") or {}
+    previous_fingerprint = profile.get("history_fingerprint")
+    previous_synced_at = profile.get("last_synced_at")
+
+    changed = database.get_traveler_bookings_since(traveler_id, previous_synced_at)
+    latest = previous_synced_at
+
+    for row in changed:
+        key = str(row["id"])
+        if row.get("status") in HISTORY_STATUSES:
+            snapshots[key] = _snapshot(row)
+        else:
+            snapshots.pop(key, None)
+
+        for column in ("created_at", "updated_at"):
+            if row.get(column) and (latest is None or row[column] > latest):
+                latest = row[column]
+
+    fingerprint = history_fingerprint(snapshots)
+    profile["booking_snapshots"] = snapshots
+    profile["history_fingerprint"] = fingerprint
+    profile["last_synced_at"] = latest
+
+    if fingerprint != previous_fingerprint:
+        profile.update(_aggregate(snapshots))
+        database.save_traveler_profile(profile)
+        print(f"✓ Traveler {traveler_id} profile updated from {len(changed)} changed bookings")
+    elif latest != previous_synced_at:
+        # Changes that leave the history as it was still advance the sync point,
+        # so the same bookings are not re-read on every request
+        database.save_traveler_profile(profile)
+
+    return profile
+
+
+def recent_history(profile: Dict[str, Any], limit: int = HISTORY_LIMIT) -> List[Dict[str, Any]]:
+    """Return the most recent bookings in the same shape as get_user_booking_history"""
+    snapshots = (profile or {}).get("booking_snapshots") or {}
+    ordered = sorted(snapshots.values(), key=lambda s: s.get("created_at") or "", reverse=True)
+    return ordered[:limit]
+
+
+def get_cached_preferences(profile: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """Return the last inferred preferences if the booking history has not changed since"""
+    if not profile or not profile.get("inferred_preferences"):
+        return None
+    if profile.get("inferred_fingerprint") != profile.get("history_fingerprint"):
+        return None
+    return {
+        key: list(value) if isinstance(value, list) else value
+        for key, value in profile["inferred_preferences"].items()
+    }
+
+
+def combine_with_query(cached: Dict[str, Any], query: str) -> Dict[str, Any]:
+    """
+    Combine history-derived preferences with signals from the current query
+
+    Args:
+        cached: Preferences previously inferred for this booking history
+        query: Current user query
+
+    Returns:
+        Preferences dictionary in the same shape as the inference functions
+    """
+    local = preference_classifier.classify_preferences(query)
+    # A fresh dictionary: this request's query signals never reach the stored profile
+    return {
+        "budget": preference_classifier.explicit_budget(query) or cached.get("budget", "medium"),
+        "interests": list(dict.fromkeys(local["interests"] + list(cached.get("interests") or []))),
+        "dietaryFilters": local["dietaryFilters"],
+        "mobilityNeeds": local["mobilityNeeds"],
+        "reasoning": "Reused profile preferences (booking history unchanged) with query keywords"
+    }
+
+
+def store_inferred_preferences(profile: Dict[str, Any], inferred: Dict[str, Any], query: str = "") -> None:
+    """
+    Persist inferred preferences against the current history fingerprint
+
+    Inference also reads the request's query, so what the query alone states
+    is left out: keyword interests the history does not imply, an explicit budget (replaced by the
+    history's budget tier), and dietary and mobility filters, which
+    combine_with_query always takes from the current query. A later request
+    for the same traveler then starts from history-derived preferences only.
+
+    Args:
+        profile: Traveler profile
+        inferred: Preferences inferred from the booking history and query
+        query: The query the inference read
+    """
+    history_interests = preference_classifier.classify_preferences("", recent_history(profile))["interests"]
+    query_interests = set(preference_classifier.classify_preferences(query)["interests"]) - set(history_interests)
+    budget = inferred.get("budget")
+    if preference_classifier.explicit_budget(query):
+        budget = profile.get("budget_tier") or "medium"
+    profile["inferred_preferences"] = {
+        "budget": budget,
+        "interests": [i for i in inferred.get("interests") or [] if i not in query_interests],
+        "dietaryFilters": [],
+        "mobilityNeeds": [],
+        "reasoning": inferred.get("reasoning")
+    }
+    profile["inferred_fingerprint"] = profile.get("history_fingerprint")
+    database.save_traveler_profile(profile)
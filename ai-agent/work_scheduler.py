@@ -0,0 +1,209 @@
+"""
+Priority work scheduler for AI Agent
+Runs plan work in interactive, background and batch classes with weighted fair queuing per traveler
+"""
+
+import os
+import threading
+import time
+from concurrent.futures import Future
+from typing import Dict, Any, Callable, Optional
+
+import metrics
+
+INTERACTIVE = "interactive"
+BACKGROUND = "background"
+BATCH = "batch"
+PRIORITIES = (INTERACTIVE, BACKGROUND, BATCH)
+
+# Plans run concurrently (each also uses several STAGE_WORKERS for its searches and stages)
+PLAN_WORKERS = int(os.getenv("PLAN_WORKERS", 8))
+
+# Relative share of dispatches when classes compete (higher gets more)
+CLASS_WEIGHTS = {
+    INTERACTIVE: float(os.getenv("SCHEDULER_INTERACTIVE_WEIGHT", 8)),
+    BACKGROUND: float(os.getenv("SCHEDULER_BACKGROUND_WEIGHT", 2)),
+    BATCH: float(os.getenv("SCHEDULER_BATCH_WEIGHT", 1))
+}
+
+# Most workers a class may occupy at once, so interactive work always finds a free worker
+CLASS_MAX_SHARE = {
+    INTERACTIVE: 1.0,
+    BACKGROUND: float(os.getenv("SCHEDULER_BACKGROUND_MAX_SHARE", 0.5)),
+    BATCH: float(os.getenv("SCHEDULER_BATCH_MAX_SHARE", 0.25))
+}
+
+# Queued background/batch work is dropped while interactive work waits longer than this
+INTERACTIVE_WAIT_TARGET_SECONDS = float(os.getenv("SCHEDULER_INTERACTIVE_WAIT_TARGET_SECONDS", 1.0))
+
+
+class Preempted(Exception):
+    """Raised for queued background or batch work dropped to protect interactive latency"""
+
+
+class _Job:
+    """One queued unit of work"""
+
+    __slots__ = ("fn", "args", "kwargs", "priority", "flow", "finish", "queued_at", "future")
+
+    def __init__(self, fn, args, kwargs, priority, flow, finish):
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.priority = priority
+        self.flow = flow
+        self.finish = finish
+        self.queued_at = time.monotonic()
+        self.future = Future()
+
+
+class WorkScheduler:
+    """
+    Weighted fair queuing over (priority class, traveler) flows
+
+    Each job gets a virtual finish time of max(virtual clock, flow's last
+    finish) + 1 / class weight and the smallest finish time runs next, so
+    classes share workers by weight and travelers within a class share
+    equally. Background and batch work is capped at a share of the workers,
+    and while the oldest interactive job has waited past the target, queued
+    background and batch jobs are preempted.
+    """
+
+    def __init__(self, workers: int = PLAN_WORKERS):
+        self.workers = workers
+        self.queue = []
+        self.running = {priority: 0 for priority in PRIORITIES}
+        self.flow_finish: Dict[tuple, float] = {}
+        self.virtual_time = 0.0
+        self.condition = threading.Condition()
+        for index in range(workers):
+            threading.Thread(target=self._worker, name=f"plan-worker-{index}", daemon=True).start()
+
+    def submit(
+        self,
+        fn: Callable,
+        *args,
+        priority: str = INTERACTIVE,
+        traveler_id: Optional[Any] = None,
+        **kwargs
+    ) -> Future:
+        """
+        Queue work and return a Future for its result
+
+        Args:
+            fn: Work to run
+            priority: interactive, background or batch
+            traveler_id: Fairness key within the class (anonymous work shares one flow)
+
+        Returns:
+            Future resolved with fn's result, or failed with Preempted
+        """
+        if priority not in PRIORITIES:
+            raise ValueError(f"Unknown priority {priority}")
+        flow = (priority, traveler_id)
+        with self.condition:
+            finish = max(self.virtual_time, self.flow_finish.get(flow, 0.0)) + 1 / CLASS_WEIGHTS[priority]
+            self.flow_finish[flow] = finish
+            job = _Job(fn, args, kwargs, priority, flow, finish)
+            self.queue.append(job)
+            metrics.increment(f"scheduler_{priority}_submitted")
+            self._preempt_if_needed()
+            self.condition.notify()
+        return job.future
+
+    def _dispatchable(self, job: _Job) -> bool:
+        """Whether the job's class is below its worker cap (caller holds the lock)"""
+        return self.running[job.priority] < max(1, int(self.workers * CLASS_MAX_SHARE[job.priority]))
+
+    def _preempt_if_needed(self) -> None:
+        """Drop queued background and batch jobs while interactive work is waiting too long"""
+        now = time.monotonic()
+        oldest = min((j.queued_at for j in self.queue if j.priority == INTERACTIVE), default=None)
+        if oldest is None or now - oldest <= INTERACTIVE_WAIT_TARGET_SECONDS:
+            return
+        dropped = [j for j in self.queue if j.priority != INTERACTIVE]
+        if not dropped:
+            return
+        self.queue = [j for j in self.queue if j.priority == INTERACTIVE]
+        for job in dropped:
+            metrics.increment(f"scheduler_{job.priority}_preempted")
+            # Futures the caller already cancelled (e.g. the client went away) stay cancelled
+            if job.future.set_running_or_notify_cancel():
+                job.future.set_exception(Preempted("Dropped to protect interactive latency"))
+        print(f"Warning: preempted {len(dropped)} queued background/batch jobs")
+
+    def _next_job(self) -> Optional[_Job]:
+        """Pop the dispatchable job with the smallest virtual finish time (caller holds the lock)"""
+        self._preempt_if_needed()
+        candidates = [j for j in self.queue if self._dispatchable(j)]
+        if not candidates:
+            return None
+        job = min(candidates, key=lambda j: j.finish)
+        self.queue.remove(job)
+        self.virtual_time = max(self.virtual_time, job.finish - 1 / CLASS_WEIGHTS[job.priority])
+        # Idle flows start over from the virtual clock
+        if not any(j.flow == job.flow for j in self.queue):
+            self.flow_finish.pop(job.flow, None)
+        return job
+
+    def _worker(self) -> None:
+        """Worker loop: run the next fair job"""
+        while True:
+            with self.condition:
+                job = self._next_job()
+                while job is None:
+                    self.condition.wait(0.5)
+                    job = self._next_job()
+                self.running[job.priority] += 1
+
+            metrics.observe(f"scheduler_{job.priority}_wait_ms", (time.monotonic() - job.queued_at) * 1000)
+            try:
+                if job.future.set_running_or_notify_cancel():
+                    try:
+                        job.future.set_result(job.fn(*job.args, **job.kwargs))
+                    except BaseException as e:
+                        job.future.set_exception(e)
+            finally:
+                with self.condition:
+                    self.running[job.priority] -= 1
+                    self.condition.notify_all()
+
+    def status(self) -> Dict[str, Dict[str, Any]]:
+        """Queue depth, running jobs and wait times per class"""
+        with self.condition:
+            queued = {p: sum(1 for j in self.queue if j.priority == p) for p in PRIORITIES}
+            running = dict(self.running)
+        return {
+            priority: {
+                "queued": queued[priority],
+                "running": running[priority],
+                "waitMsP50": round(metrics.percentile(f"scheduler_{priority}_wait_ms", 50), 1),
+                "waitMsP99": round(metrics.percentile(f"scheduler_{priority}_wait_ms", 99), 1)
+            }
+            for priority in PRIORITIES
+        }
+
+
+_scheduler: Optional[WorkScheduler] = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler() -> WorkScheduler:
+    """Return the shared scheduler, starting its workers on first use"""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = WorkScheduler()
+        return _scheduler
+
+
+def submit(fn: Callable, *args, priority: str = INTERACTIVE, traveler_id: Optional[Any] = None, **kwargs) -> Future:
+    """Queue work on the shared scheduler"""
+    return get_scheduler().submit(fn, *args, priority=priority, traveler_id=traveler_id, **kwargs)
+
+
+def status() -> Dict[str, Dict[str, Any]]:
+    """Per-class scheduler status (empty until the scheduler is first used)"""
+    with _scheduler_lock:
+        scheduler = _scheduler
+    return scheduler.status() if scheduler else {}
@@ -0,0 +1,40 @@
+-- Migration: Add materialized traveler preference profiles
+-- Version: 1.2
+-- Date: 2025-02-XX
+-- Description: Per-traveler aggregates used by the AI agent instead of re-reading booking history
+
+-- ============================================
+-- 1. Create traveler_profiles table
+-- ============================================
+CREATE TABLE IF NOT EXISTS traveler_profiles (
+    traveler_id INT PRIMARY KEY,
+    booking_count INT NOT NULL DEFAULT 0,
+    avg_nights DECIMAL(6, 2) DEFAULT NULL,
+    avg_guests DECIMAL(6, 2) DEFAULT NULL,
+    property_types JSON DEFAULT NULL COMMENT 'Property type -> booking count',
+    cities JSON DEFAULT NULL COMMENT 'City -> booking count',
+    budget_tier VARCHAR(20) DEFAULT NULL,
+    booking_snapshots JSON DEFAULT NULL COMMENT 'Booking id -> history row used for incremental updates',
+    history_fingerprint CHAR(64) DEFAULT NULL,
+    inferred_preferences JSON DEFAULT NULL,
+    inferred_fingerprint CHAR(64) DEFAULT NULL COMMENT 'History fingerprint the preferences were inferred from',
+    last_synced_at TIMESTAMP NULL DEFAULT NULL COMMENT 'Latest bookings.created_at/updated_at already applied',
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    FOREIGN KEY (traveler_id) REFERENCES travelers(id) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- ============================================
+-- 2. Index used by incremental profile sweeps
+-- ============================================
+CREATE INDEX IF NOT EXISTS idx_booking_traveler_updated ON bookings(traveler_id, updated_at);
+
+-- ============================================
+-- 3. Verify migration
+-- ============================================
+SHOW COLUMNS FROM traveler_profiles;
+
+-- ============================================
+-- Migration Complete
+-- ============================================
+SELECT 'Migration v1.2 completed successfully!' AS status;
@@ -0,0 +1,24 @@
+-- Migration: Index updated_at for AI agent cache invalidation sweeps
+-- Version: 1.3
+-- Date: 2025-03-XX
+-- Description: The AI agent caches booking, property and traveler rows and polls
+--              WHERE updated_at >= ? ORDER BY updated_at, id to find changed rows
+
+-- ============================================
+-- 1. Indexes used by cache invalidation sweeps
+-- ============================================
+CREATE INDEX IF NOT EXISTS idx_booking_updated ON bookings(updated_at, id);
+CREATE INDEX IF NOT EXISTS idx_property_updated ON properties(updated_at, id);
+CREATE INDEX IF NOT EXISTS idx_traveler_updated ON travelers(updated_at, id);
+
+-- ============================================
+-- 2. Verify migration
+-- ============================================
+SHOW INDEX FROM bookings WHERE Key_name = 'idx_booking_updated';
+SHOW INDEX FROM properties WHERE Key_name = 'idx_property_updated';
+SHOW INDEX FROM travelers WHERE Key_name = 'idx_traveler_updated';
+
+-- ============================================
+-- Migration Complete
+-- ============================================
+SELECT 'Migration v1.3 completed successfully!' AS status;